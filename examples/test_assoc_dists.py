@@ -0,0 +1,44 @@
+#!/usr/bin/env python -W ignore::DeprecationWarning
+
+# test_assoc_dists.py
+#
+# Regression check of the joint-likelihood distance matrices for the
+# example detection sets.  Reference values in data/assoc_dists.json
+# were computed by integrating an interpolation of the polar grid with
+# adaptive quadrature; the direct grid integration used in hjl should
+# reproduce them to within the tolerance below.
+
+import os
+import json
+
+import numpy as np
+
+from infrapy.association import hjl
+from infrapy.utils import data_io
+
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# joint-likelihood calculation parameters used for the reference values
+width = 10.0
+rng_max = 3000.0
+
+# tolerance on the distances [log10 units]
+dist_tol = 1.0e-4
+
+
+def test_distance_matrices():
+    with open(os.path.join(data_dir, 'assoc_dists.json')) as f:
+        ref_dists = json.load(f)
+
+    for det_file, ref_dist in ref_dists.items():
+        det_list = data_io.json_to_detection_list(os.path.join(data_dir, det_file))
+        dists = hjl.build_distance_matrix(det_list, bm_width=width, rng_max=rng_max)
+
+        err = np.max(np.abs(dists - np.array(ref_dist)))
+        print(det_file, "maximum distance error:", err)
+        assert err < dist_tol, det_file + " distance matrix differs from reference values by " + str(err)
+
+
+if __name__ == '__main__':
+    test_distance_matrices()
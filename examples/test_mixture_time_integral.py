@@ -0,0 +1,87 @@
+#!/usr/bin/env python -W ignore::DeprecationWarning
+
+# test_mixture_time_integral.py
+#
+# Regression check of the origin time marginalization used in
+# marginal_spatial_pdf for larger detection counts.  The quadrature in
+# likelihoods.mixture_time_integral is compared against explicit
+# enumeration of the 3**N canonical celerity mixture sequences (the
+# analytic Gaussian integral of each sequence) for N = 1 through 7
+# detections with and without seismic terms.
+
+import itertools
+
+import numpy as np
+
+from infrapy.propagation import infrasound
+from infrapy.propagation import likelihoods as lklhds
+
+
+# number of source locations evaluated per case
+pt_cnt = 16
+
+# relative tolerance on the marginalized values
+rel_tol = 1.0e-9
+
+
+def enumerate_sequences(dts, sigs, wts, seis_tms, seis_sigs):
+    # sum of the analytic origin time integrals over all mixture sequences (c - b^2 / a is evaluated
+    # as the weighted spread of the estimates about their mean to avoid cancellation)
+    det_cnt, comp_cnt = dts.shape[-2:]
+
+    result = 0.0
+    for seq in itertools.product(list(range(comp_cnt)), repeat=det_cnt):
+        seq_tms = np.concatenate((dts[:, range(det_cnt), seq], seis_tms), axis=1)
+        seq_sigs = np.concatenate((sigs[:, range(det_cnt), seq], seis_sigs), axis=1)
+
+        a = np.sum(1.0 / seq_sigs**2, axis=1)
+        t_mean = np.sum(seq_tms / seq_sigs**2, axis=1) / a
+        spread = np.sum(((seq_tms - t_mean[:, None]) / seq_sigs)**2, axis=1)
+        N = np.prod(wts[:, range(det_cnt), seq] / sigs[:, range(det_cnt), seq], axis=1)
+
+        result += N / np.sqrt(a) * np.exp(-1.0 / 2.0 * spread)
+    return result
+
+
+def test_mixture_time_integral():
+    np.random.seed(0)
+
+    for det_cnt in range(1, 8):
+        for consistent_tms in [True, False]:
+            for seismic in [False, True]:
+                # canonical mixtures at random ranges with arrival times consistent with a common origin or random
+                rngs = np.random.uniform(50.0, 800.0, (pt_cnt, det_cnt))
+                if consistent_tms:
+                    tms = rngs / np.random.uniform(0.26, 0.33, (pt_cnt, det_cnt)) + np.random.normal(0.0, 20.0, (pt_cnt, det_cnt))
+                else:
+                    tms = np.random.uniform(0.0, 3600.0, (pt_cnt, det_cnt))
+
+                dts = tms[:, :, None] - rngs[:, :, None] * infrasound.canon_rcel_mns
+                sigs = rngs[:, :, None] * infrasound.canon_rcel_vrs
+                wts = np.broadcast_to(infrasound.canon_rcel_wts, dts.shape)
+
+                if seismic:
+                    seis_sigs = np.random.uniform(2.0, 10.0, (pt_cnt, 2))
+                    seis_tms = np.random.normal(np.mean(dts[:, :, -1], axis=1)[:, None], 30.0, (pt_cnt, 2))
+
+                    a_seis = np.sum(1.0 / seis_sigs**2, axis=1)
+                    b_seis = np.sum(seis_tms / seis_sigs**2, axis=1)
+                    c_seis = np.sum((seis_tms / seis_sigs)**2, axis=1)
+                else:
+                    seis_sigs, seis_tms = np.empty((pt_cnt, 0)), np.empty((pt_cnt, 0))
+                    a_seis, b_seis, c_seis = 0.0, 0.0, 0.0
+
+                ref_vals = enumerate_sequences(dts, sigs, wts, seis_tms, seis_sigs)
+                vals = lklhds.mixture_time_integral(dts, sigs, wts, a_seis, b_seis, c_seis)
+
+                # compare where the reference is a normal float (random times can underflow to subnormal
+                # values with reduced precision or to zero)
+                mask = ref_vals > np.finfo(float).tiny
+                err = np.max(np.abs(vals[mask] / ref_vals[mask] - 1.0), initial=0.0)
+                print("N =", det_cnt, "consistent times:", consistent_tms, "seismic:", seismic, "maximum relative error:", err)
+                assert err < rel_tol, "mixture_time_integral differs from enumeration by " + str(err) + " for N = " + str(det_cnt)
+                assert np.all(vals[~mask] < 2.0 * np.finfo(float).tiny)
+
+
+if __name__ == '__main__':
+    test_mixture_time_integral()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python -W ignore::DeprecationWarning
+
+# test_pgm_cache.py
+#
+# Round-trip check of the path geometry model parameter cache: the
+# first load of a model writes the (smoothed) parameters into the cache
+# directory and a second load must read them from there (without
+# unpickling the model file) and reproduce the same evaluation tables.
+
+import os
+import tempfile
+
+import numpy as np
+
+from infrapy.propagation import infrasound
+
+
+pgm_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrapy', 'propagation', 'priors', 'UTTR_models', 'UTTR_06_1800UTC.pgm')
+
+
+def test_pgm_cache():
+    cache_dir = tempfile.mkdtemp()
+
+    pgm1 = infrasound.PathGeometryModel()
+    pgm1.load(pgm_file, smooth=True, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == [os.path.basename(pgm_file) + ".smooth.npz"]
+
+    # the second load must not read the pickled model file
+    pickle_load = infrasound.pickle.load
+    def no_pickle(*args, **kwargs):
+        raise AssertionError("Path geometry model was unpickled instead of read from the cache")
+
+    infrasound.pickle.load = no_pickle
+    try:
+        pgm2 = infrasound.PathGeometryModel()
+        pgm2.load(pgm_file, smooth=True, cache_dir=cache_dir)
+    finally:
+        infrasound.pickle.load = pickle_load
+
+    assert np.array_equal(pgm1.rcel_tbl, pgm2.rcel_tbl)
+    assert np.array_equal(pgm1.az_dev_mn_tbl, pgm2.az_dev_mn_tbl)
+    assert np.array_equal(pgm1.az_dev_vr_tbl, pgm2.az_dev_vr_tbl)
+    print("Cached path geometry model matches the original.")
+
+
+if __name__ == '__main__':
+    test_pgm_cache()
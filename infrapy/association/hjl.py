@@ -14,6 +14,9 @@ import itertools
 import random
 import sys
 import os
+import pickle
+import hashlib
+import warnings
 
 import numpy as np
 
@@ -23,11 +26,11 @@ import matplotlib.pyplot as plt
 
 from datetime import datetime
 
-from pyproj import Geod
-
+from scipy import sparse
 from scipy.cluster import hierarchy
-from scipy.integrate import quad, nquad
-from scipy.interpolate import interp2d
+from scipy.integrate import simpson
+from scipy.special import i0e
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree
 from scipy.spatial.distance import squareform
 
 from obspy import UTCDateTime
@@ -43,7 +46,7 @@ from ..utils import latlon as ll
 #     and Spherical Earth Model    #
 # ################################ #
 int_opts = {'limit': 50, 'epsrel': 1.0e-3}
-sph_proj = Geod(ellps='sphere')
+sph_proj = ll.SphericalGeod()
 
 # ################################ #
 #       Combining a Pair of        #
@@ -81,113 +84,212 @@ def set_region(det1, det2, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=
 
         """
 
-    latlon1 = np.array([det1.latitude, det1.longitude], dtype=np.float)
-    latlon2 = np.array([det2.latitude, det2.longitude], dtype=np.float)
+    latlon1 = np.array([det1.latitude, det1.longitude], dtype=float)
+    latlon2 = np.array([det2.latitude, det2.longitude], dtype=float)
 
     if np.allclose(latlon1, latlon2):
         # if detections are on the same array, center is the array location and radius is the maximum value
         return True, latlon1, rad_max
 
-    proj1 = ll.sphericalfwd(latlon1, rng_max / 6370.0 * 180.0 / np.pi, det1.back_azimuth)[0][0]
-    proj1up = ll.sphericalfwd(latlon1, rng_max / 6370.0 * 180.0 / np.pi, det1.back_azimuth + bm_width)[0][0]
-    proj1dn = ll.sphericalfwd(latlon1, rng_max / 6370.0 * 180.0 / np.pi, det1.back_azimuth - bm_width)[0][0]
-
-    proj2 = ll.sphericalfwd(latlon2, rng_max / 6370.0 * 180.0 / np.pi, det2.back_azimuth)[0][0]
-    proj2up = ll.sphericalfwd(latlon2, rng_max / 6370.0 * 180.0 / np.pi, det2.back_azimuth + bm_width)[0][0]
-    proj2dn = ll.sphericalfwd(latlon2, rng_max / 6370.0 * 180.0 / np.pi, det2.back_azimuth - bm_width)[0][0]
-
-    intersect = [0] * 9
-    intersect[0] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2)[0]
-    intersect[1] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2up)[0]
-    intersect[2] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2dn)[0]
-    intersect[3] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2)[0]
-    intersect[4] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2)[0]
-    intersect[5] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2up)[0]
-    intersect[6] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2dn)[0]
-    intersect[7] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2dn)[0]
-    intersect[8] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2up)[0]
-
-    if np.count_nonzero(~np.isnan(intersect[:5])) < 1:
+    success, centers, radii = set_regions([det1], [det2], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max)
+    if success[0]:
+        return True, centers[0], radii[0]
+    else:
         return False, [0.0, 0.0], 0.0
 
+
+def set_regions(dets1, dets2, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0):
+    """Defines the integration regions for computation of the joint-likelihood for a batch of detection pairs
+
+        Batched form of set_region for pairs of detections on separate arrays.  The beam edge arcs
+        for all pairs are built once and their intersections computed in a single broadcast call
+        (see infrapy.utils.latlon.beam_intersect) and the region definitions are evaluated for all
+        pairs simultaneously.
+
+        Parameters
+        ----------
+        dets1 : :obj:`list` of :obj:`InfrasoundDetection`
+            First detection of each pair (see infrapy.propagation.likelihoods)
+        dets2 : :obj:`list` of :obj:`InfrasoundDetection`
+            Second detection of each pair (see infrapy.propagation.likelihoods)
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+
+        Returns:
+        Successs : 1darray
+            True if region was defined, False if not
+        Centers : 2darray
+            Centers of the integration regions as latitude, longitude pairs [degrees]
+        Radii : 1darray
+            Radii of the integration regions [km]
+
+        """
+
+    lats1 = np.array([det.latitude for det in dets1], dtype=float)
+    lons1 = np.array([det.longitude for det in dets1], dtype=float)
+    bazs1 = np.array([det.back_azimuth for det in dets1], dtype=float)
+
+    lats2 = np.array([det.latitude for det in dets2], dtype=float)
+    lons2 = np.array([det.longitude for det in dets2], dtype=float)
+    bazs2 = np.array([det.back_azimuth for det in dets2], dtype=float)
+
+    intersect = ll.beam_intersect(np.stack((lats1, lons1), axis=1), bazs1, np.stack((lats2, lons2), axis=1), bazs2, rng_max / 6370.0 * 180.0 / np.pi, bm_width)
+    success = np.any(~np.isnan(intersect[:, :5, 0]), axis=1)
+
     # Compute geographic mean of the intersections to define the center of the region
-    x, y, z = 0.0, 0.0, 0.0
-    for n in range(5):
-        if not np.isnan(intersect[n][0]):
-            x += np.cos(np.radians(intersect[n][0])) * np.cos(np.radians(intersect[n][1]))
-            y += np.cos(np.radians(intersect[n][0])) * np.sin(np.radians(intersect[n][1]))
-            z += np.sin(np.radians(intersect[n][0]))
-
-    norm = np.sqrt(x**2 + y**2 + z**2)
-    x /= norm
-    y /= norm
-    z /= norm
-    center = np.array([np.degrees(np.arcsin(z)), np.degrees(np.arctan2(y, x))])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.nansum(np.cos(np.radians(intersect[:, :5, 0])) * np.cos(np.radians(intersect[:, :5, 1])), axis=1)
+        y = np.nansum(np.cos(np.radians(intersect[:, :5, 0])) * np.sin(np.radians(intersect[:, :5, 1])), axis=1)
+        z = np.nansum(np.sin(np.radians(intersect[:, :5, 0])), axis=1)
+
+        norm = np.sqrt(x**2 + y**2 + z**2)
+        centers = np.stack((np.degrees(np.arcsin(z / norm)), np.degrees(np.arctan2(y, x))), axis=1)
 
     # Check if either array is in the beam of the other array
     # Use the range to the nearer array as the initial radius of the region of interest
-    temp = sph_proj.inv(det1.longitude, det1.latitude, det2.longitude, det2.latitude, radians=False)
-
-    az_diff1 = det1.back_azimuth - temp[0]
-    if az_diff1 > 180.0:
-        az_diff1 -= 360.0
-    if az_diff1 < -180.0:
-        az_diff1 += 360.0
-
-    az_diff2 = det2.back_azimuth - temp[1]
-    if az_diff2 > 180.0:
-        az_diff2 -= 360.0
-    if az_diff2 < -180.0:
-        az_diff2 += 360.0
-
-    if abs(az_diff1) < bm_width and abs(az_diff2) < bm_width:
-        # If both arrays are in the beams of the other, use mid-point
-        # and distance for region definition
-
-        center = np.array(np.flipud(sph_proj.fwd(det1.longitude, det1.latitude, temp[0], temp[2] / 2.0, radians=False)[:2]))
-        reg_rad = (temp[2] / 1000.0) / 2.0 - 0.1
-        reg_rad = min(reg_rad, rad_max)
-    elif abs(az_diff1) < bm_width or abs(az_diff2) < bm_width:
-        # If only one array is in the beam of the other, use
-        # distance to nearer array as the radius
-        rng1 = sph_proj.inv(center[1], center[0], det1.longitude, det1.latitude, radians=False)[2] / 1000.0 - 0.01
-        rng2 = sph_proj.inv(center[1], center[0], det2.longitude, det2.latitude, radians=False)[2] / 1000.0 - 0.01
-
-        reg_rad = min(rng1, rng2)
-        reg_rad = min(reg_rad, rad_max)
-    else:
-        # Compute the distances to the non-central intersections to estimate the radius of the region of interest
-        rngs = [np.nan] * 9
-        for n in range(1, 9):
-            if not np.isnan(intersect[n][0]):
-                rngs[n] = sph_proj.inv(center[1], center[0], intersect[n][1], intersect[n][0], radians=False)[2] / 1000.0
-        reg_rad = np.nanmean(rngs)
-
-        reg_rad = max(reg_rad, rad_min)
-        reg_rad = min(reg_rad, rad_max)
-
-        reg_rad = min(reg_rad, sph_proj.inv(center[1], center[0], det1.longitude, det1.latitude)[2] / 1000.0 - 0.01)
-        reg_rad = min(reg_rad, sph_proj.inv(center[1], center[0], det2.longitude, det2.latitude)[2] / 1000.0 - 0.01)
-
-    if reg_rad < rad_min:
-        # If the region is too small, shift the center and resize to rad_min
-        rng1 = sph_proj.inv(center[1], center[0], det1.longitude, det1.latitude)[2] / 1000.0
-        rng2 = sph_proj.inv(center[1], center[0], det2.longitude, det2.latitude)[2] / 1000.0
-
-        if rng1 < rng2:
-            array_az_to_center = sph_proj.inv(det1.longitude, det2.latitude, center[1], center[0])[0]
-            new_center = sph_proj.fwd(det1.longitude, det1.latitude, array_az_to_center, rad_min * 1000.0 + 0.01)
-        else:
-            array_az_to_center = sph_proj.inv(det2.longitude, det2.latitude, center[1], center[0], radians=False)[0]
-            new_center = sph_proj.fwd(det2.longitude, det2.latitude, array_az_to_center, rad_min * 1000.0 + 0.01)
+    az12, az21, array_sep = sph_proj.inv(lons1, lats1, lons2, lats2, radians=False)
+
+    az_diff1 = np.mod(bazs1 - az12 + 180.0, 360.0) - 180.0
+    az_diff2 = np.mod(bazs2 - az21 + 180.0, 360.0) - 180.0
+
+    in_beam1 = abs(az_diff1) < bm_width
+    in_beam2 = abs(az_diff2) < bm_width
+    radii = np.zeros(len(lats1))
+
+    # If both arrays are in the beams of the other, use mid-point
+    # and distance for region definition
+    both = np.logical_and(np.logical_and(in_beam1, in_beam2), success)
+    if np.any(both):
+        temp = sph_proj.fwd(lons1[both], lats1[both], az12[both], array_sep[both] / 2.0, radians=False)
+        centers[both] = np.stack((temp[1], temp[0]), axis=1)
+        radii[both] = np.minimum((array_sep[both] / 1000.0) / 2.0 - 0.1, rad_max)
+
+    rng1 = sph_proj.inv(centers[:, 1], centers[:, 0], lons1, lats1, radians=False)[2] / 1000.0 - 0.01
+    rng2 = sph_proj.inv(centers[:, 1], centers[:, 0], lons2, lats2, radians=False)[2] / 1000.0 - 0.01
+
+    # If only one array is in the beam of the other, use
+    # distance to nearer array as the radius
+    one = np.logical_and(np.logical_xor(in_beam1, in_beam2), success)
+    radii[one] = np.minimum(np.minimum(rng1, rng2), rad_max)[one]
+
+    # Otherwise, compute the distances to the non-central intersections to estimate the radius of the region of interest
+    neither = np.logical_and(~np.logical_or(in_beam1, in_beam2), success)
+    if np.any(neither):
+        lats_i, lons_i = intersect[neither, 1:, 0], intersect[neither, 1:, 1]
+        valid = ~np.isnan(lats_i)
+
+        rngs = np.full(lats_i.shape, np.nan)
+        rngs[valid] = sph_proj.inv(np.repeat(centers[neither, 1][:, None], 8, axis=1)[valid], np.repeat(centers[neither, 0][:, None], 8, axis=1)[valid], lons_i[valid], lats_i[valid], radians=False)[2] / 1000.0
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            reg_rad = np.nanmean(rngs, axis=1)
+
+        reg_rad = np.minimum(np.maximum(reg_rad, rad_min), rad_max)
+        radii[neither] = np.minimum(reg_rad, np.minimum(rng1[neither], rng2[neither]))
+
+    # If the region is too small, shift the center and resize to rad_min
+    small = np.logical_and(success, radii < rad_min)
+    if np.any(small):
+        near1 = np.logical_and(small, rng1 < rng2)
+        near2 = np.logical_and(small, rng1 >= rng2)
+
+        if np.any(near1):
+            array_az_to_center = sph_proj.inv(lons1[near1], lats2[near1], centers[near1, 1], centers[near1, 0])[0]
+            new_center = sph_proj.fwd(lons1[near1], lats1[near1], array_az_to_center, np.full(np.count_nonzero(near1), rad_min * 1000.0 + 0.01))
+            centers[near1] = np.stack((new_center[1], new_center[0]), axis=1)
+
+        if np.any(near2):
+            array_az_to_center = sph_proj.inv(lons2[near2], lats2[near2], centers[near2, 1], centers[near2, 0], radians=False)[0]
+            new_center = sph_proj.fwd(lons2[near2], lats2[near2], array_az_to_center, np.full(np.count_nonzero(near2), rad_min * 1000.0 + 0.01))
+            centers[near2] = np.stack((new_center[1], new_center[0]), axis=1)
 
-        center = np.array([new_center[1], new_center[0]])
-        reg_rad = rad_min
+        radii[small] = rad_min
 
-    return True, center, reg_rad
+    centers[~success] = 0.0
+    radii[~success] = 0.0
 
+    return success, centers, radii
 
-def compute_assoc_pair(det1, det2,  bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, prog_step=0):
+
+def compute_same_array_pairs(dets1, dets2, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, resol=2000):
+    """Computes the joint-likelihood for a batch of detection pairs from the same array
+
+        For detections on the same array the joint-likelihood separates into the product of an
+        azimuthal integral and a range integral.  The azimuthal integral of the product of von Mises
+        distributions is evaluated analytically and the range integral of the Gaussian mixture
+        celerity model is evaluated on a fixed logarithmic range grid for all pairs at once.
+
+        Parameters
+        ----------
+        dets1 : :obj:`list` of :obj:`InfrasoundDetection`
+            First detection of each pair (see infrapy.propagation.likelihoods)
+        dets2 : :obj:`list` of :obj:`InfrasoundDetection`
+            Second detection of each pair (see infrapy.propagation.likelihoods)
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        resol : int
+            Number of points in the range quadrature grid
+
+        Returns:
+        jntlklhd : 1darray
+            The joint-likelihood value for each pair of detections
+    """
+
+    bazs1 = np.array([det.back_azimuth for det in dets1], dtype=float)
+    bazs2 = np.array([det.back_azimuth for det in dets2], dtype=float)
+    kappas1 = np.array([det.kappa for det in dets1], dtype=float)
+    kappas2 = np.array([det.kappa for det in dets2], dtype=float)
+    dts = np.array([(det2.peakF_UTCtime - det1.peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3 for det1, det2 in zip(dets1, dets2)])
+
+    az_diff = np.mod(bazs1 - bazs2 + 180.0, 360.0) - 180.0
+    jntlklhd = np.full(len(bazs1), np.finfo(float).epsneg)
+    mask = abs(az_diff) <= 2.0 * bm_width
+    if not np.any(mask):
+        return jntlklhd
+
+    # The product of von Mises distributions is a von Mises distribution with kappa = |k1 exp(i b1) + k2 exp(i b2)|
+    # so that the integral over azimuth [degrees] is 360 * I0(kappa) / (2 pi I0(k1) * 2 pi I0(k2)) (scaled Bessel
+    # functions are used to avoid overflow)
+    kappa1, kappa2 = kappas1[mask], kappas2[mask]
+    kappa = np.abs(kappa1 * np.exp(1.0j * np.radians(bazs1[mask])) + kappa2 * np.exp(1.0j * np.radians(bazs2[mask])))
+    az_integral = 360.0 * i0e(kappa) / ((2.0 * np.pi)**2 * i0e(kappa1) * i0e(kappa2)) * np.exp(kappa - kappa1 - kappa2)
+
+    # Integrate the range pdf on a logarithmic grid, dr = r ds
+    s_vals = np.linspace(np.log(1.0e-2), np.log(rng_max), resol)
+    rngs = np.exp(s_vals)
+
+    tms = np.stack((np.zeros(np.count_nonzero(mask)), dts[mask]), axis=1)
+    rng_pdf = np.zeros((len(tms), resol))
+    for indices in itertools.product(list(range(3)), repeat=2):
+        a, b, c = 0.0, 0.0, 0.0
+        coeff = 1.0
+
+        for n in range(2):
+            dt = tms[:, n][:, None] - rngs[None, :] * infrsnd.canon_rcel_mns[indices[n]]
+            sig = rngs * infrsnd.canon_rcel_vrs[indices[n]]
+
+            a = a + 1.0 / sig**2
+            b = b + dt / sig**2
+            c = c + (dt / sig)**2
+            coeff = coeff * infrsnd.canon_rcel_wts[indices[n]] / sig
+
+        rng_pdf += coeff / np.sqrt(a) * np.exp(-1.0 / 2.0 * (c - b**2 / a))
+    rng_integral = simpson(rng_pdf * rngs, x=s_vals, axis=1)
+
+    jntlklhd[mask] = 1.0 / np.sqrt(2.0 * np.pi) * az_integral * rng_integral / (np.pi * rng_max)
+    return jntlklhd
+
+
+def compute_assoc_pair(det1, det2,  bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, prog_step=0, region=None):
     """Computes the joint-likelihiood for a pair of detections
 
         Projects finite width beams from each of the detecting arrays and looks for intersections
@@ -212,6 +314,8 @@ def compute_assoc_pair(det1, det2,  bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0,
             Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
         prog_step : int
             Used to increment progress bar
+        region : tuple
+            Precomputed integration region (success, center, radius) from set_regions (computed via set_region if not provided)
 
         Returns:
         jntlklhd : float
@@ -222,43 +326,13 @@ def compute_assoc_pair(det1, det2,  bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0,
     if array_sep < 1.0:
         # Integration separates into a product of 1-dimensional
         # integrals for detections on the same array
-        az_diff = det1.back_azimuth - det2.back_azimuth
-        if az_diff > 180.0:
-            az_diff -= 360.0
-        elif az_diff < -180.0:
-            az_diff += 360.0
-
-        if abs(az_diff) > 2.0 * bm_width:
-            jntlklhd = np.finfo(float).epsneg
-        else:
-            def jnt_az_pdf(az):
-                arg = det1.kappa * np.cos(np.radians(az - det1.back_azimuth))
-                arg += det2.kappa * np.cos(np.radians(az - det2.back_azimuth))
-                return np.exp(arg) / (det1.vm_norm * det2.vm_norm)
-
-            tms = np.array([0.0, (det2.peakF_UTCtime - det1.peakF_UTCtime).astype('m8[s]').astype(float)])
-            def jnt_rng_pdf(rng):
-                result = 0.0
-                for indices in itertools.product(list(range(3)), repeat=2):
-                    a, b, c = 0.0, 0.0, 0.0
-                    coeff = 1.0
-
-                    for n in range(2):
-                        dt = tms[n] - rng * infrsnd.canon_rcel_mns[indices[n]]
-                        sig = rng * infrsnd.canon_rcel_vrs[indices[n]]
-
-                        a += 1.0 / sig**2
-                        b += dt / sig**2
-                        c += (dt / sig)**2
-                        coeff *= infrsnd.canon_rcel_wts[indices[n]] / sig
-
-                    result += coeff / np.sqrt(a) * np.exp(-1.0 / 2.0 * (c - b**2 / a))
-                return result
-
-            jntlklhd = 1.0 / np.sqrt(2.0 * np.pi) * quad(jnt_az_pdf, -180.0, 180.0)[0] * quad(jnt_rng_pdf, 0.0, rng_max)[0] / (np.pi * rng_max)
+        jntlklhd = compute_same_array_pairs([det1], [det2], bm_width=bm_width, rng_max=rng_max)[0]
     else:
         # Compute integration region center and radius
-        success, center, radius = set_region(det1, det2, bm_width=bm_width, rad_min=rad_min, rad_max=rad_max, rng_max=rng_max)
+        if region is None:
+            success, center, radius = set_region(det1, det2, bm_width=bm_width, rad_min=rad_min, rad_max=rad_max, rng_max=rng_max)
+        else:
+            success, center, radius = region
         if success:
             resol = int(resol)
             angles = np.linspace(-180.0, 180.0, resol)
@@ -268,14 +342,12 @@ def compute_assoc_pair(det1, det2,  bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0,
             R = R.flatten()
             ANG = ANG.flatten()
             temp = sph_proj.fwd(np.array([center[1]] * resol**2), np.array([center[0]] * resol**2), ANG, R * 1e3)
-            pdf = lklhds.marginal_spatial_pdf(temp[1], temp[0], [det1, det2])
-            pdf_fit = interp2d(rngs, angles, pdf.reshape(resol, resol), kind='cubic')
-
-            def integrand(r, az):
-                # dxdy -> r dr daz with angle changed to radians produces (r * pi / 180) factor
-                return pdf_fit(r, az)[0] * r * np.pi / 180.0
+            pdf = lklhds.marginal_spatial_pdf(temp[1], temp[0], [det1, det2]).reshape(resol, resol)
 
-            jntlklhd = nquad(integrand, [[0.0, radius],[-180.0, 180.0]], opts=[int_opts, int_opts])[0] / (np.pi * rng_max)
+            # Integrate directly on the polar grid using tensor-product Simpson weights
+            # dxdy -> r dr daz with angle changed to radians produces (r * pi / 180) factor
+            rng_integral = simpson(pdf * rngs * np.pi / 180.0, x=rngs, axis=1)
+            jntlklhd = simpson(rng_integral, x=angles) / (np.pi * rng_max)
         else:
             jntlklhd = np.finfo(float).epsneg
 
@@ -287,7 +359,331 @@ def compute_assoc_pair_wrapper(args):
     return compute_assoc_pair(*args)
 
 
-def build_distance_matrix(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180,  pool=None, progress=False):
+# ################################ #
+#   Compact Detection Table for    #
+#     Multiprocessing Workers      #
+# ################################ #
+det_table_dtype = np.dtype([('lat', float), ('lon', float), ('time', 'M8[us]'), ('back_az', float), ('trace_vel', float), ('f_stat', float), ('array_dim', float)])
+
+
+def detection_table(det_list):
+    """Converts a list of detections into a compact numeric table
+
+        Packs the quantities needed to evaluate the detection likelihoods into a
+        structured array so that detections can be sent to pool workers as a single
+        block of memory instead of pickling full detection objects for every pair
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+
+        Returns:
+        table : 1darray
+            Structured array (det_table_dtype) with one row per detection; undefined values are NaN
+        """
+    def as_float(val):
+        return np.nan if val is None else float(val)
+
+    table = np.empty(len(det_list), dtype=det_table_dtype)
+    table['lat'] = [det.latitude for det in det_list]
+    table['lon'] = [det.longitude for det in det_list]
+    table['time'] = [det.peakF_UTCtime for det in det_list]
+    table['back_az'] = [as_float(det.back_azimuth) for det in det_list]
+    table['trace_vel'] = [as_float(det.trace_velocity) for det in det_list]
+    table['f_stat'] = [as_float(det.peakF_value) for det in det_list]
+    table['array_dim'] = [as_float(det.array_dim) for det in det_list]
+
+    return table
+
+
+def table_detections(table):
+    """Rebuilds detections from rows of a detection table
+
+        Parameters
+        ----------
+        table : 1darray
+            Structured array of detections from detection_table
+
+        Returns:
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods); derived values (kappa, etc.) are recomputed
+        """
+    def as_val(val, fmt=float):
+        return None if np.isnan(val) else fmt(val)
+
+    return [lklhds.InfrasoundDetection(float(row['lat']), float(row['lon']), row['time'], as_val(row['back_az']), as_val(row['f_stat']), as_val(row['array_dim'], int), traceV=as_val(row['trace_vel'])) for row in table]
+
+
+def compute_assoc_block(table, pairs, success, centers, radii, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, prog_step=0):
+    """Computes the joint-likelihood for a block of cross-array detection pairs
+
+        Parameters
+        ----------
+        table : 1darray
+            Structured array of detections from detection_table
+        pairs : 2darray
+            Indices of the detection pairs (rows of the table) to compute
+        success : 1darray
+            Whether an integration region was found for each pair (see set_regions)
+        centers : 2darray
+            Latitude and longitude of each integration region center [degrees]
+        radii : 1darray
+            Radius of each integration region [km]
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+        resol : int
+            Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
+        prog_step : int
+            Used to increment progress bar once the block is complete
+
+        Returns:
+        vals : 1darray
+            The joint-likelihood value for each pair of detections
+        """
+
+    # only rebuild the detections referenced in this block
+    indices, inverse = np.unique(pairs, return_inverse=True)
+    dets = table_detections(table[indices])
+    inverse = inverse.reshape(-1, 2)
+
+    vals = np.array([compute_assoc_pair(dets[n], dets[m], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, region=(success[j], centers[j], radii[j])) for j, (n, m) in enumerate(inverse)])
+    prog_bar.increment(prog_step)
+
+    return vals
+
+
+def compute_assoc_block_wrapper(args):
+    return compute_assoc_block(*args)
+
+
+# ################################ #
+#    Cache of Pair Likelihoods     #
+# ################################ #
+class PairCache(object):
+    """Cache of joint-likelihood values for detection pairs
+
+        Stores the joint-likelihood of detection pairs keyed by the identities of the
+        detections and the association parameters so that pairs shared between overlapping
+        analysis windows (or repeated runs) are only integrated once.  If a file name is
+        provided, existing values are loaded from it and save() writes the cache back to disk.
+
+        Parameters
+        ----------
+        file_name : str
+            Path of a (pickled) cache file to load and save
+        """
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+        if file_name and os.path.isfile(file_name):
+            with open(file_name, 'rb') as f:
+                self.values = pickle.load(f)
+
+    def __len__(self):
+        return len(self.values)
+
+    @staticmethod
+    def det_key(det):
+        return (float(det.latitude), float(det.longitude), str(det.peakF_UTCtime), float(det.back_azimuth), det.peakF_value, det.array_dim)
+
+    @staticmethod
+    def param_key(bm_width, rng_max, rad_min, rad_max, resol):
+        return (float(bm_width), float(rng_max), float(rad_min), float(rad_max), int(resol))
+
+    def key(self, det1, det2, params):
+        key1, key2 = self.det_key(det1), self.det_key(det2)
+        if key2 < key1:
+            key1, key2 = key2, key1
+        return (params, key1, key2)
+
+    def get(self, det1, det2, params):
+        val = self.values.get(self.key(det1, det2, params))
+        if val is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return val
+
+    def set(self, det1, det2, params, val):
+        self.values[self.key(det1, det2, params)] = val
+
+    def evict(self, dets):
+        # drop the values of all pairs including any of the detections
+        det_keys = set(self.det_key(det) for det in dets)
+        if len(det_keys) > 0:
+            self.values = {key: val for key, val in self.values.items() if key[1] not in det_keys and key[2] not in det_keys}
+
+    def save(self, file_name=None):
+        if file_name is None:
+            file_name = self.file_name
+        if file_name:
+            with open(file_name, 'wb') as f:
+                pickle.dump(self.values, f)
+
+
+class DistanceMatrixCache(object):
+    """Validated on-disk cache of a distance matrix
+
+        Stores a distance matrix together with a content hash of each detection and of the
+        association parameters.  A stored matrix is reused when the hashes match, extended
+        (only the new rows and columns computed) when detections have been appended to the
+        list, and ignored (and overwritten on save) otherwise.
+
+        Parameters
+        ----------
+        file_name : str
+            Path of the (numpy .npz) cache file
+        """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+    @staticmethod
+    def det_hash(det):
+        return hashlib.sha1(repr(PairCache.det_key(det)).encode()).hexdigest()
+
+    @staticmethod
+    def param_hash(bm_width, rng_max, rad_min, rad_max, resol):
+        return hashlib.sha1(repr(PairCache.param_key(bm_width, rng_max, rad_min, rad_max, resol)).encode()).hexdigest()
+
+    def load(self, det_list, params):
+        """Loads the cached distance matrix if it is valid for the detections and parameters
+
+            Parameters
+            ----------
+            det_list : :obj:`list` of :obj:`InfrasoundDetection`
+                List of detections (see infrapy.propagation.likelihoods)
+            params : str
+                Parameter hash from param_hash
+
+            Returns:
+            dist_matrix : 2darray
+                Cached distance matrix for all (or a leading subset of) the detections; None if no valid cache exists
+            """
+        if not os.path.isfile(self.file_name):
+            return None
+
+        try:
+            with np.load(self.file_name) as data:
+                dists, det_hashes, cache_params = data['dists'], list(data['det_hashes']), str(data['params'])
+        except Exception:
+            print('\t\tUnable to read distance matrix cache (' + self.file_name + ').  Recomputing...')
+            return None
+
+        hashes = [self.det_hash(det) for det in det_list]
+        if cache_params != params or dists.shape != (len(det_hashes), len(det_hashes)) or det_hashes != hashes[:len(det_hashes)]:
+            print('\t\tDistance matrix cache (' + self.file_name + ') does not match detections or parameters.  Recomputing...')
+            return None
+
+        print('\t\tLoaded distance matrix for ' + str(len(det_hashes)) + " of " + str(len(det_list)) + " detections from cache")
+        return dists
+
+    def save(self, det_list, params, dists):
+        with open(self.file_name, 'wb') as f:
+            np.savez(f, dists=dists, det_hashes=np.array([self.det_hash(det) for det in det_list]), params=np.array(params))
+
+
+def rcel_bounds(rcel_sigma=6.0):
+    """Bounds on reciprocal celerity [s/km] from the canonical infrasound propagation model
+
+        Parameters
+        ----------
+        rcel_sigma : float
+            Number of standard deviations about the canonical reciprocal celerity means
+
+        Returns:
+        rcel_lo : float
+            Lower bound on reciprocal celerity [s/km]
+        rcel_hi : float
+            Upper bound on reciprocal celerity [s/km]
+        """
+    rcel_lo = max(np.min(infrsnd.canon_rcel_mns - rcel_sigma * infrsnd.canon_rcel_vrs), 0.0)
+    rcel_hi = np.max(infrsnd.canon_rcel_mns + rcel_sigma * infrsnd.canon_rcel_vrs)
+
+    return rcel_lo, rcel_hi
+
+
+def screen_pairs(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rcel_sigma=6.0, pairs=None):
+    """Screens detection pairs that cannot originate from a common source
+
+        Applies inexpensive kinematic and geometric checks to all unique pairs of detections
+        to identify pairs whose joint-likelihood is negligible without integration.  Pairs are
+        rejected if the arrival time separation exceeds the maximum propagation time difference
+        for a source within rng_max of both arrays, if the arrays are separated by more than
+        2 * rng_max, or if the (widened) beams diverge and cannot intersect
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rcel_sigma : float
+            Number of standard deviations about the canonical reciprocal celerity means used to bound propagation times
+        pairs : 2darray
+            Indices of detection pairs to screen (default: all unique pairs)
+
+        Returns:
+        pairs : 2darray
+            Indices of the screened detection pairs (all unique pairs ordered as itertools.combinations by default)
+        keep : 1darray
+            Boolean mask identifying pairs that require integration of the joint-likelihood
+        """
+
+    if pairs is None:
+        pairs = np.array(np.triu_indices(len(det_list), k=1)).T
+    else:
+        pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+    n1, n2 = pairs[:, 0], pairs[:, 1]
+
+    lats = np.array([det.latitude for det in det_list], dtype=float)
+    lons = np.array([det.longitude for det in det_list], dtype=float)
+    bazs = np.array([det.back_azimuth for det in det_list], dtype=float)
+    tms = np.array([(det.peakF_UTCtime - det_list[0].peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3 for det in det_list])
+
+    az12, az21, array_sep = sph_proj.inv(lons[n1], lats[n1], lons[n2], lats[n2], radians=False)
+    array_sep = array_sep / 1000.0
+
+    # Kinematic screen: for a source within rng_max of both arrays
+    # the arrival time separation is bounded by the reciprocal celerity
+    # limits of the canonical model
+    rcel_lo, rcel_hi = rcel_bounds(rcel_sigma)
+    dt_max = rng_max * rcel_hi - np.maximum(rng_max - array_sep, 0.0) * rcel_lo
+    keep = np.abs(tms[n2] - tms[n1]) <= dt_max
+    keep = np.logical_and(keep, array_sep <= 2.0 * rng_max)
+
+    # Geometric screen for detections on the same array: beams must overlap
+    same_array = array_sep < 1.0
+    baz_diff = np.mod(bazs[n1] - bazs[n2] + 180.0, 360.0) - 180.0
+    keep[same_array] = np.logical_and(keep[same_array], abs(baz_diff[same_array]) <= 2.0 * bm_width)
+
+    # Geometric screen for separate arrays: the beams (widened by bm_width)
+    # must point to the same side of the great circle joining the arrays
+    # and toward one another
+    diff1 = np.mod(bazs[n1] - az12 + 180.0, 360.0) - 180.0
+    diff2 = np.mod(bazs[n2] - az21 + 180.0, 360.0) - 180.0
+
+    diverging = np.logical_or(np.logical_and(diff1 > bm_width, diff2 > bm_width), np.logical_and(diff1 < -bm_width, diff2 < -bm_width))
+    diverging = np.logical_or(diverging, abs(diff1) + abs(diff2) > 180.0 + 2.0 * bm_width)
+    keep[~same_array] = np.logical_and(keep[~same_array], ~diverging[~same_array])
+
+    return pairs, keep
+
+
+def build_distance_matrix(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180,  pool=None, progress=False, prefilter=True, pair_cache=None, dist_prev=None):
     """Computes the joint-likelihood for all pairs of detections to define the distance matrix
 
         Computes the joint-likelihood value for each unique pair of detections in a provided list and
@@ -309,6 +705,12 @@ def build_distance_matrix(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0,
             Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
         pool : pathos.multiprocessing.ProcessingPool
             Multiprocessing pool for accelerating calculations
+        prefilter : boolean
+            Screen pairs using kinematic and geometric constraints (see screen_pairs) and only integrate the surviving pairs
+        pair_cache : PairCache
+            Cache of previously computed pair joint-likelihoods; only pairs missing from the cache are integrated and new values are added to it
+        dist_prev : 2darray
+            Previously computed distance matrix for the leading detections in the list; only pairs including a later detection are computed
 
         Returns:
         dist_matrix : 2darray
@@ -317,43 +719,237 @@ def build_distance_matrix(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0,
         """
     print('\tComputing joint-likelihoods...')
     det_cnt = len(det_list)
-    n_tot, n_ref = det_cnt * (det_cnt - 1) / 2, 0
+
+    pairs = np.stack(np.triu_indices(det_cnt, 1), axis=1)
+    if dist_prev is not None:
+        pairs = pairs[pairs[:, 1] >= len(dist_prev)]
+    if prefilter:
+        pairs, keep = screen_pairs(det_list, bm_width=bm_width, rng_max=rng_max, pairs=pairs)
+        print('\t\tScreened ' + str(np.count_nonzero(~keep)) + " of " + str(len(pairs)) + " pairs using propagation time and beam geometry")
+        pairs = pairs[keep]
+
+    result = compute_pairs(det_list, pairs, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=progress, pair_cache=pair_cache)
+
+    # Screened pairs are assigned the maximum distance
+    dist_mat = np.full((det_cnt, det_cnt), -np.log10(np.finfo(float).epsneg))
+    np.fill_diagonal(dist_mat, 0.0)
+    if dist_prev is not None:
+        dist_mat[:len(dist_prev), :len(dist_prev)] = dist_prev
+    for n in range(len(result)):
+        dist_mat[result[n][0]][result[n][1]] = -np.log10(max(result[n][2], np.finfo(float).epsneg))
+        dist_mat[result[n][1]][result[n][0]] = -np.log10(max(result[n][2], np.finfo(float).epsneg))
+
+    return dist_mat
+
+
+def compute_pairs(det_list, pairs, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, pool=None, progress=False, pair_cache=None, blocks_per_cpu=4):
+    """Computes the joint-likelihood for a set of detection pairs
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        pairs : 2darray
+            Indices of the detection pairs to compute
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+        resol : int
+            Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
+        pool : pathos.multiprocessing.ProcessingPool
+            Multiprocessing pool for accelerating calculations
+        pair_cache : PairCache
+            Cache of previously computed pair joint-likelihoods; only pairs missing from the cache are integrated and new values are added to it
+        blocks_per_cpu : int
+            Number of blocks of pairs dispatched to each worker of the pool
+
+        Returns:
+        result : :obj:`list`
+            Detection indices and joint-likelihood, [n, m, value], for each pair
+
+        Notes
+        -----
+        With a pool, detections are converted once into a compact numeric table (see detection_table) and
+        the pairs are dispatched in large blocks so that only the table and the pair indices and integration
+        regions of each block are sent to the workers (instead of two full detection objects per pair)
+        """
+
+    cached = []
+    if pair_cache is not None:
+        params = pair_cache.param_key(bm_width, rng_max, rad_min, rad_max, resol)
+        vals = [pair_cache.get(det_list[n], det_list[m], params) for n, m in pairs]
+        cached = [[n, m, val] for (n, m), val in zip(pairs, vals) if val is not None]
+        pairs = np.array([pair for pair, val in zip(pairs, vals) if val is None], dtype=int).reshape(-1, 2)
+        print('\t\tLoaded ' + str(len(cached)) + " pair joint-likelihoods from cache")
+
+    # Evaluate pairs from the same array in a single batch
+    same_array = []
+    if len(pairs) > 0:
+        lats = np.array([det.latitude for det in det_list], dtype=float)
+        lons = np.array([det.longitude for det in det_list], dtype=float)
+        array_sep = sph_proj.inv(lons[pairs[:, 0]], lats[pairs[:, 0]], lons[pairs[:, 1]], lats[pairs[:, 1]], radians=False)[2] / 1000.0
+
+        if np.any(array_sep < 1.0):
+            same_pairs = pairs[array_sep < 1.0]
+            vals = compute_same_array_pairs([det_list[n] for n in same_pairs[:, 0]], [det_list[m] for m in same_pairs[:, 1]], bm_width=bm_width, rng_max=rng_max)
+            same_array = [[n, m, val] for (n, m), val in zip(same_pairs, vals)]
+            pairs = pairs[array_sep >= 1.0]
+
+    # Define integration regions for the remaining (cross-array) pairs in a single batch
+    success, centers, radii = np.zeros(0, dtype=bool), np.zeros((0, 2)), np.zeros(0)
+    if len(pairs) > 0:
+        success, centers, radii = set_regions([det_list[n] for n in pairs[:, 0]], [det_list[m] for m in pairs[:, 1]], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max)
+    n_tot, n_ref = len(pairs), 0
 
     if progress:
         print('\t\tProgress: \t', end='')
         prog_bar.prep(50)
     if pool:
-        args, result, ids = [], [], []
-        for n, m in itertools.combinations(list(range(det_cnt)), 2):
-            if progress:
-                step = int(np.floor((50.0 * (n_ref + 1)) / n_tot) - np.floor((50.0 * n_ref) / n_tot))
-            else:
-                step = 0        
-            args.append([det_list[n], det_list[m], bm_width, rng_max, rad_min, rad_max, resol, step])
-            ids.append([n, m])
-            n_ref += 1
-        out = pool.map(compute_assoc_pair_wrapper, args)
-        for n in range(int(n_tot)):
-            result.append([ids[n][0], ids[n][1], out[n]])
+        result = []
+        if n_tot > 0:
+            table = detection_table(det_list)
+            blocks = np.array_split(np.arange(n_tot), min(n_tot, blocks_per_cpu * getattr(pool, 'ncpus', 1)))
+
+            args = []
+            for block in blocks:
+                if progress:
+                    step = int(np.floor((50.0 * (n_ref + len(block))) / n_tot) - np.floor((50.0 * n_ref) / n_tot))
+                else:
+                    step = 0
+                args.append([table, pairs[block], success[block], centers[block], radii[block], bm_width, rng_max, rad_min, rad_max, resol, step])
+                n_ref += len(block)
+            out = np.concatenate(pool.map(compute_assoc_block_wrapper, args))
+
+            for (n, m), val in zip(pairs, out):
+                result.append([n, m, val])
     else:
         result = []
-        for n, m in itertools.combinations(list(range(det_cnt)), 2):
+        for (n, m), region in zip(pairs, zip(success, centers, radii)):
             if progress:
                 step = int(np.floor((50.0 * (n_ref + 1)) / n_tot) - np.floor((50.0 * n_ref) / n_tot))
             else:
                 step = 0
-            assoc = compute_assoc_pair(det_list[n], det_list[m], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, prog_step=step)
+            assoc = compute_assoc_pair(det_list[n], det_list[m], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, prog_step=step, region=region)
             result.append([n, m, assoc])
             n_ref += 1
     if progress:
         prog_bar.close()
 
-    dist_mat = np.zeros((det_cnt, det_cnt))
-    for n in range(int(n_tot)):
-        dist_mat[result[n][0]][result[n][1]] = -np.log10(max(result[n][2], np.finfo(float).epsneg))
-        dist_mat[result[n][1]][result[n][0]] = -np.log10(max(result[n][2], np.finfo(float).epsneg))
+    result = result + same_array
+    if pair_cache is not None:
+        for n, m, val in result:
+            pair_cache.set(det_list[n], det_list[m], params, val)
+        result = result + cached
+
+    return result
+
+
+def candidate_pairs(det_list, rng_max=np.pi / 2.0 * 6370.0, rcel_sigma=6.0, block_size=1000000):
+    """Generates detection pairs within the maximum propagation time of one another
+
+        Sweeps through the detections in time order so that only pairs separated by less
+        than the maximum propagation time are generated (avoiding the N(N-1)/2 enumeration
+        of all pairs).  Pairs are yielded in blocks for screening and integration.
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rcel_sigma : float
+            Number of standard deviations about the canonical reciprocal celerity means used to bound propagation times
+        block_size : int
+            Approximate number of pairs in each block
+
+        Returns:
+        pairs : 2darray
+            Indices of detection pairs (n < m) in blocks (generator)
+        """
+
+    tms = np.array([(det.peakF_UTCtime - det_list[0].peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3 for det in det_list])
+    order = np.argsort(tms, kind='stable')
+    tms_sorted = tms[order]
+
+    dt_max = rng_max * rcel_bounds(rcel_sigma)[1]
+    ends = np.searchsorted(tms_sorted, tms_sorted + dt_max, side='right')
+    cnts = ends - np.arange(len(tms)) - 1
+    cum_cnts = np.cumsum(cnts)
+
+    n1 = 0
+    while n1 < len(tms):
+        n2 = np.searchsorted(cum_cnts, cum_cnts[n1] - cnts[n1] + block_size, side='right')
+        n2 = min(max(n2, n1 + 1), len(tms))
+
+        rows = np.repeat(np.arange(n1, n2), cnts[n1:n2])
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(cnts[n1:n2]) - cnts[n1:n2], cnts[n1:n2])
+        cols = rows + offsets + 1
+
+        if len(rows) > 0:
+            pairs = np.sort(np.stack((order[rows], order[cols]), axis=1), axis=1)
+            yield pairs
+        n1 = n2
+
+
+def build_sparse_distance_matrix(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, dist_max=10.0, pool=None, progress=False, pair_cache=None):
+    """Computes the joint-likelihood for plausible pairs of detections to define a sparse distance matrix
+
+        Pairs are generated with a time-ordered sweep (see candidate_pairs) and screened using kinematic
+        and geometric constraints (see screen_pairs) before integration.  Only pairs with distances below
+        dist_max are stored; all other pairs are implicitly at (or beyond) the maximum distance.
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+        resol : int
+            Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
+        dist_max: float
+            Maximum value allowed in distance matrix (larger distances are not stored)
+        pool : pathos.multiprocessing.ProcessingPool
+            Multiprocessing pool for accelerating calculations
+        pair_cache : PairCache
+            Cache of previously computed pair joint-likelihoods
+
+        Returns:
+        dist_matrix : scipy.sparse.csr_matrix
+            Symmetric sparse distance matrix; distances are stored with a floor of machine precision so that zero entries denote absent pairs
+        """
+    print('\tComputing joint-likelihoods (sparse)...')
+    det_cnt = len(det_list)
+
+    rows, cols, vals = [], [], []
+    cand_cnt, screen_cnt = 0, 0
+    for pairs in candidate_pairs(det_list, rng_max=rng_max):
+        _, keep = screen_pairs(det_list, bm_width=bm_width, rng_max=rng_max, pairs=pairs)
+        cand_cnt += len(pairs)
+        screen_cnt += np.count_nonzero(~keep)
+
+        result = compute_pairs(det_list, pairs[keep], bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=progress, pair_cache=pair_cache)
+        for n, m, val in result:
+            dist = -np.log10(max(val, np.finfo(float).epsneg))
+            if dist < dist_max:
+                rows.append(n)
+                cols.append(m)
+                vals.append(max(dist, np.finfo(float).eps))
+    print('\t\tScreened ' + str(screen_cnt) + " of " + str(cand_cnt) + " candidate pairs (" + str(int(det_cnt * (det_cnt - 1) / 2)) + " total pairs)")
+
+    rows, cols, vals = np.array(rows, dtype=int), np.array(cols, dtype=int), np.array(vals)
+    return sparse.csr_matrix((np.concatenate((vals, vals)), (np.concatenate((rows, cols)), np.concatenate((cols, rows)))), shape=(det_cnt, det_cnt))
 
-    return dist_mat
 
 def view_distance_matrix(distance_matrix, file_id=None, ordering=None):
 
@@ -393,6 +989,33 @@ def view_distance_matrix(distance_matrix, file_id=None, ordering=None):
     plt.pause(2.0)
     plt.close()
 
+def label_groups(labels, population_min=1):
+    """Groups detection indices by cluster label
+
+        Sorts the labels once and splits the sorted indices at the label boundaries
+        so that the grouping is linear in the number of detections
+
+        Parameters
+        ----------
+        labels : :obj:`list` of :obj:`int`
+            Labels of cluster memberships for each detection
+        population_min : int
+            Minimum number of detections in a cluster to be returned
+
+        Returns:
+        groups : :obj:`list` of 1darray
+            Ascending detection indices of each cluster with sufficient membership in label order
+        """
+    labels = np.asarray(labels, dtype=int)
+    if len(labels) == 0:
+        return []
+
+    counts = np.bincount(labels)
+    groups = np.split(np.argsort(labels, kind='stable'), np.cumsum(counts)[:-1])
+
+    return [groups[n] for n in np.where(counts >= population_min)[0]]
+
+
 def cluster(distance_matrix, threshold, linkage_method='weighted', show_result=False, file_id=None, den_label_size=9, mat_label_size=7, trim_indices=[]):
     """Computes the clustering solution for a distance matrix and threshold
 
@@ -434,15 +1057,8 @@ def cluster(distance_matrix, threshold, linkage_method='weighted', show_result=F
     labels = hierarchy.fcluster(links, threshold, criterion='distance') - 1
 
     # Sort the distance matrix using the labels
-    sorting = np.array([])
-    for n in range(max(labels + 1)):
-        sorting = np.concatenate((sorting, np.arange(det_cnt)[labels==n]))
-    sorting = sorting.astype(int)
-
-    distance_matrix_sorted = np.empty_like(distance_matrix)
-    for n1 in range(det_cnt):
-        for n2 in range(det_cnt):
-            distance_matrix_sorted[n1][n2] = distance_matrix[sorting[n1], sorting[n2]]
+    sorting = np.argsort(labels, kind='stable')
+    distance_matrix_sorted = np.asarray(distance_matrix)[np.ix_(sorting, sorting)]
 
     if show_result or file_id:
         f, (ax1, ax2) = plt.subplots(1, 2)
@@ -472,9 +1088,9 @@ def cluster(distance_matrix, threshold, linkage_method='weighted', show_result=F
             ax2.plot(np.where(sorting == indices[1])[0] + 0.5, np.where(sorting == indices[0])[0] + 0.5, color='0.5', marker='x', markersize=200.0 / det_cnt**1.2)
 
         corner = 0
-        for n in range(max(labels + 1)):
-            ax2.add_patch(patches.Rectangle((corner, corner), len(np.arange(det_cnt)[labels==n]), len(np.arange(det_cnt)[labels==n]), alpha=0.2, color='k'))
-            corner += len(np.arange(det_cnt)[labels==n])
+        for cnt in np.bincount(labels):
+            ax2.add_patch(patches.Rectangle((corner, corner), cnt, cnt, alpha=0.2, color='k'))
+            corner += cnt
 
         if file_id:
             plt.savefig(file_id + "-cluster_result.png", dpi=300)
@@ -508,29 +1124,168 @@ def trim_clusters(labels, distance_matrix, population_min=3, ratio_thresh=3.0):
         trim_indices : :obj:`list` of :obj:`int`
             Indices of linkages causing poor cluster shape
         """
-    det_cnt = len(distance_matrix)
+    distance_matrix = np.asarray(distance_matrix)
 
     trim_indices = []
-    for n in range(max(labels + 1)):
-        if len(np.arange(det_cnt)[labels==n]) >= population_min:
-            indices = np.arange(det_cnt)[labels==n]
-
-            distance_submatrix = np.empty((len(indices), len(indices)))
-            distance_submatrix[:] = np.nan
-            for n1 in range(len(indices)):
-                for n2 in range(n1 + 1, len(indices)):
-                    distance_submatrix[n1, n2] = distance_matrix[indices[n1]][indices[n2]]
-                    distance_submatrix[n2, n1] = distance_matrix[indices[n1]][indices[n2]]
-            max2median_ratio = np.nanmax(distance_submatrix) / np.nanmedian(distance_submatrix)
-
-            if max2median_ratio > ratio_thresh:
-                m1 = np.argmax([np.nanmean(col) for col in distance_submatrix])
-                m2 = np.nanargmin(distance_submatrix[:, m1])
-                trim_indices = trim_indices + [[indices[m1], indices[m2]]]
+    for indices in label_groups(labels, population_min):
+        distance_submatrix = distance_matrix[np.ix_(indices, indices)].astype(float)
+        np.fill_diagonal(distance_submatrix, np.nan)
+        max2median_ratio = np.nanmax(distance_submatrix) / np.nanmedian(distance_submatrix)
+
+        if max2median_ratio > ratio_thresh:
+            m1 = np.argmax(np.nanmean(distance_submatrix, axis=1))
+            m2 = np.nanargmin(distance_submatrix[:, m1])
+            trim_indices = trim_indices + [[indices[m1], indices[m2]]]
     
     return trim_indices
 
 
+def recluster_trimmed(labels, distance_matrix, threshold, dist_max=10.0, linkage_method='weighted', trimming_thresh=3.8, trim_thresh_scalar=1.0, show_result=False, file_id=None):
+    """Repeats the clustering analysis after trimming linkages in poorly shaped clusters
+
+        Parameters
+        ----------
+        labels : :obj:`list` of :obj:`int`
+            Labels of cluster memberships for each detection
+        distance_matrix : 2darray
+            Two dimensional numpy array representing distance matrix
+        threshold : float
+            Threshold value defining linkage cutoff
+        dist_max: float
+            Maximum value allowed in distance matrix (assigned to trimmed linkages)
+        linkage_method : str
+            Linkage method used by scipy.cluster.hierarchy.linkage
+        trimming_thresh : float
+            Threshold for radius / mean inter-element distance to require trimming
+        trim_thresh_scalar : float
+            Scalar modifying the threshold value for linkage cutoff in the trimmed result
+        show_result : boolean
+            Boolean to plot dendrogram and sorted distance matrix of the trimmed result to screen
+        file_id : str
+            Prefix for output file if dendrogram and sorted distance matrix of the trimmed result are saved
+
+        Returns:
+        labels : :obj:`list` of :obj:`int`
+            Labels of cluster memberships for each detection after trimming
+        """
+    dists_new = distance_matrix.copy()
+    trim_indices = []
+    while True:
+        new_indices = trim_clusters(labels, dists_new, ratio_thresh=trimming_thresh)
+        if len(new_indices) == 0:
+            break
+        else:
+            trim_indices = trim_indices + new_indices
+
+        for indices in trim_indices:
+            dists_new[indices[0], indices[1]] = dist_max
+            dists_new[indices[1], indices[0]] = dist_max
+        if file_id:
+            _, labels, _ = cluster(dists_new, threshold * trim_thresh_scalar, linkage_method=linkage_method, show_result=show_result, file_id=file_id + "-trim", trim_indices=trim_indices)
+        else:
+            _, labels, _ = cluster(dists_new, threshold * trim_thresh_scalar, linkage_method=linkage_method, show_result=show_result, trim_indices=trim_indices)
+
+    return labels
+
+
+def cluster_sparse(distance_matrix, threshold, dist_max=10.0, linkage_method='weighted', trimming_thresh=None, trim_thresh_scalar=1.0):
+    """Computes the clustering solution for a sparse distance matrix and threshold
+
+        Single linkage clusters are the connected components of the minimum spanning tree after
+        removing edges above the threshold.  For other linkage methods (weighted, average, complete),
+        clusters at the threshold are subsets of the connected components of the thresholded distance
+        graph, so each component is clustered separately using a dense hierarchical clustering of its
+        (small) distance sub-matrix with absent pairs at dist_max.
+
+        Parameters
+        ----------
+        distance_matrix : scipy.sparse.csr_matrix
+            Sparse distance matrix (see build_sparse_distance_matrix)
+        threshold : float
+            Threshold value defining linkage cutoff
+        dist_max: float
+            Maximum value allowed in distance matrix (used for absent pairs)
+        linkage_method : str
+            Linkage method used by scipy.cluster.hierarchy.linkage
+        trimming_thresh : float
+            Threshold for radius / mean inter-element distance to require trimming (None to skip trimming)
+        trim_thresh_scalar : float
+            Scalar modifying the threshold value for linkage cutoff in the trimmed result
+
+        Returns:
+        labels : 1darray
+            Labels of cluster memberships for each detection
+        """
+    det_cnt = distance_matrix.shape[0]
+
+    graph = sparse.csr_matrix(distance_matrix, copy=True)
+    if linkage_method == 'single':
+        graph = minimum_spanning_tree(graph).tocsr()
+    graph.data[graph.data > threshold] = 0.0
+    graph.eliminate_zeros()
+
+    comp_cnt, comp_labels = connected_components(graph, directed=False)
+    if linkage_method == 'single' or threshold >= dist_max:
+        return comp_labels
+
+    labels = np.empty(det_cnt, dtype=int)
+    label_cnt = 0
+
+    comp_order = np.argsort(comp_labels, kind='stable')
+    comp_bounds = np.concatenate(([0], np.cumsum(np.bincount(comp_labels, minlength=comp_cnt))))
+    for n in range(comp_cnt):
+        indices = comp_order[comp_bounds[n]:comp_bounds[n + 1]]
+        if len(indices) == 1:
+            labels[indices] = label_cnt
+            label_cnt += 1
+        else:
+            sub_dists = distance_matrix[indices][:, indices].toarray()
+            sub_dists[sub_dists == 0.0] = dist_max
+            np.fill_diagonal(sub_dists, 0.0)
+
+            _, sub_labels, _ = cluster(sub_dists, threshold, linkage_method=linkage_method)
+            if trimming_thresh:
+                sub_labels = recluster_trimmed(sub_labels, sub_dists, threshold, dist_max=dist_max, linkage_method=linkage_method, trimming_thresh=trimming_thresh, trim_thresh_scalar=trim_thresh_scalar)
+
+            labels[indices] = sub_labels + label_cnt
+            label_cnt += max(sub_labels) + 1
+
+    return labels
+
+
+def summarize_sparse_clusters(labels, distance_matrix, dist_max=10.0, population_min=3):
+    """Summarizes clusters identified from a sparse distance matrix
+
+        Parameters
+        ----------
+        labels : :obj:`list` of :obj:`int`
+            Labels of cluster memberships for each detection
+        distance_matrix : scipy.sparse.csr_matrix
+            Sparse distance matrix (see build_sparse_distance_matrix)
+        dist_max: float
+            Maximum value allowed in distance matrix (used for absent pairs)
+        population_min : int
+            Minimum number of detections in a cluster to declare an event
+
+        Returns:
+        clusters : :obj:`list` of :obj:`list` of :obj:`int`
+            Detection indices of each cluster with sufficient membership
+        qualities : :obj:`list` of float
+            Average spacing of each cluster
+        """
+    clusters, qualities = [], []
+
+    for indices in label_groups(labels, population_min):
+        sub_dists = distance_matrix[indices][:, indices].toarray()
+        sub_dists[sub_dists == 0.0] = dist_max
+        np.fill_diagonal(sub_dists, 0.0)
+
+        clusters += [list(indices)]
+        qualities += [np.sum(sub_dists) / (len(indices) * (len(indices) - 1.0))]
+
+    return clusters, qualities
+
+
 def summarize_clusters(labels, distance_matrix, population_min=3, show_result=False):
     """Prints summary of cluster association solution to screen
 
@@ -549,31 +1304,27 @@ def summarize_clusters(labels, distance_matrix, population_min=3, show_result=Fa
     clusters = []
     qualities = []
 
-    det_cnt = len(distance_matrix)
-    for n in range(max(labels + 1)):
-        if len(np.arange(det_cnt)[labels==n]) >= population_min:
-            avg_spacing, diam, cnt = 0.0, 0.0, 0
-            spacing = np.zeros(len(np.arange(det_cnt)[labels==n]))
-
-            for j, n1 in enumerate(np.arange(det_cnt)[labels==n]):
-                for n2 in np.arange(det_cnt)[labels==n]:
-                    avg_spacing += distance_matrix[n1][n2] / (len(np.arange(det_cnt)[labels==n]) * (len(np.arange(det_cnt)[labels==n]) - 1.0))
-                    spacing[j] += distance_matrix[n1][n2] / (len(np.arange(det_cnt)[labels==n]) - 1.0)
-                    diam = max(diam, distance_matrix[n1][n2])
-
-            clusters += [list(np.arange(det_cnt)[labels==n])]
-            qualities += [avg_spacing]
-
-            if show_result:
-                print('\tCluster Summary:')
-                print('\tDetection IDs:', np.arange(det_cnt)[labels==n])
-                print('\t\tDetection Average Spacing:', spacing)
-                print('\t\tCluster Average Spacing:',  avg_spacing)
-                print('\t\tCluster Diameter:',  diam, '\n')
+    distance_matrix = np.asarray(distance_matrix)
+    for indices in label_groups(labels, population_min):
+        distance_submatrix = distance_matrix[np.ix_(indices, indices)]
+
+        spacing = np.sum(distance_submatrix, axis=1) / (len(indices) - 1.0)
+        avg_spacing = np.sum(spacing) / len(indices)
+        diam = max(0.0, np.max(distance_submatrix))
+
+        clusters += [list(indices)]
+        qualities += [avg_spacing]
+
+        if show_result:
+            print('\tCluster Summary:')
+            print('\tDetection IDs:', indices)
+            print('\t\tDetection Average Spacing:', spacing)
+            print('\t\tCluster Average Spacing:',  avg_spacing)
+            print('\t\tCluster Diameter:',  diam, '\n')
 
     return clusters, qualities
 
-def run(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, show_result=None, file_id=None, linkage_method='weighted', trimming_thresh=None, trim_thresh_scalar=1.0, prg_bar=False, pool=None):
+def run(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, show_result=None, file_id=None, linkage_method='weighted', trimming_thresh=None, trim_thresh_scalar=1.0, prg_bar=False, pool=None, pair_cache=None):
     """Run the Hierarchical Joint-Likelihood (HJL) association analysis
 
         Runs the clustering analysis on a list of detecctions and returns the
@@ -600,13 +1351,15 @@ def run(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 *
         show_results : boolean
             Boolean to plot dendrogram and sorted distance matrix to screeen
         file_id : str
-            Prefix for output file is dendrogram and sorted distance matrix figure is saved
+            Prefix for output file is dendrogram and sorted distance matrix figure is saved (the distance matrix is also cached as file_id-dm.npz, see DistanceMatrixCache)
         linkage_method : str
             Linkage method used by scipy.cluster.hierarchy.linkage
         trim_thresh_scalar : float
             Scalar modifying the threshold value for linkage cutoff in the trimmed result
         pool : pathos.multiprocessing.ProcessingPool
             Multiprocessing pool for accelerating calculations
+        pair_cache : PairCache
+            Cache of previously computed pair joint-likelihoods
 
         Returns:
         labels : :obj:`list` of :obj:`int`
@@ -617,16 +1370,18 @@ def run(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 *
 
     # Compute distance matrix via joint-likelihood values and adjust maximum distances
     if file_id:
-        if os.path.isfile(file_id + "-dm.npy"):
-            dists = np.load(file_id + "-dm.npy")
-        else:
-            dists = np.array(build_distance_matrix(det_list, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=prg_bar))
-            np.save(file_id + "-dm", dists)
+        dm_cache = DistanceMatrixCache(file_id + "-dm.npz")
+        params = dm_cache.param_hash(bm_width, rng_max, rad_min, rad_max, resol)
+
+        dists = dm_cache.load(det_list, params)
+        if dists is None or len(dists) < len(det_list):
+            dists = np.array(build_distance_matrix(det_list, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=prg_bar, pair_cache=pair_cache, dist_prev=dists))
+            dm_cache.save(det_list, params, dists)
         dists[dists > dist_max] = dist_max
         print('\t' + "Clustering detections into events...")
         _, labels, sorted_dists = cluster(dists, threshold, linkage_method=linkage_method, show_result=show_result, file_id=file_id + "-orig")
     else :
-        dists = np.array(build_distance_matrix(det_list, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=prg_bar))
+        dists = np.array(build_distance_matrix(det_list, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, pool=pool, progress=prg_bar, pair_cache=pair_cache))
         dists[dists > dist_max] = dist_max
         print('\t' + "Clustering detections into events...")
         _, labels, sorted_dists = cluster(dists, threshold, linkage_method=linkage_method, show_result=show_result)
@@ -634,35 +1389,91 @@ def run(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 *
     # Trim clusters with poor shape
     if trimming_thresh:
         print('\t' + "Trimming poor linkages and repeating clustering analysis...")
-        dists_new = dists.copy()
-        trim_indices = []
-        while True:
-            new_indicies = trim_clusters(labels, dists_new, ratio_thresh=trimming_thresh)
-            if len(new_indicies) == 0:
-                break
-            else :
-                trim_indices = trim_indices + new_indicies
-
-            # Re-run clustering on trimmed matrix
-            for indices in trim_indices:
-                dists_new[indices[0], indices[1]] = dist_max
-                dists_new[indices[1], indices[0]] = dist_max
-
-            if file_id:
-                _, labels, _ = cluster(dists_new, threshold * trim_thresh_scalar, linkage_method=linkage_method, show_result=show_result, file_id=file_id + "-trim", trim_indices=trim_indices)
-            else:
-                _, labels, _ = cluster(dists_new, threshold * trim_thresh_scalar, linkage_method=linkage_method, show_result=show_result, trim_indices=trim_indices)
+        labels = recluster_trimmed(labels, dists, threshold, dist_max=dist_max, linkage_method=linkage_method, trimming_thresh=trimming_thresh, trim_thresh_scalar=trim_thresh_scalar, show_result=show_result, file_id=file_id)
 
     return labels, sorted_dists
 
 
+def run_sparse(det_list, threshold, dist_max=10.0, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0, resol=180, linkage_method='weighted', trimming_thresh=None, trim_thresh_scalar=1.0, prg_bar=False, pool=None, pair_cache=None):
+    """Run the Hierarchical Joint-Likelihood (HJL) association analysis using a sparse distance matrix
+
+        Memory and clustering cost scale with the number of plausible detection pairs rather than
+        the square of the number of detections so that large detection sets can be associated in
+        a single pass
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        threshold : float
+            Threshold value defining linkage cutoff
+        dist_max: float
+            Maximum value allowed in distance matrix
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+        resol : int
+            Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
+        linkage_method : str
+            Linkage method used by scipy.cluster.hierarchy.linkage ('single' uses a minimum spanning tree)
+        trimming_thresh : float
+            Threshold for radius / mean inter-element distance to require trimming (None to skip trimming)
+        trim_thresh_scalar : float
+            Scalar modifying the threshold value for linkage cutoff in the trimmed result
+        pool : pathos.multiprocessing.ProcessingPool
+            Multiprocessing pool for accelerating calculations
+        pair_cache : PairCache
+            Cache of previously computed pair joint-likelihoods
+
+        Returns:
+        labels : 1darray
+            Labels of cluster memberships for each detection
+        distance_matrix : scipy.sparse.csr_matrix
+            Sparse distance matrix
+        """
+
+    dists = build_sparse_distance_matrix(det_list, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, dist_max=dist_max, pool=pool, progress=prg_bar, pair_cache=pair_cache)
+    print('\t' + "Clustering detections into events...")
+    labels = cluster_sparse(dists, threshold, dist_max=dist_max, linkage_method=linkage_method, trimming_thresh=trimming_thresh, trim_thresh_scalar=trim_thresh_scalar)
+
+    return labels, dists
+
+
 def id_events(det_list, threshold, starttime=None, endtime=None, dist_max=10.0, bm_width=10.0, rng_max=2500.0, rad_min=100.0, rad_max=1000.0, 
-    resol=180, linkage_method='weighted', trimming_thresh=3.8, cluster_det_population=3, cluster_array_population=2, prg_bar=True, pool=None):
-    """
-    
-    
+    resol=180, linkage_method='weighted', trimming_thresh=3.8, cluster_det_population=3, cluster_array_population=2, prg_bar=True, pool=None, pair_cache=None, use_sparse=False):
+    """Identify events in a detection set using overlapping analysis windows
+
+        Slides an analysis window through the detection set and runs the HJL clustering analysis
+        on the detections in each window.  Pair joint-likelihoods are cached so that pairs shared
+        by overlapping windows are only integrated once.  If use_sparse is True, the full detection
+        set is instead analyzed in a single pass using a sparse distance matrix (see run_sparse).
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection`
+            List of detections (see infrapy.propagation.likelihoods)
+        threshold : float
+            Threshold value defining linkage cutoff
+        pair_cache : PairCache or str
+            Cache of pair joint-likelihoods or the path of a cache file to load and update
+        use_sparse : boolean
+            Analyze all detections in a single pass using a sparse distance matrix
+
+        Returns:
+        events : :obj:`list` of :obj:`list` of :obj:`int`
+            Indices of the detections in each identified event
+        event_qls : :obj:`list` of float
+            Quality of each identified event
     """
 
+    if pair_cache is None or isinstance(pair_cache, str):
+        pair_cache = PairCache(pair_cache)
+
 
     # Compute maximum propagation time and analysis window length [minutes]
     max_prop_time = int(rng_max / 0.22)
@@ -682,23 +1493,41 @@ def id_events(det_list, threshold, starttime=None, endtime=None, dist_max=10.0,
 
     # run clustering analysis
     events, event_qls = [], []
-    for dt in range(0, duration, analysis_window):
-        window_start = starttime +  dt # np.timedelta64(dt, 'm')
-        window_end = starttime + (dt + analysis_window + max_prop_time) # np.timedelta64(dt + int(analysis_window + max_prop_time), 'm')
-        print('\n' + "Running event identification for:", window_start, "-", window_end)
+    if use_sparse:
+        print('\n' + "Running event identification for:", starttime, "-", endtime + max_prop_time)
 
-        temp = [(n, det) for n, det in enumerate(det_list) if np.logical_and(window_start <= UTCDateTime(det.peakF_UTCtime.astype(datetime)), UTCDateTime(det.peakF_UTCtime.astype(datetime)) <= window_end)]
+        temp = [(n, det) for n, det in enumerate(det_list) if np.logical_and(starttime <= UTCDateTime(det.peakF_UTCtime.astype(datetime)), UTCDateTime(det.peakF_UTCtime.astype(datetime)) <= endtime + max_prop_time)]
         key = [pair[0] for pair in temp]
         new_list = [pair[1] for pair in temp]
 
         if len(temp) >= cluster_det_population:
-            labels, dists = run(new_list, threshold, dist_max=dist_max, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, 
-                linkage_method=linkage_method, trimming_thresh=trimming_thresh, prg_bar=prg_bar, pool=pool)
-            clusters, qualities = summarize_clusters(labels, dists, population_min=cluster_det_population)
+            labels, dists = run_sparse(new_list, threshold, dist_max=dist_max, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, 
+                linkage_method=linkage_method, trimming_thresh=trimming_thresh, prg_bar=prg_bar, pool=pool, pair_cache=pair_cache)
+            clusters, qualities = summarize_sparse_clusters(labels, dists, dist_max=dist_max, population_min=cluster_det_population)
 
             for n in range(len(clusters)):
                 events += [[key[n] for n in clusters[n]]]
                 event_qls += [10.0**(-qualities[n])]
+    else:
+        for dt in range(0, duration, analysis_window):
+            window_start = starttime +  dt # np.timedelta64(dt, 'm')
+            window_end = starttime + (dt + analysis_window + max_prop_time) # np.timedelta64(dt + int(analysis_window + max_prop_time), 'm')
+            print('\n' + "Running event identification for:", window_start, "-", window_end)
+
+            temp = [(n, det) for n, det in enumerate(det_list) if np.logical_and(window_start <= UTCDateTime(det.peakF_UTCtime.astype(datetime)), UTCDateTime(det.peakF_UTCtime.astype(datetime)) <= window_end)]
+            key = [pair[0] for pair in temp]
+            new_list = [pair[1] for pair in temp]
+
+            if len(temp) >= cluster_det_population:
+                labels, dists = run(new_list, threshold, dist_max=dist_max, bm_width=bm_width, rng_max=rng_max, rad_min=rad_min, rad_max=rad_max, resol=resol, 
+                    linkage_method=linkage_method, trimming_thresh=trimming_thresh, prg_bar=prg_bar, pool=pool, pair_cache=pair_cache)
+                clusters, qualities = summarize_clusters(labels, dists, population_min=cluster_det_population)
+
+                for n in range(len(clusters)):
+                    events += [[key[n] for n in clusters[n]]]
+                    event_qls += [10.0**(-qualities[n])]
+
+    pair_cache.save()
 
     # clean up clusters
     print('\n' + "Cleaning up and merging clusters...")
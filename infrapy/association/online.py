@@ -0,0 +1,264 @@
+# infrapy.association.online.py
+#
+# Incremental (online) form of the hierarchical joint-likelihood
+# (HJL) association analysis for detections arriving in near
+# real-time.  Joint-likelihoods are only computed against detections
+# within the maximum propagation time horizon and candidate events
+# are emitted, updated, and retired as detections accumulate.
+
+import numpy as np
+
+from scipy.sparse.csgraph import connected_components
+
+from . import hjl
+
+
+class OnlineAssociator(object):
+    """Incremental association of detections into events
+
+        Maintains the set of active detections (those within the propagation time horizon of the
+        latest detection or belonging to an open candidate event) and their joint-likelihood distances.
+        Each new detection is compared only against the active detections and the clustering is
+        recomputed only for the group of detections linked to it below the threshold, so that the
+        per-detection cost and memory are bounded by the detection rate within the horizon.
+
+        Because weighted (and average/complete) linkage clusters at a threshold are subsets of the
+        connected components of the thresholded distance graph, re-clustering only the component
+        containing the new detection reproduces the batch clustering of the active detections.
+
+        Parameters
+        ----------
+        threshold : float
+            Threshold value defining linkage cutoff
+        dist_max: float
+            Maximum value allowed in distance matrix
+        bm_width : float
+            Width of the projected beam [degrees]
+        rng_max : float
+            Maximmum range for beam projection [km]
+        rad_min : float
+            Minimum radius of the integration region [km]
+        rad_max : float
+            Maximum radius of the integration region [km]
+        resol : int
+            Number of radial and azimuthal points used in the polar projection of the likelihood PDFs
+        linkage_method : str
+            Linkage method used by scipy.cluster.hierarchy.linkage
+        trimming_thresh : float
+            Threshold for radius / mean inter-element distance to require trimming (None to skip trimming)
+        cluster_det_population : int
+            Minimum number of detections in a cluster to declare an event
+        cluster_array_population : int
+            Minimum number of arrays in a cluster to declare an event
+        pair_cache : hjl.PairCache
+            Cache of previously computed pair joint-likelihoods (values for detections dropped from the active set are evicted)
+        pool : pathos.multiprocessing.ProcessingPool
+            Multiprocessing pool for accelerating calculations
+
+        Notes
+        -----
+        Calls to add() and flush() return a list of updates of the form (status, event id, detections, quality)
+        with status 'new' for a newly declared candidate event, 'update' when the membership of a candidate changes,
+        'cancel' when a candidate no longer satisfies the event criteria, and 'retire' when no further detections
+        can be associated with it (its latest detection is beyond the propagation time horizon).  Retired events are
+        only returned to the caller and are not stored by the associator.
+        """
+
+    def __init__(self, threshold, dist_max=10.0, bm_width=10.0, rng_max=2500.0, rad_min=100.0, rad_max=1000.0, resol=180, linkage_method='weighted',
+                 trimming_thresh=None, cluster_det_population=3, cluster_array_population=2, pair_cache=None, pool=None):
+        self.threshold = threshold
+        self.dist_max = dist_max
+        self.bm_width = bm_width
+        self.rng_max = rng_max
+        self.rad_min = rad_min
+        self.rad_max = rad_max
+        self.resol = resol
+        self.linkage_method = linkage_method
+        self.trimming_thresh = trimming_thresh
+        self.cluster_det_population = cluster_det_population
+        self.cluster_array_population = cluster_array_population
+        self.pool = pool
+
+        # distances between active detections are kept in self.dists, so a
+        # pair cache is only used if one is provided
+        self.pair_cache = pair_cache
+        self.params = hjl.PairCache.param_key(bm_width, rng_max, rad_min, rad_max, resol)
+
+        # maximum propagation time for detections to share a source [s]
+        self.horizon = np.timedelta64(int(rng_max * hjl.rcel_bounds()[1] * 1e3), 'ms')
+
+        self.active = []
+        self.dists = np.zeros((0, 0))
+        self.latest = None
+
+        self.events = {}
+        self.event_qls = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.active)
+
+    def _pair_dists(self, det):
+        # compute distances from a new detection to all active detections
+        det_cnt = len(self.active)
+        row = np.full(det_cnt, -np.log10(np.finfo(float).epsneg))
+        if det_cnt == 0:
+            return row
+
+        pairs, keep = hjl.screen_pairs(self.active + [det], bm_width=self.bm_width, rng_max=self.rng_max, pairs=[[n, det_cnt] for n in range(det_cnt)])
+
+        vals, missing = {}, []
+        for n in pairs[keep, 0]:
+            val = None if self.pair_cache is None else self.pair_cache.get(self.active[n], det, self.params)
+            if val is None:
+                missing = missing + [n]
+            else:
+                vals[n] = val
+
+        if self.pool:
+            args = [[self.active[n], det, self.bm_width, self.rng_max, self.rad_min, self.rad_max, self.resol, 0] for n in missing]
+            out = self.pool.map(hjl.compute_assoc_pair_wrapper, args)
+        else:
+            out = [hjl.compute_assoc_pair(self.active[n], det, bm_width=self.bm_width, rng_max=self.rng_max, rad_min=self.rad_min, rad_max=self.rad_max, resol=self.resol) for n in missing]
+
+        for n, val in zip(missing, out):
+            if self.pair_cache is not None:
+                self.pair_cache.set(self.active[n], det, self.params, val)
+            vals[n] = val
+
+        for n, val in vals.items():
+            row[n] = -np.log10(max(val, np.finfo(float).epsneg))
+
+        return row
+
+    def _cluster(self, dists):
+        # cluster a group of detections (with trimming as in hjl.run)
+        if len(dists) < 2:
+            return np.zeros(len(dists), dtype=int)
+
+        _, labels, _ = hjl.cluster(dists, self.threshold, linkage_method=self.linkage_method)
+        if self.trimming_thresh:
+            labels = hjl.recluster_trimmed(labels, dists, self.threshold, dist_max=self.dist_max, linkage_method=self.linkage_method, trimming_thresh=self.trimming_thresh)
+
+        return labels
+
+    def _is_event(self, members):
+        if len(members) < self.cluster_det_population:
+            return False
+
+        locs = np.array([[self.active[j].latitude, self.active[j].longitude] for j in members])
+        return max(len(np.unique(locs[:, 0])), len(np.unique(locs[:, 1]))) >= self.cluster_array_population
+
+    def _remove(self, indices):
+        mask = np.ones(len(self.active), dtype=bool)
+        mask[list(indices)] = False
+
+        if self.pair_cache is not None:
+            self.pair_cache.evict([det for det, keep in zip(self.active, mask) if not keep])
+
+        self.active = [det for det, keep in zip(self.active, mask) if keep]
+        self.dists = self.dists[mask][:, mask]
+
+    def _retire(self):
+        # retire events that can no longer gain detections and drop stale detections
+        cutoff = self.latest - self.horizon
+        updates = []
+
+        for ev_id in list(self.events.keys()):
+            if max(det.peakF_UTCtime for det in self.events[ev_id]) < cutoff:
+                updates = updates + [('retire', ev_id, self.events.pop(ev_id), self.event_qls.pop(ev_id))]
+
+        open_ids = set(id(det) for ev in self.events.values() for det in ev)
+        stale = [n for n, det in enumerate(self.active) if det.peakF_UTCtime < cutoff and id(det) not in open_ids]
+        if len(stale) > 0:
+            self._remove(stale)
+
+        return updates
+
+    def add(self, det):
+        """Add a detection and update the candidate events
+
+            Parameters
+            ----------
+            det : InfrasoundDetection
+                New detection (see infrapy.propagation.likelihoods)
+
+            Returns:
+            updates : :obj:`list` of :obj:`tuple`
+                Event updates as (status, event id, detections, quality)
+            """
+        if self.latest is None or det.peakF_UTCtime > self.latest:
+            self.latest = det.peakF_UTCtime
+        updates = self._retire()
+
+        row = self._pair_dists(det)
+        row[row > self.dist_max] = self.dist_max
+
+        det_cnt = len(self.active) + 1
+        dists = np.zeros((det_cnt, det_cnt))
+        dists[:-1, :-1] = self.dists
+        dists[-1, :-1] = row
+        dists[:-1, -1] = row
+
+        self.active = self.active + [det]
+        self.dists = dists
+
+        # clusters can only change if the new detection links to an active detection
+        if det_cnt < 2 or np.min(row) > self.threshold:
+            return updates
+
+        # re-cluster the connected component containing the new detection
+        _, comp_labels = connected_components(self.dists <= self.threshold, directed=False)
+        comp = np.where(comp_labels == comp_labels[-1])[0]
+
+        sub_dists = self.dists[comp][:, comp]
+        labels = self._cluster(sub_dists)
+        clusters, qualities = hjl.summarize_clusters(labels, sub_dists, population_min=self.cluster_det_population)
+
+        # match clusters to the open events overlapping the component
+        comp_ids = set(id(self.active[j]) for j in comp)
+        open_ids = [ev_id for ev_id, ev in self.events.items() if any(id(d) in comp_ids for d in ev)]
+        matched = []
+
+        for cluster, ql in zip(clusters, qualities):
+            members = [comp[j] for j in cluster]
+            if not self._is_event(members):
+                continue
+
+            dets = [self.active[j] for j in members]
+            det_ids = set(id(d) for d in dets)
+
+            overlaps = [len(det_ids.intersection(set(id(d) for d in self.events[ev_id]))) for ev_id in open_ids]
+            if len(overlaps) > 0 and max(overlaps) > 0 and open_ids[np.argmax(overlaps)] not in matched:
+                ev_id = open_ids[np.argmax(overlaps)]
+                if det_ids != set(id(d) for d in self.events[ev_id]):
+                    updates = updates + [('update', ev_id, dets, 10.0**(-ql))]
+            else:
+                ev_id = self._next_id
+                self._next_id += 1
+                updates = updates + [('new', ev_id, dets, 10.0**(-ql))]
+
+            self.events[ev_id] = dets
+            self.event_qls[ev_id] = 10.0**(-ql)
+            matched = matched + [ev_id]
+
+        for ev_id in open_ids:
+            if ev_id not in matched:
+                updates = updates + [('cancel', ev_id, self.events.pop(ev_id), self.event_qls.pop(ev_id))]
+
+        return updates
+
+    def flush(self):
+        """Retire all open events (e.g., at the end of a detection stream)
+
+            Returns:
+            updates : :obj:`list` of :obj:`tuple`
+                Event updates as (status, event id, detections, quality)
+            """
+        updates = []
+        for ev_id in list(self.events.keys()):
+            updates = updates + [('retire', ev_id, self.events.pop(ev_id), self.event_qls.pop(ev_id))]
+
+        self._remove(range(len(self.active)))
+
+        return updates
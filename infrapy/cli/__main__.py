@@ -55,7 +55,9 @@ main.add_command(cli_detection.run_fd)
 main.add_command(cli_detection.run_fkd)
 main.add_command(cli_detection.run_sd)
 main.add_command(cli_assoc.run_assoc)
+main.add_command(cli_assoc.run_assoc_online)
 main.add_command(cli_loc.run_loc)
+main.add_command(cli_loc.run_loc_batch)
 
 # SpYE
 run_spye.add_command(cli_loc.regional)
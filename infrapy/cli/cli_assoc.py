@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import sys
 import os 
+import time
 
 import click
 import warnings
@@ -15,7 +16,9 @@ from obspy import UTCDateTime
 
 from ..utils import config
 from ..utils import data_io
+from ..utils import latlon
 from ..association import hjl
+from ..association import online
 
 
 @click.command('run_assoc', short_help="Associate detections into events")
@@ -33,9 +36,12 @@ from ..association import hjl
 @click.option("--trimming-threshold", help="Mishapen cluster threshold (default: " + config.defaults['ASSOC']['trimming_threshold'] + ")", default=None, type=float)
 @click.option("--event-population-min", help="Minimum detection count in event (default: " + config.defaults['ASSOC']['event_population_min'] + ")", default=None, type=int)
 @click.option("--event-station-min", help="Minimum station count in event (default: " + config.defaults['ASSOC']['event_station_min'] + ")", default=None, type=int)
+@click.option("--pair-cache", help="Cache file for pair joint-likelihoods (default: None)", default=None)
+@click.option("--sparse", help="Analyze all detections in one pass with a sparse distance matrix (default: " + config.defaults['ASSOC']['sparse'] + ")", default=None, type=bool)
+@click.option("--geod-backend", help="Spherical geodesic backend, 'pyproj' or 'numba' (default: " + config.defaults['ASSOC']['geod_backend'] + ")", default=None)
 @click.option("--cpu-cnt", help="CPU count for multithreading (default: None)", default=None, type=int)
 def run_assoc(config_file, local_detect_label, local_event_label, starttime, endtime, back_az_width, range_max, resolution, distance_matrix_max, cluster_linkage, 
-                cluster_threshold, trimming_threshold, event_population_min, event_station_min, cpu_cnt):
+                cluster_threshold, trimming_threshold, event_population_min, event_station_min, pair_cache, sparse, geod_backend, cpu_cnt):
     '''
     Run association analysis to identify events in a detection set
 
@@ -93,6 +99,9 @@ def run_assoc(config_file, local_detect_label, local_event_label, starttime, end
     trimming_threshold = config.set_param(user_config, 'ASSOC', 'trimming_threshold', trimming_threshold, 'float')
     event_population_min = config.set_param(user_config, 'ASSOC', 'event_population_min', event_population_min, 'float')
     event_station_min = config.set_param(user_config, 'ASSOC', 'event_station_min', event_station_min, 'float')
+    pair_cache = config.set_param(user_config, 'ASSOC', 'pair_cache', pair_cache, 'string')
+    sparse = config.set_param(user_config, 'ASSOC', 'sparse', sparse, 'bool')
+    geod_backend = config.set_param(user_config, 'ASSOC', 'geod_backend', geod_backend, 'string')
     cpu_cnt = config.set_param(user_config, 'ASSOC', 'cpu_cnt', cpu_cnt, 'int')
 
     click.echo('\n' + "Parameter summary:")
@@ -103,6 +112,11 @@ def run_assoc(config_file, local_detect_label, local_event_label, starttime, end
     click.echo("  cluster_linkage: " + str(cluster_linkage))
     click.echo("  cluster_threshold: " + str(cluster_threshold))
     click.echo("  trimming_threshold: " + str(trimming_threshold))
+    if pair_cache is not None:
+        click.echo("  pair_cache: " + str(pair_cache))
+    click.echo("  sparse: " + str(sparse))
+    click.echo("  geod_backend: " + str(geod_backend))
+    latlon.set_geod_backend(geod_backend)
     if cpu_cnt is not None:
         click.echo("  cpu_cnt: " + str(cpu_cnt))
         pl = Pool(cpu_cnt)
@@ -114,7 +128,7 @@ def run_assoc(config_file, local_detect_label, local_event_label, starttime, end
     events, event_qls = hjl.id_events(det_list, cluster_threshold, starttime=starttime, endtime=endtime, dist_max=distance_matrix_max, 
                                     bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=(range_max / 4.0), 
                                     resol=resolution, linkage_method=cluster_linkage, trimming_thresh=trimming_threshold, 
-                                    cluster_det_population=event_population_min, cluster_array_population=event_station_min, pool=pl)
+                                    cluster_det_population=event_population_min, cluster_array_population=event_station_min, pool=pl, pair_cache=pair_cache, use_sparse=sparse)
 
     click.echo("Identified " + str(len(events)) + " events." + '\n')
     data_io.write_events(events, event_qls, det_list, local_event_label)    
@@ -122,3 +136,144 @@ def run_assoc(config_file, local_detect_label, local_event_label, starttime, end
     if pl is not None:
         pl.terminate()
         pl.close()
+
+
+@click.command('run_assoc_online', short_help="Incrementally associate detections from a growing file")
+@click.option("--config-file", help="Configuration file", default=None)
+@click.option("--local-detect-label", help="Detection file (polled for new detections)", default=None)
+@click.option("--local-event-label", help="Path for event info output", default=None)
+@click.option("--back-az-width", help="Width of beam projection (default: " + config.defaults['ASSOC']['back_az_width'] + " [deg])", default=None, type=float)
+@click.option("--range-max", help="Maximum source-receiver range (default: " + config.defaults['ASSOC']['range_max'] + " [km])", default=None, type=float)
+@click.option("--resolution", help="Number of points/dimension for numerical sampling (default: " + config.defaults['ASSOC']['resolution'] + ")", default=None, type=int)
+@click.option("--distance-matrix-max", help="Distance matrix maximum (default: " + config.defaults['ASSOC']['distance_matrix_max'] + ")", default=None, type=float)
+@click.option("--cluster-linkage", help="Linkage method for clustering (default: " + config.defaults['ASSOC']['cluster_linkage'] + ")", default=None)
+@click.option("--cluster-threshold", help="Cluster linkage threshold (default: " + config.defaults['ASSOC']['cluster_threshold'] + ")", default=None, type=float)
+@click.option("--trimming-threshold", help="Mishapen cluster threshold (default: " + config.defaults['ASSOC']['trimming_threshold'] + ")", default=None, type=float)
+@click.option("--event-population-min", help="Minimum detection count in event (default: " + config.defaults['ASSOC']['event_population_min'] + ")", default=None, type=int)
+@click.option("--event-station-min", help="Minimum station count in event (default: " + config.defaults['ASSOC']['event_station_min'] + ")", default=None, type=int)
+@click.option("--poll-interval", help="Time between checks of the detection file (default: " + config.defaults['ASSOC']['poll_interval'] + " [s])", default=None, type=float)
+@click.option("--max-idle", help="Number of polls without new detections before stopping (default: " + config.defaults['ASSOC']['max_idle'] + ")", default=None, type=int)
+@click.option("--geod-backend", help="Spherical geodesic backend, 'pyproj' or 'numba' (default: " + config.defaults['ASSOC']['geod_backend'] + ")", default=None)
+@click.option("--cpu-cnt", help="CPU count for multithreading (default: None)", default=None, type=int)
+def run_assoc_online(config_file, local_detect_label, local_event_label, back_az_width, range_max, resolution, distance_matrix_max, cluster_linkage, 
+                cluster_threshold, trimming_threshold, event_population_min, event_station_min, poll_interval, max_idle, geod_backend, cpu_cnt):
+    '''
+    Run incremental association analysis on a growing detection file
+
+    \b
+    Example usage (run from infrapy/examples directory):
+    \tinfrapy run_assoc_online --local-detect-label data/example1.dets.json --local-event-label online_example --max-idle 1
+    '''
+
+    click.echo("")
+    click.echo("#####################################")
+    click.echo("##                                 ##")
+    click.echo("##             InfraPy             ##")
+    click.echo("##   Online Association Analysis   ##")
+    click.echo("##                                 ##")
+    click.echo("#####################################")
+    click.echo("")    
+
+    if config_file:
+        click.echo('\n' + "Loading configuration info from: " + config_file)
+        if os.path.isfile(config_file):
+            user_config = cnfg.ConfigParser()
+            user_config.read(config_file)
+        else:
+            click.echo("Invalid configuration file (file not found)")
+            return 0
+    else:
+        user_config = None
+
+    # Data IO parameters
+    local_detect_label = config.set_param(user_config, 'DETECTION IO', 'local_detect_label', local_detect_label, 'string')
+    local_event_label = config.set_param(user_config, 'DETECTION IO', 'local_event_label', local_event_label, 'string')
+
+    click.echo('\n' + "Data summary:")
+    click.echo("  local_detect_label: " + str(local_detect_label))
+    click.echo("  local_event_label: " + str(local_event_label))
+
+    if local_detect_label is None or local_event_label is None:
+        msg = "Association analysis requires detection input (--local-detect-label) and output path (--local-event-label)"
+        warnings.warn(msg)
+        return 0
+
+    if ".dets.json" not in local_detect_label:
+        local_detect_label = local_detect_label + ".dets.json"
+
+    # Algorithm parameters
+    back_az_width = config.set_param(user_config, 'ASSOC', 'back_az_width', back_az_width, 'float')
+    range_max = config.set_param(user_config, 'ASSOC', 'range_max', range_max, 'float')
+    resolution = config.set_param(user_config, 'ASSOC', 'resolution', resolution, 'int')
+    distance_matrix_max = config.set_param(user_config, 'ASSOC', 'distance_matrix_max', distance_matrix_max, 'float')
+    cluster_linkage = config.set_param(user_config, 'ASSOC', 'cluster_linkage', cluster_linkage, 'string')
+    cluster_threshold = config.set_param(user_config, 'ASSOC', 'cluster_threshold', cluster_threshold, 'float')
+    trimming_threshold = config.set_param(user_config, 'ASSOC', 'trimming_threshold', trimming_threshold, 'float')
+    event_population_min = config.set_param(user_config, 'ASSOC', 'event_population_min', event_population_min, 'int')
+    event_station_min = config.set_param(user_config, 'ASSOC', 'event_station_min', event_station_min, 'int')
+    poll_interval = config.set_param(user_config, 'ASSOC', 'poll_interval', poll_interval, 'float')
+    max_idle = config.set_param(user_config, 'ASSOC', 'max_idle', max_idle, 'int')
+    geod_backend = config.set_param(user_config, 'ASSOC', 'geod_backend', geod_backend, 'string')
+    cpu_cnt = config.set_param(user_config, 'ASSOC', 'cpu_cnt', cpu_cnt, 'int')
+
+    click.echo('\n' + "Parameter summary:")
+    click.echo("  back_az_width: " + str(back_az_width))
+    click.echo("  range_max: " + str(range_max))
+    click.echo("  resolution: " + str(resolution))
+    click.echo("  distance_matrix_max: " + str(distance_matrix_max))
+    click.echo("  cluster_linkage: " + str(cluster_linkage))
+    click.echo("  cluster_threshold: " + str(cluster_threshold))
+    click.echo("  trimming_threshold: " + str(trimming_threshold))
+    click.echo("  poll_interval: " + str(poll_interval))
+    click.echo("  max_idle: " + str(max_idle))
+    click.echo("  geod_backend: " + str(geod_backend))
+    latlon.set_geod_backend(geod_backend)
+    if cpu_cnt is not None:
+        click.echo("  cpu_cnt: " + str(cpu_cnt))
+        pl = Pool(cpu_cnt)
+    else:
+        pl = None
+    click.echo("")
+
+    associator = online.OnlineAssociator(cluster_threshold, dist_max=distance_matrix_max, bm_width=back_az_width, rng_max=range_max, rad_min=100.0, 
+                                        rad_max=(range_max / 4.0), resol=resolution, linkage_method=cluster_linkage, trimming_thresh=trimming_threshold, 
+                                        cluster_det_population=event_population_min, cluster_array_population=event_station_min, pool=pl)
+
+    def write_updates(updates):
+        for status, ev_id, dets, ql in updates:
+            ev_file = local_event_label + "-ev" + str(ev_id) + ".dets.json"
+            click.echo("  Event " + str(ev_id) + " (" + status + "): " + str(len(dets)) + " detections, quality " + "{:.3e}".format(ql))
+            if status == 'cancel':
+                if os.path.isfile(ev_file):
+                    os.remove(ev_file)
+            else:
+                data_io.detection_list_to_json(ev_file, dets)
+        return sum(1 for update in updates if update[0] == 'retire')
+
+    # only the entries appended since the previous poll are read from the detection file
+    offset, idle_cnt, event_cnt = 0, 0, 0
+    while True:
+        new_dets = []
+        if os.path.isfile(local_detect_label):
+            if os.path.getsize(local_detect_label) < offset:
+                warnings.warn("Detection file " + local_detect_label + " was truncated; reading it again from the start")
+                offset = 0
+            new_dets, offset = data_io.json_to_new_detections(local_detect_label, offset)
+
+        if len(new_dets) > 0:
+            idle_cnt = 0
+            click.echo("Processing " + str(len(new_dets)) + " new detections...")
+            for det in sorted(new_dets, key=lambda det: det.peakF_UTCtime):
+                event_cnt += write_updates(associator.add(det))
+        else:
+            idle_cnt += 1
+            if max_idle is not None and idle_cnt >= max_idle:
+                break
+        time.sleep(poll_interval)
+
+    event_cnt += write_updates(associator.flush())
+    click.echo('\n' + "Identified " + str(event_cnt) + " events." + '\n')
+
+    if pl is not None:
+        pl.terminate()
+        pl.close()
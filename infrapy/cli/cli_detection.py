@@ -15,6 +15,7 @@ from obspy import UTCDateTime
 
 from infrapy.utils import config
 from infrapy.utils import data_io
+from infrapy.utils.stage_timer import StageTimer
 from infrapy.detection import beamforming_new as fkd
 from infrapy.detection import spectral
 
@@ -36,6 +37,7 @@ from infrapy.detection import spectral
 @click.option("--local-fk-label", help="Label for local output of fk results", default=None)
 @click.option("--freq-min", help="Minimum frequency (default: " + config.defaults['FK']['freq_min'] + " [Hz])", default=None, type=float)
 @click.option("--freq-max", help="Maximum frequency (default: " + config.defaults['FK']['freq_max'] + " [Hz])", default=None, type=float)
+@click.option("--freq-bands", help="Multiple frequency bands analyzed from a single FFT (e.g., '0.5-2.0, 1.0-5.0') (default: None)", default=None)
 @click.option("--back-az-min", help="Minimum back azimuth (default: " + config.defaults['FK']['back_az_min'] + " [deg])", default=None, type=float)
 @click.option("--back-az-max", help="Maximum back azimuth (default: " + config.defaults['FK']['back_az_max'] + " [deg])", default=None, type=float)
 @click.option("--back-az-step", help="Back azimuth resolution (default: " + config.defaults['FK']['back_az_step'] + " [deg])", default=None, type=float)
@@ -47,13 +49,16 @@ from infrapy.detection import spectral
 @click.option("--signal-end", help="End of signal window", default=None)
 @click.option("--noise-start", help="Start of noise sample", default=None)
 @click.option("--noise-end", help="End of noise sample", default=None)
+@click.option("--noise-update-fstat", help="F-statistic below which windows update the GLS noise model (default: None)", default=None, type=float)
 @click.option("--window-len", help="Analysis window length (default: " + config.defaults['FK']['window_len'] + " [s])", default=None, type=float)
 @click.option("--sub-window-len", help="Analysis sub-window length (default: None [s])", default=None, type=float)
 @click.option("--window-step", help="Step between analysis windows (default: " + config.defaults['FK']['window_step'] + " [s])", default=None, type=float)
 @click.option("--cpu-cnt", help="CPU count for multithreading (default: None)", default=None, type=int)
+@click.option("--timing", help="Report per-stage timing and throughput (default: " + config.defaults['FK']['timing'] + ")", default=None, type=bool)
+@click.option("--timing-file", help="JSON file for per-stage timing results (default: None)", default=None)
 def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, station, location, channel, starttime, endtime,
-    local_fk_label, freq_min, freq_max, back_az_min, back_az_max, back_az_step, trace_vel_min, trace_vel_max, trace_vel_step, method, 
-    signal_start, signal_end, noise_start, noise_end, window_len, sub_window_len, window_step, cpu_cnt):
+    local_fk_label, freq_min, freq_max, freq_bands, back_az_min, back_az_max, back_az_step, trace_vel_min, trace_vel_max, trace_vel_step, method, 
+    signal_start, signal_end, noise_start, noise_end, noise_update_fstat, window_len, sub_window_len, window_step, cpu_cnt, timing, timing_file):
     '''
     Run beamforming (fk) analysis
 
@@ -141,6 +146,7 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
     # Algorithm parameters
     freq_min = config.set_param(user_config, 'FK', 'freq_min', freq_min, 'float')
     freq_max = config.set_param(user_config, 'FK', 'freq_max', freq_max, 'float')
+    freq_bands = config.set_param(user_config, 'FK', 'freq_bands', freq_bands, 'string')
     back_az_min = config.set_param(user_config, 'FK', 'back_az_min', back_az_min, 'float')
     back_az_max = config.set_param(user_config, 'FK', 'back_az_max', back_az_max, 'float')
     back_az_step = config.set_param(user_config, 'FK', 'back_az_step', back_az_step, 'float')
@@ -150,16 +156,22 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
     method = config.set_param(user_config, 'FK', 'method', method, 'string')
     signal_start = config.set_param(user_config, 'FK', 'signal_start', signal_start, 'string')
     signal_end = config.set_param(user_config, 'FK', 'signal_end', signal_end, 'string')
-    noise_start = config.set_param(user_config, 'FK', 'noise_start', noise_start, 'float')
-    noise_end = config.set_param(user_config, 'FK', 'noise_end', noise_end, 'float')
+    noise_start = config.set_param(user_config, 'FK', 'noise_start', noise_start, 'string')
+    noise_end = config.set_param(user_config, 'FK', 'noise_end', noise_end, 'string')
+    noise_update_fstat = config.set_param(user_config, 'FK', 'noise_update_fstat', noise_update_fstat, 'float')
     window_len = config.set_param(user_config, 'FK', 'window_len', window_len, 'float')
     sub_window_len = config.set_param(user_config, 'FK', 'sub_window_len', sub_window_len, 'float')
     window_step = config.set_param(user_config, 'FK', 'window_step', window_step, 'float')
     cpu_cnt = config.set_param(user_config, 'FK', 'cpu_cnt', cpu_cnt, 'int')
+    timing = config.set_param(user_config, 'FK', 'timing', timing, 'bool')
+    timing_file = config.set_param(user_config, 'FK', 'timing_file', timing_file, 'string')
 
     click.echo('\n' + "Algorithm parameters:")
     click.echo("  freq_min: " + str(freq_min))
     click.echo("  freq_max: " + str(freq_max))
+    if freq_bands is not None:
+        freq_bands = [[float(val.strip('[( )]')) for val in band.split('-')] for band in freq_bands.split(',')]
+        click.echo("  freq_bands: " + str(freq_bands))
     click.echo("  back_az_min: " + str(back_az_min))
     click.echo("  back_az_max: " + str(back_az_max))
     click.echo("  back_az_step: " + str(back_az_step))
@@ -169,9 +181,10 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
     click.echo("  method: " + str(method))
     click.echo("  signal_start: " + str(signal_start))
     click.echo("  signal_end: " + str(signal_end))
-    if method == "GLS":
+    if method is not None and method.lower() == "gls":
         click.echo("  noise_start: " + str(noise_start))
         click.echo("  noise_end: " + str(noise_end))
+        click.echo("  noise_update_fstat: " + str(noise_update_fstat))
     click.echo("  window_len: " + str(window_len))
     click.echo("  sub_window_len: " + str(sub_window_len))
     click.echo("  window_step: " + str(window_step))
@@ -198,23 +211,22 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
     back_az_vals = np.arange(back_az_min, back_az_max, back_az_step)
     trc_vel_vals = np.arange(trace_vel_min, trace_vel_max, trace_vel_step)
 
-    '''
-    # Check if using a noise window
-    if noise_start is not None:
-        print("Analyzing noise window to compute noise covariance...")
-        st_noise = stream.copy()
-        st_noise.trim(UTCDateTime(noise_start), UTCDateTime(noise_end))
-
-        # Compute noise covariance
-        x, t, _, _ = fkd.stream_to_array_data(st_noise, latlon=latlon)
-        _, S, _ = fkd.fft_array_data(x, t, sub_window_len=window_len)
-
-        ns_covar_inv = np.empty_like(S)
-        for n in range(S.shape[2]):
-            S[:, :, n] += 1.0e-3 * np.mean(np.diag(S[:, :, n])) * np.eye(S.shape[0])
-            ns_covar_inv[:, :, n] = np.linalg.inv(S[:, :, n])
-    '''
-            
+    # Check if using a noise window to build the GLS noise covariance model
+    noise_model = None
+    if method is not None and method.lower() == "gls":
+        method = "gls"
+        if noise_start is not None:
+            click.echo('\n' + "Analyzing noise window to compute noise covariance...")
+            st_noise = stream.copy()
+            st_noise.trim(UTCDateTime(noise_start), UTCDateTime(noise_end))
+
+            x, t, _, _ = fkd.stream_to_array_data(st_noise, latlon=latlon)
+            noise_windows = fkd.analysis_windows(t, window_len, window_step)
+            if len(noise_windows) == 0:
+                # a noise sample no longer than the analysis window is used as a single window
+                noise_windows = [[t[0], t[0] + window_len]]
+            noise_model = fkd.NoiseCovarianceModel.estimate(x, t, noise_windows, sub_window_len=sub_window_len)
+
     # Check if using a signal window
     if signal_start is not None:
         t1 = UTCDateTime(signal_start)
@@ -240,24 +252,42 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
         else:
             stream.trim(t1, t2)
 
-    # run fk analysis
-    beam_times, beam_peaks = fkd.run_fk(stream, latlon, [freq_min, freq_max], window_len, sub_window_len, window_step, method, back_az_vals, trc_vel_vals, pl)
+    if timing or timing_file is not None:
+        timer = StageTimer(label="run_fk")
+    else:
+        timer = None
+
+    # run fk analysis (multiple bands share the FFT of each window)
+    if freq_bands is not None:
+        beam_times, beam_peaks = fkd.run_fk(stream, latlon, freq_bands, window_len, sub_window_len, window_step, method, back_az_vals, trc_vel_vals, pl, noise_model=noise_model, timer=timer, cpu_cnt=cpu_cnt, noise_update_fstat=noise_update_fstat)
+        band_labels = [local_fk_label + "_" + str(band[0]) + "-" + str(band[1]) + "Hz" for band in freq_bands]
+    else:
+        beam_times, beam_peaks = fkd.run_fk(stream, latlon, [freq_min, freq_max], window_len, sub_window_len, window_step, method, back_az_vals, trc_vel_vals, pl, noise_model=noise_model, timer=timer, cpu_cnt=cpu_cnt, noise_update_fstat=noise_update_fstat)
+        freq_bands, beam_peaks, band_labels = [[freq_min, freq_max]], [beam_peaks], [local_fk_label]
 
     # new save methods
     dt = np.array([(tn - np.datetime64(tr.stats.starttime)).astype('m8[ms]').astype(float) * 1.0e-3 for tn in beam_times])
-    fk_results = np.hstack((np.atleast_2d(dt).T, beam_peaks))
-    fk_header = data_io.fk_header(stream, latlon, freq_min, freq_max, back_az_min, back_az_max, back_az_step, trace_vel_min, trace_vel_max, trace_vel_step, method, 
-        signal_start, signal_end, noise_start, noise_end, window_len, sub_window_len, window_step)
-
-    if not os.path.isfile(local_fk_label + ".fk_results.dat"):
-        click.echo('\n' + "Writing results into " + local_fk_label + ".fk_results.dat")
-        np.savetxt(local_fk_label + ".fk_results.dat", fk_results, header=fk_header)
-    else:
-        k = 0
-        while os.path.isfile(local_fk_label + "-v" + str(k) + ".fk_results.dat"):
-            k += 1
-        click.echo('\n' + "WARNING!  fk results file(s) already exist." + '\n' + "Writing a new version: " + local_fk_label + "-v" + str(k) + ".fk_results.dat")
-        np.savetxt(local_fk_label + "-v" + str(k) + ".fk_results.dat", fk_results, header=fk_header)
+    for band, band_peaks, band_label in zip(freq_bands, beam_peaks, band_labels):
+        fk_results = np.hstack((np.atleast_2d(dt).T, band_peaks))
+        fk_header = data_io.fk_header(stream, latlon, band[0], band[1], back_az_min, back_az_max, back_az_step, trace_vel_min, trace_vel_max, trace_vel_step, method, 
+            signal_start, signal_end, noise_start, noise_end, window_len, sub_window_len, window_step)
+
+        if not os.path.isfile(band_label + ".fk_results.dat"):
+            click.echo('\n' + "Writing results into " + band_label + ".fk_results.dat")
+            np.savetxt(band_label + ".fk_results.dat", fk_results, header=fk_header)
+        else:
+            k = 0
+            while os.path.isfile(band_label + "-v" + str(k) + ".fk_results.dat"):
+                k += 1
+            click.echo('\n' + "WARNING!  fk results file(s) already exist." + '\n' + "Writing a new version: " + band_label + "-v" + str(k) + ".fk_results.dat")
+            np.savetxt(band_label + "-v" + str(k) + ".fk_results.dat", fk_results, header=fk_header)
+
+    if timer is not None:
+        timer.stop()
+        timer.report()
+        if timing_file is not None:
+            click.echo('\n' + "Writing timing results into " + timing_file)
+            timer.write(timing_file)
 
     if pl is not None:
         pl.terminate()
@@ -278,7 +308,9 @@ def run_fk(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, st
 @click.option("--thresh-ceil", help="Hybrid f-stat threshold (default: None)", default=None, type=float)
 @click.option("--return-thresh", help="Return threshold (default: " + config.defaults['FD']['return_thresh'] + ")", default=None, type=bool)
 @click.option("--merge-dets", help="Merge detections (default: " + config.defaults['FD']['merge_dets'] + ")", default=None, type=bool)
-def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value, min_duration, back_az_width, fixed_thresh, thresh_ceil, return_thresh, merge_dets):
+@click.option("--timing", help="Report per-stage timing and throughput (default: " + config.defaults['FD']['timing'] + ")", default=None, type=bool)
+@click.option("--timing-file", help="JSON file for per-stage timing results (default: None)", default=None)
+def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value, min_duration, back_az_width, fixed_thresh, thresh_ceil, return_thresh, merge_dets, timing, timing_file):
     '''
     Run fd analysis to identify detections in beamforming results
 
@@ -361,6 +393,8 @@ def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value,
     thresh_ceil = config.set_param(user_config, 'FD', 'thresh_ceil', thresh_ceil, 'float')
     return_thresh = config.set_param(user_config, 'FD', 'return_thresh', return_thresh, 'bool')
     merge_dets = config.set_param(user_config, 'FD', 'merge_dets', merge_dets, 'bool')
+    timing = config.set_param(user_config, 'FD', 'timing', timing, 'bool')
+    timing_file = config.set_param(user_config, 'FD', 'timing_file', timing_file, 'string')
 
     click.echo('\n' + "Algorithm parameters:")
     click.echo("  window_len: " + str(window_len))
@@ -408,7 +442,12 @@ def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value,
     TB_prod = (freq_max - freq_min) * fk_window_len
     min_seq = max(2, int(min_duration / fk_window_len))
 
-    dets, thresh_vals = fkd.run_fd(beam_times, beam_peaks, window_len, TB_prod, channel_cnt, p_value, min_seq, back_az_width, fixed_thresh, thresh_ceil, True, merge_dets)
+    if timing or timing_file is not None:
+        timer = StageTimer(label="run_fd")
+    else:
+        timer = None
+
+    dets, thresh_vals = fkd.run_fd(beam_times, beam_peaks, window_len, TB_prod, channel_cnt, p_value, min_seq, back_az_width, fixed_thresh, thresh_ceil, True, merge_dets, timer=timer)
 
     det_list = []
     for det_info in dets:
@@ -419,6 +458,13 @@ def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value,
     if return_thresh:
         np.savetxt(local_detect_label + ".fd_thresholds.dat", np.vstack((dt, thresh_vals)).T)
 
+    if timer is not None:
+        timer.stop()
+        timer.report()
+        if timing_file is not None:
+            click.echo('\n' + "Writing timing results into " + timing_file)
+            timer.write(timing_file)
+
 
 @click.command('run_fkd', short_help="Run beamforming and detection methods in sequence")
 @click.option("--config-file", help="Configuration file", default=None)
@@ -450,6 +496,7 @@ def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value,
 @click.option("--signal-end", help="End of analysis window", default=None)
 @click.option("--noise-start", help="Start of noise sample", default=None)
 @click.option("--noise-end", help="End of noise sample", default=None)
+@click.option("--noise-update-fstat", help="F-statistic below which windows update the GLS noise model (default: None)", default=None, type=float)
 @click.option("--fk-window-len", help="Analysis window length (default: " + config.defaults['FK']['window_len'] + " [s])", default=None, type=float)
 @click.option("--fk-sub-window-len", help="Analysis sub-window length (default: None [s])", default=None, type=float)
 @click.option("--fk-window-step", help="Step between analysis windows (default: " + config.defaults['FK']['window_step'] + " [s])", default=None, type=float)
@@ -463,10 +510,12 @@ def run_fd(config_file, local_fk_label, local_detect_label, window_len, p_value,
 @click.option("--thresh-ceil", help="Hybrid f-stat threshold (default: None)", default=None, type=float)
 @click.option("--return-thresh", help="Return threshold (default: " + config.defaults['FD']['return_thresh'] + ")", default=None, type=bool)
 @click.option("--merge-dets", help="Merge detections (default: " + config.defaults['FD']['merge_dets'] + ")", default=None, type=bool)
+@click.option("--timing", help="Report per-stage timing and throughput (default: " + config.defaults['FK']['timing'] + ")", default=None, type=bool)
+@click.option("--timing-file", help="JSON file for per-stage timing results (default: None)", default=None)
 def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, station, location, channel, starttime, endtime, local_fk_label, 
     local_detect_label, freq_min, freq_max, back_az_min, back_az_max, back_az_step, trace_vel_min, trace_vel_max, trace_vel_step, method, signal_start, 
-    signal_end, noise_start, noise_end, fk_window_len, fk_sub_window_len, fk_window_step, cpu_cnt, fd_window_len, p_value, min_duration, 
-    back_az_width, fixed_thresh, thresh_ceil, return_thresh, merge_dets):
+    signal_end, noise_start, noise_end, noise_update_fstat, fk_window_len, fk_sub_window_len, fk_window_step, cpu_cnt, fd_window_len, p_value, min_duration, 
+    back_az_width, fixed_thresh, thresh_ceil, return_thresh, merge_dets, timing, timing_file):
     '''
     Run combined beamforming (fk) and detection analysis to identify detection in array waveform data.
     
@@ -568,10 +617,13 @@ def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, s
     signal_end = config.set_param(user_config, 'FK', 'signal_end', signal_end, 'string')
     noise_start = config.set_param(user_config, 'FK', 'noise_start', noise_start, 'string')
     noise_end = config.set_param(user_config, 'FK', 'noise_end', noise_end, 'string')
+    noise_update_fstat = config.set_param(user_config, 'FK', 'noise_update_fstat', noise_update_fstat, 'float')
     fk_window_len = config.set_param(user_config, 'FK', 'window_len', fk_window_len, 'float')
     fk_sub_window_len = config.set_param(user_config, 'FK', 'sub_window_len', fk_sub_window_len, 'float')
     fk_window_step = config.set_param(user_config, 'FK', 'window_step', fk_window_step, 'float')
     cpu_cnt = config.set_param(user_config, 'FK', 'cpu_cnt', cpu_cnt, 'int')
+    timing = config.set_param(user_config, 'FK', 'timing', timing, 'bool')
+    timing_file = config.set_param(user_config, 'FK', 'timing_file', timing_file, 'string')
 
     fd_window_len = config.set_param(user_config, 'FD', 'window_len', fd_window_len, 'float')
     p_value = config.set_param(user_config, 'FD', 'p_value', p_value, 'float')
@@ -594,9 +646,10 @@ def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, s
     click.echo("  method: " + str(method))
     click.echo("  signal_start: " + str(signal_start))
     click.echo("  signal_end: " + str(signal_end))
-    if method == "GLS":
+    if method is not None and method.lower() == "gls":
         click.echo("  noise_start: " + str(noise_start))
         click.echo("  noise_end: " + str(noise_end))
+        click.echo("  noise_update_fstat: " + str(noise_update_fstat))
     click.echo("  window_len (fk): " + str(fk_window_len))
     click.echo("  sub_window_len (fk): " + str(fk_sub_window_len))
     click.echo("  window_step (fk): " + str(fk_window_step))
@@ -633,6 +686,22 @@ def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, s
         output_id = ""
     output_id = output_id + data_io.stream_label(stream)
 
+    # Check if using a noise window to build the GLS noise covariance model
+    noise_model = None
+    if method is not None and method.lower() == "gls":
+        method = "gls"
+        if noise_start is not None:
+            click.echo('\n' + "Analyzing noise window to compute noise covariance...")
+            st_noise = stream.copy()
+            st_noise.trim(UTCDateTime(noise_start), UTCDateTime(noise_end))
+
+            x, t, _, _ = fkd.stream_to_array_data(st_noise, latlon=latlon)
+            noise_windows = fkd.analysis_windows(t, fk_window_len, fk_window_step)
+            if len(noise_windows) == 0:
+                # a noise sample no longer than the analysis window is used as a single window
+                noise_windows = [[t[0], t[0] + fk_window_len]]
+            noise_model = fkd.NoiseCovarianceModel.estimate(x, t, noise_windows, sub_window_len=fk_sub_window_len)
+
     # Check if using a signal window
     if signal_start is not None:
         t1 = UTCDateTime(signal_start)
@@ -663,13 +732,18 @@ def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, s
     back_az_vals = np.arange(back_az_min, back_az_max, back_az_step)
     trc_vel_vals = np.arange(trace_vel_min, trace_vel_max, trace_vel_step)
 
+    if timing or timing_file is not None:
+        timer = StageTimer(label="run_fkd")
+    else:
+        timer = None
+
     # run fk analysis
-    beam_times, beam_peaks = fkd.run_fk(stream, latlon, [freq_min, freq_max], fk_window_len, fk_sub_window_len, fk_window_step, method, back_az_vals, trc_vel_vals, pl)
+    beam_times, beam_peaks = fkd.run_fk(stream, latlon, [freq_min, freq_max], fk_window_len, fk_sub_window_len, fk_window_step, method, back_az_vals, trc_vel_vals, pl, noise_model=noise_model, timer=timer, cpu_cnt=cpu_cnt, noise_update_fstat=noise_update_fstat)
 
     print("Running adaptive f-detector..." + '\n')
     TB_prod = (freq_max - freq_min) * fk_window_len
     min_seq = max(2, int(min_duration / fk_window_len))
-    dets, thresh_vals = fkd.run_fd(beam_times, beam_peaks, fd_window_len, TB_prod, len(stream), p_value, min_seq, back_az_width, fixed_thresh, thresh_ceil, True, merge_dets)
+    dets, thresh_vals = fkd.run_fd(beam_times, beam_peaks, fd_window_len, TB_prod, len(stream), p_value, min_seq, back_az_width, fixed_thresh, thresh_ceil, True, merge_dets, timer=timer)
 
     if local_fk_label is None or local_fk_label == "auto":
         local_fk_label = output_id
@@ -707,6 +781,13 @@ def run_fkd(config_file, local_wvfrms, fdsn, db_config, local_latlon, network, s
     if return_thresh:
         np.savetxt(local_detect_label + ".fd_thresholds.dat", np.vstack((dt, thresh_vals)).T)
 
+    if timer is not None:
+        timer.stop()
+        timer.report()
+        if timing_file is not None:
+            click.echo('\n' + "Writing timing results into " + timing_file)
+            timer.write(timing_file)
+
     if pl is not None:
         pl.terminate()
         pl.close()
@@ -5,6 +5,7 @@ import enum
 import os 
 import sys
 import fnmatch
+import time
 from threading import local 
 import click
 import configparser as cnfg
@@ -15,9 +16,11 @@ from obspy import Stream
 from ..characterization import spye
 from ..location import bisl
 from ..propagation import infrasound
+from ..propagation import likelihoods as lklhds
 
 from ..utils import config
 from ..utils import data_io
+from ..utils import latlon
 
 @click.command('run_loc', short_help="Estimate source locations and times for events")
 @click.option("--config-file", help="Configuration file", default=None)
@@ -28,7 +31,11 @@ from ..utils import data_io
 @click.option("--resolution", help="Number of points/dimension for numerical sampling (default: " + config.defaults['LOC']['resolution'] + ")", default=None, type=int)
 @click.option("--src-est", help="Estimated source location and radius of region to consider (default: None)", default=None)
 @click.option("--pgm-file", help="Path geometry model (PGM) file (default: None)", default=None)
-def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, range_max, resolution, src_est, pgm_file):
+@click.option("--pgm-cache-dir", help="Directory for cached path geometry model parameters (default: None)", default=None)
+@click.option("--adaptive", help="Refine the spatial sampling adaptively up to the resolution (default: " + config.defaults['LOC']['adaptive'] + ")", default=None, type=bool)
+@click.option("--geod-backend", help="Spherical geodesic backend, 'pyproj' or 'numba' (default: " + config.defaults['LOC']['geod_backend'] + ")", default=None)
+@click.option("--geom-cache", help="Cache file for grid-to-array geometry on fixed grids (default: None)", default=None)
+def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, range_max, resolution, src_est, pgm_file, pgm_cache_dir, adaptive, geod_backend, geom_cache):
     '''
     Run Bayesian Infrasonic Source Localization (BISL) methods to estimate the source location and origin time for an event
 
@@ -75,6 +82,10 @@ def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, ran
     resolution = config.set_param(user_config, 'LOC', 'resolution', resolution, 'int')
     src_est = config.set_param(user_config, 'LOC', 'src_est', src_est, 'string')
     pgm_file = config.set_param(user_config, 'LOC', 'pgm_file', pgm_file, 'str')
+    pgm_cache_dir = config.set_param(user_config, 'LOC', 'pgm_cache_dir', pgm_cache_dir, 'string')
+    adaptive = config.set_param(user_config, 'LOC', 'adaptive', adaptive, 'bool')
+    geod_backend = config.set_param(user_config, 'LOC', 'geod_backend', geod_backend, 'string')
+    geom_cache = config.set_param(user_config, 'LOC', 'geom_cache', geom_cache, 'string')
 
     if src_est is not None:
         src_est = [float(x.strip('[( )]')) for x in src_est.split(',')]
@@ -85,21 +96,31 @@ def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, ran
     click.echo("  resolution: " + str(resolution))
     click.echo("  src_est: " + str(src_est))
     click.echo("  pgm_file: " + str(pgm_file))
+    if pgm_cache_dir is not None:
+        click.echo("  pgm_cache_dir: " + str(pgm_cache_dir))
+    click.echo("  adaptive: " + str(adaptive))
+    click.echo("  geod_backend: " + str(geod_backend))
+    if geom_cache is not None:
+        click.echo("  geom_cache: " + str(geom_cache))
+
+    latlon.set_geod_backend(geod_backend)
 
     if pgm_file is not None:
         click.echo("")
         pgm = infrasound.PathGeometryModel()
-        pgm.load(pgm_file)
+        pgm.load(pgm_file, cache_dir=pgm_cache_dir)
     else:
         pgm = None
 
+    geom_cache = lklhds.GeometryCache(geom_cache)
+
     click.echo("")
     events = data_io.set_det_list(local_detect_label, merge=False)
     if type(events[0]) is list:
         # run localization analysis for multiple detection sets
         for j, det_list in enumerate(events):
             click.echo('\n' + "Running BISL on event " + str(j + 1) + " of " + str(len(events)))
-            result = bisl.run(det_list, path_geo_model=pgm, custom_region=src_est, resol=resolution, bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=range_max/4.0)
+            result = bisl.run(det_list, path_geo_model=pgm, custom_region=src_est, resol=resolution, bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=range_max/4.0, adaptive=adaptive, geom_cache=geom_cache)
 
             # Determine output format for BISL results
             click.echo('\n' + "BISL Summary:")
@@ -111,7 +132,7 @@ def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, ran
     else:
         # run a single localization analysis
         click.echo("")
-        result = bisl.run(events, path_geo_model=pgm, custom_region=src_est, resol=resolution, bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=range_max/4.0)
+        result = bisl.run(events, path_geo_model=pgm, custom_region=src_est, resol=resolution, bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=range_max/4.0, adaptive=adaptive, geom_cache=geom_cache)
 
         # Determine output format for BISL results
         click.echo('\n' + "BISL Summary:")
@@ -123,6 +144,124 @@ def run_loc(config_file, local_detect_label, local_loc_label, back_az_width, ran
         click.echo("Writing localization result into " + local_loc_label)
         data_io.write_json(result, local_loc_label)
 
+    geom_cache.save()
+
+
+@click.command('run_loc_batch', short_help="Estimate source locations and times for a batch of events")
+@click.option("--config-file", help="Configuration file", default=None)
+@click.option("--local-detect-label", help="Directory of event detection files, path and pattern, or multi-event json file", default=None)
+@click.option("--local-loc-label", help="Localization results path", default=None)
+@click.option("--back-az-width", help="Width of beam projection (default: " + config.defaults['LOC']['back_az_width'] + " [deg])", default=None, type=float)
+@click.option("--range-max", help="Maximum source-receiver range (default: " + config.defaults['LOC']['range_max'] + " [km])", default=None, type=float)
+@click.option("--resolution", help="Number of points/dimension for numerical sampling (default: " + config.defaults['LOC']['resolution'] + ")", default=None, type=int)
+@click.option("--src-est", help="Estimated source location and radius of region to consider (default: None)", default=None)
+@click.option("--pgm-file", help="Path geometry model (PGM) file (default: None)", default=None)
+@click.option("--pgm-cache-dir", help="Directory for cached path geometry model parameters (default: None)", default=None)
+@click.option("--adaptive", help="Refine the spatial sampling adaptively up to the resolution (default: " + config.defaults['LOC']['adaptive'] + ")", default=None, type=bool)
+@click.option("--geod-backend", help="Spherical geodesic backend, 'pyproj' or 'numba' (default: " + config.defaults['LOC']['geod_backend'] + ")", default=None)
+@click.option("--keep-pdfs", help="Include the spatial and temporal PDFs in the results (default: " + config.defaults['LOC']['keep_pdfs'] + ")", default=None, type=bool)
+@click.option("--cpu-cnt", help="CPU count for multithreading (default: None)", default=None, type=int)
+def run_loc_batch(config_file, local_detect_label, local_loc_label, back_az_width, range_max, resolution, src_est, pgm_file, pgm_cache_dir, adaptive, geod_backend, keep_pdfs, cpu_cnt):
+    '''
+    Run Bayesian Infrasonic Source Localization (BISL) methods for a batch of events with results written into a single file
+
+    \b
+    Example usage (run from infrapy/examples directory):
+    \tinfrapy run_loc_batch --local-detect-label 'GJI_example-ev*' --local-loc-label GJI_example --cpu-cnt 4
+    \tinfrapy run_loc_batch --local-detect-label events/ --local-loc-label events --pgm-file ../infrapy/propagation/priors/UTTR_models/UTTR_06_1800UTC.pgm
+    '''
+
+    click.echo("")
+    click.echo("#####################################")
+    click.echo("##                                 ##")
+    click.echo("##             InfraPy             ##")
+    click.echo("##      Localization Analysis      ##")
+    click.echo("##          (Batch Mode)           ##")
+    click.echo("##                                 ##")
+    click.echo("#####################################")
+    click.echo("")    
+
+    if config_file:
+        click.echo('\n' + "Loading configuration info from: " + config_file)
+        if os.path.isfile(config_file):
+            user_config = cnfg.ConfigParser()
+            user_config.read(config_file)
+        else:
+            click.echo("Invalid configuration file (file not found)")
+            return 0
+    else:
+        user_config = None
+
+    # Data IO parameters
+    local_detect_label = config.set_param(user_config, 'DETECTION IO', 'local_detect_label', local_detect_label, 'string')
+    local_loc_label = config.set_param(user_config, 'DETECTION IO', 'local_loc_label', local_loc_label, 'string')
+
+    if ".locs.json" not in local_loc_label:
+        local_loc_label = local_loc_label + ".locs.json"
+
+    click.echo('\n' + "Data summary:")
+    click.echo("  local_detect_label: " + str(local_detect_label))
+    click.echo("  local_loc_label: " + str(local_loc_label))
+
+    # Algorithm parameters
+    back_az_width = config.set_param(user_config, 'LOC', 'back_az_width', back_az_width, 'float')
+    range_max = config.set_param(user_config, 'LOC', 'range_max', range_max, 'float')
+    resolution = config.set_param(user_config, 'LOC', 'resolution', resolution, 'int')
+    src_est = config.set_param(user_config, 'LOC', 'src_est', src_est, 'string')
+    pgm_file = config.set_param(user_config, 'LOC', 'pgm_file', pgm_file, 'str')
+    pgm_cache_dir = config.set_param(user_config, 'LOC', 'pgm_cache_dir', pgm_cache_dir, 'string')
+    adaptive = config.set_param(user_config, 'LOC', 'adaptive', adaptive, 'bool')
+    geod_backend = config.set_param(user_config, 'LOC', 'geod_backend', geod_backend, 'string')
+    keep_pdfs = config.set_param(user_config, 'LOC', 'keep_pdfs', keep_pdfs, 'bool')
+    cpu_cnt = config.set_param(user_config, 'LOC', 'cpu_cnt', cpu_cnt, 'int')
+
+    if src_est is not None:
+        src_est = [float(x.strip('[( )]')) for x in src_est.split(',')]
+
+    click.echo('\n' + "Parameter summary:")
+    click.echo("  back_az_width: " + str(back_az_width))
+    click.echo("  range_max: " + str(range_max))
+    click.echo("  resolution: " + str(resolution))
+    click.echo("  src_est: " + str(src_est))
+    click.echo("  pgm_file: " + str(pgm_file))
+    if pgm_cache_dir is not None:
+        click.echo("  pgm_cache_dir: " + str(pgm_cache_dir))
+    click.echo("  adaptive: " + str(adaptive))
+    click.echo("  geod_backend: " + str(geod_backend))
+    click.echo("  keep_pdfs: " + str(keep_pdfs))
+    click.echo("  cpu_cnt: " + str(cpu_cnt))
+
+    latlon.set_geod_backend(geod_backend)
+
+    if pgm_file is not None:
+        click.echo("")
+        pgm = infrasound.PathGeometryModel()
+        pgm.load(pgm_file, cache_dir=pgm_cache_dir)
+    else:
+        pgm = None
+
+    click.echo("")
+    labels, events = data_io.set_event_list(local_detect_label)
+    if len(events) == 0:
+        return 0
+
+    click.echo('\n' + "Running BISL on " + str(len(events)) + " events...")
+    t0 = time.time()
+    summaries = bisl.run_batch(events, labels=labels, path_geo_model=pgm, cpu_cnt=cpu_cnt, keep_pdfs=keep_pdfs, custom_region=src_est, resol=resolution,
+                               bm_width=back_az_width, rng_max=range_max, rad_min=100.0, rad_max=range_max/4.0, adaptive=adaptive)
+    total_time = time.time() - t0
+
+    failed = [summary['label'] for summary in summaries if summary['status'] != 'success']
+    click.echo('\n' + "Localized " + str(len(events) - len(failed)) + " of " + str(len(events)) + " events in " + "{:.1f}".format(total_time) + " s")
+    for summary in summaries:
+        if summary['status'] != 'success':
+            click.echo('\t' + "Failed event " + str(summary['label']) + ": " + summary['error'])
+
+    output = {'detect_label': local_detect_label, 'pgm_file': pgm_file, 'total_time': total_time, 'cpu_cnt': cpu_cnt, 'events': summaries}
+
+    click.echo("Writing localization results into " + local_loc_label)
+    data_io.write_json(output, local_loc_label)
+
 
 @click.command('regional', short_help="Run analysis using a single set of TLMs")
 @click.option("--config-file", help="Configuration file", default=None)
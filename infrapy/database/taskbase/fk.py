@@ -552,7 +552,7 @@ class Fk(Base):
         y=self.lat2MeanKM
         nchan = float(len(self.lat2MeanKM))
         slow=self.slow
-        self.fN,self.freqsN,self.mult_vectors=beamforming._mult_vectors(win_l,sps,slow,x,y,nchan,fmin=self.freqmin,fmax=self.freqmax)
+        self.fN,self.freqsN,self.mult_vectors=beamforming._mult_vectors(win_l,sps,slow,x,y,nchan,fmin=self.freqmin,fmax=self.freqmax,compact=True)
 
         id_resC=self.session.query(self.FK_results).count()+1
         count_min=0
@@ -133,11 +133,12 @@ def _fkBARTLET(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN):
         streamF=np.fft.rfft(stream,axis=1)
         streamF=np.conj(streamF)
         streamF = streamF[:,fN.astype('int')]
-        tot_mul=np.multiply(mult_vectors,streamF)
-        inte1=np.sum(tot_mul,axis=2)
-        inte2=np.absolute(inte1)
-        inte3=np.power(inte2,2)
-        FK=np.sum(inte3,axis=2)
+        # accumulate one frequency at a time so that only a single
+        # slowness x slowness x channel block of steering vectors is in memory
+        FK=np.zeros(_steering_shape(mult_vectors)[:2])
+        for f_i in range(streamF.shape[1]):
+            inte1=np.dot(_steering_block(mult_vectors,f_i),streamF[:,f_i])
+            FK+=np.power(np.absolute(inte1),2)
     except Exception as ex1:
         print(ex1)
         embed()
@@ -151,14 +152,14 @@ def _fkCAPON(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN):
     streamF = streamF[:,fN.astype('int')]
 
     nn,mm=streamF.shape
-    xx,yy,s1,s2=mult_vectors.shape
-    C=np.zeros((xx,yy,mm),dtype=np.complex)
+    xx,yy,s1,s2=_steering_shape(mult_vectors)
+    C=np.zeros((xx,yy,mm),dtype=complex)
     for f_i in range(mm):
         SS=np.matrix(streamF[:,f_i])
         covM=np.dot(np.conj(SS.T),SS)
         DAMP=0.0001*np.matrix(np.identity(nn))
         icovM=np.linalg.pinv(covM+DAMP)
-        mvec=mult_vectors[:,:,:,f_i]
+        mvec=_steering_block(mult_vectors,f_i)
         for x1 in range(xx):
             for y1 in range(yy):
                 sv=np.matrix(mvec[x1,y1,:])
@@ -171,14 +172,20 @@ def _fkCAPON(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN):
 
 
 
-def _mult_vectors(wind_len,sps,slow,x,y,nchan,fmin,fmax):
+def _mult_vectors(wind_len,sps,slow,x,y,nchan,fmin,fmax,compact=False):
     '''
     these are the steering vectors
 
-    to-do: we can improve this multiplication
     output
     fN are the index of the frquncy we are interested
     freqsN are the actual frequencies we ar einterested
+    mult_vectors are the steering vectors (nslow x nslow x nchan x nfreq)
+
+    the steering vector separates into x and y phase factors so, with
+    compact=True, mult_vectors is returned as the pair of (nslow x nchan x nfreq)
+    factors instead of the full 4-D array.  The fk methods accept either form
+    and build the steering vectors for one frequency at a time from the compact
+    pair (see _steering_block), which bounds the memory for fine slowness grids.
 
     '''
     band = [0, int(sps/2.0)]
@@ -187,39 +194,45 @@ def _mult_vectors(wind_len,sps,slow,x,y,nchan,fmin,fmax):
     hfreq = float(math.floor(max(band)/dfreq) + 1)
     f = list(range(int(lfreq),int(hfreq)+1))
     f=np.asarray(f,dtype='float')
-    f_1 = [fi-1 for fi in f]
     freqs=np.linspace(0, sps/2.0,len(f))
     fN=f[(freqs>=fmin)&(freqs<=fmax)]
     freqsN=freqs[(freqs>=fmin)&(freqs<=fmax)]
-    #pdx = np.dot(np.matrix(x).transpose(),np.matrix(-slow))
-    #pdy = np.dot(np.matrix(y).transpose(),np.matrix(-slow))
-    #wl=np.matrix(fN)*dfreq
-    pdx = np.zeros(shape=(len(x),len(slow)))
-    for aa in range(len(x)):
-        for bb in range(len(slow)):
-            pdx[aa][bb]=x[aa]*-slow[bb]
-    pdy = np.zeros(shape=(len(y),len(slow)))
-    for aa in range(len(y)):
-        for bb in range(len(slow)):
-            pdy[aa][bb]=y[aa]*-slow[bb]
+
+    pdx=np.asarray(x,dtype='float')[None,:]*-np.asarray(slow,dtype='float')[:,None]
+    pdy=np.asarray(y,dtype='float')[None,:]*-np.asarray(slow,dtype='float')[:,None]
     wl=fN*dfreq
-    epdxf = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdx.transpose().ravel(),wl.transpose()))
-    epdyf = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdy.transpose().ravel(),wl.transpose()))
-    numslow = float(len(slow))
-    [MS,NS]=np.shape(epdxf)
-    MS=float(MS)
-    NS=float(NS)
-    nslow=len(slow)
-    chans_listINT=np.arange(0,int(nchan),dtype='int')
-    mult_vectors=np.zeros((int(nslow), int(nslow),int(nchan),int(NS)),dtype=complex)
-    for sx in range(0,nslow):
-        sxx = int(sx)*int(nchan) + chans_listINT
-        for sy in range(0,int(nslow)):
-            syy = int(sy)*int(nchan) + chans_listINT
-            mult_vectors[int(sx),int(sy),:,:] = np.multiply(epdxf[sxx,:],epdyf[syy,:])
+    epdxf = np.exp(complex(0,-1) * 2 * math.pi * (pdx[:,:,None]*wl[None,None,:]))
+    epdyf = np.exp(complex(0,-1) * 2 * math.pi * (pdy[:,:,None]*wl[None,None,:]))
+
+    if compact:
+        mult_vectors=(epdxf,epdyf)
+    else:
+        mult_vectors=np.multiply(epdxf[:,None,:,:],epdyf[None,:,:,:])
 
     return fN,freqsN,mult_vectors
 
+def _steering_shape(mult_vectors):
+    '''
+    shape (nslow x nslow x nchan x nfreq) of the steering vectors in either
+    the full or compact form produced by _mult_vectors
+    '''
+    if isinstance(mult_vectors,tuple):
+        epdxf,epdyf=mult_vectors
+        return (epdxf.shape[0],epdyf.shape[0],epdxf.shape[1],epdxf.shape[2])
+    else:
+        return mult_vectors.shape
+
+def _steering_block(mult_vectors,f_i):
+    '''
+    steering vectors (nslow x nslow x nchan) for the f_i'th frequency from
+    either the full or compact form produced by _mult_vectors
+    '''
+    if isinstance(mult_vectors,tuple):
+        epdxf,epdyf=mult_vectors
+        return np.multiply(epdxf[:,None,:,f_i],epdyf[None,:,:,f_i])
+    else:
+        return mult_vectors[:,:,:,f_i]
+
 def _array_response_short(sx,sy,mult_vectors,wind_len,sps,slow,x,y,nchan,fmin,fmax):
     band = [0, int(sps/2.0)]
     dfreq = 1./float(wind_len)
@@ -236,64 +249,16 @@ def _array_response_short(sx,sy,mult_vectors,wind_len,sps,slow,x,y,nchan,fmin,fm
     pdy_sy = np.dot(np.matrix(y).transpose(),np.matrix(-sy))
     epdxf_sx = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdx_sx.transpose().ravel(),wl.transpose()))
     epdyf_sy = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdy_sy.transpose().ravel(),wl.transpose()))
-    sx_sy=np.multiply(epdxf_sx,epdyf_sy)
-    respUAX=np.multiply(mult_vectors,sx_sy)
-    inte1=np.sum(respUAX,axis=2)
-    inte2=np.absolute(inte1)
-    inte3=np.power(inte2,2)
-    FK=np.sum(inte3,axis=2)
+    sx_sy=np.asarray(np.multiply(epdxf_sx,epdyf_sy))
+    FK=np.zeros(_steering_shape(mult_vectors)[:2])
+    for f_i in range(sx_sy.shape[1]):
+        inte1=np.dot(_steering_block(mult_vectors,f_i),sx_sy[:,f_i])
+        FK+=np.power(np.absolute(inte1),2)
     return FK
 
 def _array_response(sx,sy,wind_len,sps,slow,x,y,nchan,fmin,fmax):
-    band = [0, int(sps/2.0)]
-    dfreq = 1./float(wind_len)
-    lfreq = float(math.ceil(min(band)/dfreq) + 1)
-    hfreq = float(math.floor(max(band)/dfreq) + 1)
-    f = list(range(int(lfreq),int(hfreq)+1))
-    f=np.asarray(f,dtype='float')
-    f_1 = [fi-1 for fi in f]
-    freqs=np.linspace(0, sps/2.0,len(f))
-    fN=f[(freqs>=fmin)&(freqs<=fmax)]
-    freqsN=freqs[(freqs>=fmin)&(freqs<=fmax)]
-    pdx = np.zeros(shape=(len(x),len(slow)))
-    for aa in range(len(x)):
-        for bb in range(len(slow)):
-            pdx[aa][bb]=x[aa]*-slow[bb]
-    pdy = np.zeros(shape=(len(y),len(slow)))
-    for aa in range(len(y)):
-        for bb in range(len(slow)):
-            pdy[aa][bb]=y[aa]*-slow[bb]
-    #pdx = np.dot(np.matrix(x).transpose(),np.matrix(-slow))
-    #pdy = np.dot(np.matrix(y).transpose(),np.matrix(-slow))
-    #wl=np.matrix(fN)*dfreq
-    wl=fN*dfreq
-    epdxf = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdx.transpose().ravel(),wl.transpose()))
-    epdyf = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdy.transpose().ravel(),wl.transpose()))
-
-    pdx_sx = np.dot(np.matrix(x).transpose(),np.matrix(-sx))
-    pdy_sy = np.dot(np.matrix(y).transpose(),np.matrix(-sy))
-    epdxf_sx = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdx_sx.transpose().ravel(),wl.transpose()))
-    epdyf_sy = np.exp(complex(0,-1) * 2 * math.pi *  np.outer(pdy_sy.transpose().ravel(),wl.transpose()))
-    sx_sy=np.multiply(epdxf_sx,epdxf_sy)
-    numslow = float(len(slow))
-    [MS,NS]=np.shape(epdxf)
-    MS=float(MS)
-    NS=float(NS)
-    nslow=len(slow)
-    chans_listINT=np.arange(0,int(nchan),dtype='int')
-
-    mult_vectors=np.zeros((int(nslow), int(nslow),int(nchan),int(NS)),dtype=complex)
-    for sx in range(0,nslow):
-        sxx = int(sx)*int(nchan) + chans_listINT
-        for sy in range(0,int(nslow)):
-            syy = int(sy)*int(nchan) + chans_listINT
-            mult_vectors[int(sx),int(sy),:,:] = np.multiply(epdxf[sxx,:],epdyf[syy,:])
-    respUAX=np.multiply(mult_vectors,sx_sy)
-    inte1=np.sum(respUAX,axis=2)
-    inte2=np.absolute(inte1)
-    inte3=np.power(inte2,2)
-    FK=np.sum(inte3,axis=2)
-    return FK
+    fN,freqsN,mult_vectors=_mult_vectors(wind_len,sps,slow,x,y,nchan,fmin,fmax,compact=True)
+    return _array_response_short(sx,sy,mult_vectors,wind_len,sps,slow,x,y,nchan,fmin,fmax)
 
 def _fkMUSIC(streamOR,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_sources,number_div=None):
     # remember it is 'lonlat'
@@ -307,9 +272,9 @@ def _fkMUSIC(streamOR,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_s
     win_lf=float((ss_len/sps)/num_win)
     win_l=int(win_lf)
     nchan=ss_ch
-    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1])
+    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1],compact=True)
     #covT=[]
-    xx,yy,s1,mm=mult_vectors_S.shape
+    xx,yy,s1,mm=_steering_shape(mult_vectors_S)
 
     covT=[]
     for w_i in range(int(num_win)):
@@ -343,7 +308,7 @@ def _fkMUSIC(streamOR,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_s
         vS=v[:,argwS]
         vSN=vS[:,number_sources:]
         wSN=wS[number_sources:]
-        mvec=mult_vectors_S[:,:,:,f_i]
+        mvec=_steering_block(mult_vectors_S,f_i)
         ss=np.conj(mvec)
         ss2=np.dot(np.asarray(ss),np.asarray(vSN))
         ss3=np.power(np.abs(ss2),2)
@@ -389,8 +354,8 @@ def _fkMUSIC_dynamic(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,nu
     win_lf=float(2*(ss_len/sps)/(num_win+1))
     win_l=int(win_lf)
     nchan=ss_ch
-    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1])
-    xx,yy,s1,mm=mult_vectors_S.shape
+    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1],compact=True)
+    xx,yy,s1,mm=_steering_shape(mult_vectors_S)
     covT=[]
 
 
@@ -452,7 +417,7 @@ def _fkMUSIC_dynamic(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,nu
             print('at the num of source',n_sources,'int:',round(freqN_S[f_i],4),'_',wS[0]/wS[-1])
             vSN=vS[:,number_sources:]
             wSN=wS[number_sources:]
-            mvec=mult_vectors_S[:,:,:,f_i]
+            mvec=_steering_block(mult_vectors_S,f_i)
             ss=np.conj(mvec)
             ss2=np.dot(np.asarray(ss),np.asarray(vSN))
             ss3=np.power(np.abs(ss2),2)
@@ -470,7 +435,7 @@ def _fkMUSIC_dynamic(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,nu
 
             vSN=vS[:,number_sources:]
             wSN=wS[number_sources:]
-            mvec=mult_vectors_S[:,:,:,f_i]
+            mvec=_steering_block(mult_vectors_S,f_i)
             ss=np.conj(mvec)
             ss2=np.dot(np.asarray(ss),np.asarray(vSN))
             ss3=np.power(np.abs(ss2),2)
@@ -512,7 +477,7 @@ def svdAV_wv(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_div
     win_l=int(win_lf)
     nchan=ss_ch
     covT=[]
-    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1])
+    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1],compact=True)
     for w_i in range(int(num_win)):
         streamS=stream[:,int(sps)*win_l*w_i:int(sps*win_lf*(w_i+1))]
         nn_s,mm_s=streamS.shape
@@ -546,9 +511,9 @@ def _fkCAPON_AV(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_
     win_lf=float((ss_len/sps)/num_win)
     win_l=int(win_lf)
     nchan=ss_ch
-    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1])
+    fN_S,freqN_S,mult_vectors_S=_mult_vectors(win_lf,sps,slow,x,y,nchan,fmin=freqN[0],fmax=freqN[-1],compact=True)
     #covT=[]
-    xx,yy,s1,mm=mult_vectors_S.shape
+    xx,yy,s1,mm=_steering_shape(mult_vectors_S)
 
     covT=[]
     for w_i in range(int(num_win)):
@@ -577,7 +542,7 @@ def _fkCAPON_AV(stream,sps,slow,mult_vectors,fN,x,y,timeSTAMP,func,freqN,number_
         vS=v[:,argwS]
         vSN=vS[:,:]
         wSN=wS[:]
-        mvec=mult_vectors_S[:,:,:,f_i]
+        mvec=_steering_block(mult_vectors_S,f_i)
         ss=np.conj(mvec)
         ss2=np.dot(np.asarray(ss),np.asarray(vSN))
         ss3=np.power(np.abs(ss2),2)/wSN
@@ -605,7 +570,7 @@ def fkfromOStream(St,wlen,overlap,freqmin,freqmax,slow=None):
     x=lon2MeanKM
     y=lat2MeanKM
     nchan = float(len(lat2MeanKM))
-    fN,freqsN,mult_vectors=_mult_vectors(win_l,sps,slow,x,y,nchan,fmin=freqmin,fmax=freqmax)
+    fN,freqsN,mult_vectors=_mult_vectors(win_l,sps,slow,x,y,nchan,fmin=freqmin,fmax=freqmax,compact=True)
     curr_pos=0
     data=stream2array(St)
     [m,n]=data.shape
@@ -8,8 +8,12 @@ beamforming methods.
 Author            Philip Blom (pblom@lanl.gov)
 
 """
+import pickle
+import time
 import warnings
 
+from contextlib import nullcontext
+
 import numpy as np
 
 from numba import jit, float64, complex128
@@ -22,6 +26,7 @@ from scipy.optimize import minimize_scalar, root
 from pyproj import Geod
 
 from ..utils import prog_bar
+from ..utils.stage_timer import StageTimer
 
 wgs84_proj = Geod(ellps='sphere')
 
@@ -420,10 +425,283 @@ def project_ABc(A, B, c):
     return result_real + 1.0j * result_imag
 
 
+# ######################### #
+#   Noise covariance model  #
+#    for GLS beamforming    #
+# ######################### #
+class NoiseCovarianceModel(object):
+    """Noise covariance model for generalized least squares (GLS) beamforming
+
+        Stores a per-frequency noise covariance, R(f), estimated from designated noise
+        windows along with its Cholesky factors, R(f) = L(f) L^\dagger(f).  The GLS beam,
+        |a^\dagger R^{-1} X|^2 / (a^\dagger R^{-1} a)^2, is evaluated by prewhitening the
+        data and steering vectors with L^{-1} so that it reduces to a Bartlett projection.
+        Whitened steering vectors are cached per frequency and reused across analysis
+        windows until the model is updated.
+
+        Noise windows must have the same length as the analysis windows (or sub-windows)
+        so that the FFT frequencies match those of the data being beamformed.
+
+        Parameters
+        ----------
+        f : 1darray
+            Frequencies of the noise covariance
+        S : 3darray
+            M x M x N_f cube of noise covariance matrices
+        regularization : float
+            Diagonal loading relative to the mean channel power applied before factoring
+        update_weight : float
+            Weight of new noise estimates in the rolling (exponential) update
+    """
+
+    def __init__(self, f, S, regularization=1.0e-3, update_weight=0.1):
+        self.f = np.array(f)
+        self.S = np.array(S, dtype=complex)
+        self.regularization = regularization
+        self.update_weight = update_weight
+        self.update_cnt = 0
+
+        self._factor()
+
+    @classmethod
+    def estimate(cls, x, t, noise_windows, sub_window_len=None, fft_window="hanning", regularization=1.0e-3, update_weight=0.1):
+        """Estimate the noise covariance from one or more noise windows
+
+            Parameters
+            ----------
+            x : 2darray
+                M x N matrix of array data, x[m][n] = x_m(t_n)
+            t : 1darray
+                Vector of N sampled points in time, t[n] = t_n
+            noise_windows : iterable
+                List of noise windows, [[t_1, t_2], ...], relative to times in t
+            sub_window_len : float
+                Duration of the subwindow in seconds (see fft_array_data)
+            fft_window : str
+                Fourier windowing method
+            regularization : float
+                Diagonal loading relative to the mean channel power applied before factoring
+            update_weight : float
+                Weight of new noise estimates in the rolling update
+
+            Returns:
+            ----------
+            noise_model : NoiseCovarianceModel
+                Noise covariance model averaged over the noise windows
+        """
+
+        if len(noise_windows) == 0:
+            msg = "No noise windows provided for the noise covariance estimate (the noise sample may be shorter than the analysis window)."
+            raise ValueError(msg)
+
+        S_sum = None
+        for window in noise_windows:
+            _, S, f = fft_array_data(x, t, window=window, sub_window_len=sub_window_len, fft_window=fft_window)
+            S_sum = S if S_sum is None else S_sum + S
+
+        return cls(f, S_sum / len(noise_windows), regularization=regularization, update_weight=update_weight)
+
+    def _factor(self):
+        M, _, N_f = self.S.shape
+
+        self.chol = np.empty_like(self.S)
+        for nf in range(N_f):
+            loading = self.regularization * np.mean(np.real(np.diag(self.S[:, :, nf])))
+            self.chol[:, :, nf] = np.linalg.cholesky(self.S[:, :, nf] + max(loading, np.finfo(float).tiny) * np.eye(M))
+
+        self._steering_delays = None
+        self._steering_cache = {}
+
+    def update(self, S_new, weight=None):
+        """Update the noise covariance with a new estimate
+
+            Applies an exponentially weighted rolling update, R <-- (1 - w) R + w S_new,
+            re-factors the covariance, and clears the whitened steering cache.
+
+            Parameters
+            ----------
+            S_new : 3darray
+                M x M x N_f cube of covariance matrices from a new noise window
+            weight : float
+                Weight of the new estimate (defaults to update_weight)
+        """
+
+        if S_new.shape != self.S.shape:
+            msg = "Noise covariance update has shape {} but the model has shape {}.".format(S_new.shape, self.S.shape)
+            raise ValueError(msg)
+
+        if weight is None:
+            weight = self.update_weight
+
+        self.S = (1.0 - weight) * self.S + weight * S_new
+        self.update_cnt += 1
+        self._factor()
+
+    def update_from_data(self, x, t, noise_window, sub_window_len=None, fft_window="hanning", weight=None):
+        """Update the noise covariance using a new noise window of data
+
+            Parameters
+            ----------
+            x : 2darray
+                M x N matrix of array data, x[m][n] = x_m(t_n)
+            t : 1darray
+                Vector of N sampled points in time, t[n] = t_n
+            noise_window : iterable
+                Start and end time of the noise window relative to times in t, [t_1, t_2]
+            sub_window_len : float
+                Duration of the subwindow in seconds (see fft_array_data)
+            fft_window : str
+                Fourier windowing method
+            weight : float
+                Weight of the new estimate (defaults to update_weight)
+        """
+
+        _, S, _ = fft_array_data(x, t, window=noise_window, sub_window_len=sub_window_len, fft_window=fft_window)
+        self.update(S, weight=weight)
+
+    def freq_indices(self, f):
+        """Identify the model frequencies matching a set of data frequencies
+
+            Parameters
+            ----------
+            f : 1darray
+                Frequencies of the data
+
+            Returns:
+            ----------
+            indices : 1darray
+                Index of each frequency in the model frequencies
+        """
+
+        indices = np.clip(np.searchsorted(self.f, f), 0, len(self.f) - 1)
+        if not np.allclose(self.f[indices], f, rtol=1.0e-6, atol=1.0e-9):
+            msg = "Noise covariance frequencies don't match the data.  Noise windows must have the same length as the analysis windows."
+            raise ValueError(msg)
+
+        return indices
+
+    def whiten_data(self, X, f):
+        """Prewhiten FFT'd data, X(f) --> L^{-1}(f) X(f)
+
+            Parameters
+            ----------
+            X : 2darray
+                M x N_f matrix of the FFT'd data
+            f : 1darray
+                Frequencies of the data (N_f values)
+
+            Returns:
+            ----------
+            X_white : 2darray
+                M x N_f matrix of the whitened data
+        """
+
+        X_white = np.empty_like(X)
+        for nf, nf_model in enumerate(self.freq_indices(f)):
+            X_white[:, nf] = np.linalg.solve(self.chol[:, :, nf_model], X[:, nf])
+
+        return X_white
+
+    def whiten_steering(self, f, delays):
+        """Whitened steering vectors, L^{-1}(f) a_k(f), and their norms
+
+            Results are cached per frequency for the current delays and model state
+            so that repeated analysis windows only whiten the data.
+
+            Parameters
+            ----------
+            f : 1darray
+                Frequencies (N_f values)
+            delays : 2darray
+                K x M matrix of delays for the parameterization
+
+            Returns:
+            ----------
+            steering_white : list
+                List of N_f matrices (K x M) of whitened steering vectors
+            norms : list
+                List of N_f vectors (length K) of a_k^\dagger R^{-1} a_k
+        """
+
+        if self._steering_delays is None or (delays is not self._steering_delays and not np.array_equal(delays, self._steering_delays)):
+            self._steering_delays = delays
+            self._steering_cache = {}
+
+        steering_white, norms = [], []
+        for nf, nf_model in enumerate(self.freq_indices(f)):
+            if nf_model not in self._steering_cache:
+                steering = np.exp(2.0j * np.pi * self.f[nf_model] * delays) / np.sqrt(delays.shape[1])
+                temp = np.linalg.solve(self.chol[:, :, nf_model], steering.T).T
+                self._steering_cache[nf_model] = (np.ascontiguousarray(temp), np.sum(np.abs(temp)**2, axis=1))
+            steering_white = steering_white + [self._steering_cache[nf_model][0]]
+            norms = norms + [self._steering_cache[nf_model][1]]
+
+        return steering_white, norms
+
+    def ns_covar_inv(self):
+        """Inverse noise covariance cube for use with compute_beam_power
+
+            Returns:
+            ----------
+            ns_covar_inv : 3darray
+                M x M x N_f cube of inverse noise covariance matrices
+        """
+
+        ns_covar_inv = np.empty_like(self.chol)
+        for nf in range(self.chol.shape[2]):
+            chol_inv = np.linalg.inv(self.chol[:, :, nf])
+            ns_covar_inv[:, :, nf] = np.dot(np.conj(chol_inv.T), chol_inv)
+
+        return ns_covar_inv
+
+
 # ####################### #
 #           Run           #
 #       Beamforming       #
 # ####################### #
+def is_multi_band(freq_band):
+    """Check whether a frequency band specification contains multiple bands
+
+        Parameters
+        ----------
+        freq_band : iterable
+            Either a single band, [f_min, f_max], or a list of bands, [[f_min1, f_max1], [f_min2, f_max2], ...]
+
+        Returns:
+        ----------
+        multi_band : boolean
+            True if freq_band is a list of bands
+        """
+
+    return np.ndim(freq_band) == 2
+
+
+def build_band_mask(f, freq_band):
+    """Identify the frequencies within one or more frequency bands
+
+        Parameters
+        ----------
+        f : 1darray
+            Frequencies
+        freq_band : iterable
+            Either a single band, [f_min, f_max], or a list of bands, [[f_min1, f_max1], [f_min2, f_max2], ...]
+
+        Returns:
+        ----------
+        band_mask : 1darray
+            Boolean mask of the frequencies within the band (or within any of the bands)
+        """
+
+    if is_multi_band(freq_band):
+        band_mask = np.zeros_like(f, dtype=bool)
+        for band in freq_band:
+            band_mask = np.logical_or(band_mask, np.logical_and(band[0] <= f, f <= band[1]))
+    else:
+        band_mask = np.logical_and(freq_band[0] <= f, f <= freq_band[1])
+
+    return band_mask
+
+
 def compute_beam_power(data, steering, method="bartlett", ns_covar_inv=None, signal_cnt=1):
     """Compute the beampower for a specific frequency
 
@@ -518,7 +796,7 @@ def compute_beam_power_wrapper(args):
     return compute_beam_power(*args)
 
 
-def run(X, S, f, dxdy, delays, freq_band, method="bartlett", ns_covar_inv=None, signal_cnt=1, normalize_beam=True, pool=None):
+def run(X, S, f, dxdy, delays, freq_band, method="bartlett", ns_covar_inv=None, signal_cnt=1, normalize_beam=True, pool=None, noise_model=None):
     """Run beamforming analysis over frequencies of interest
 
         Computes the beam at multiple frequencies within a specified band given data in X(f)
@@ -542,7 +820,8 @@ def run(X, S, f, dxdy, delays, freq_band, method="bartlett", ns_covar_inv=None,
         delays : 1darray
             Set of delays for the parameterization (length K)
         freq_band : iterable
-            List or tuple with minimum and maximum frequency (e.g.,  [f_min, f_max])
+            List or tuple with minimum and maximum frequency (e.g.,  [f_min, f_max]) or a list
+            of such bands in which case the beam is computed over the union of the bands
         method : str
             Beamforming method to be applied to the data (must match form of data)
         signal_cnt : int
@@ -553,6 +832,9 @@ def run(X, S, f, dxdy, delays, freq_band, method="bartlett", ns_covar_inv=None,
             Option to normalize the beam and return coherence (value between 0 and 1)
         pool : multiprocessing pool
             Multiprocessing pool for accelerating calculation (maps over frequency)
+        noise_model : NoiseCovarianceModel
+            Noise covariance model used in "gls" beamforming method in place of ns_covar_inv
+            (data and steering vectors are prewhitened and projected as in Bartlett)
         param_opt : string
             Option for the solution parameterization: 'planar' or 'spherical'
         sph_vel : float
@@ -564,13 +846,24 @@ def run(X, S, f, dxdy, delays, freq_band, method="bartlett", ns_covar_inv=None,
             Beam power for each steering vector at each frequency in the band (dimension K x N_f)
         """
 
-    band_mask = np.logical_and(freq_band[0] <= f, f <= freq_band[1])
+    band_mask = build_band_mask(f, freq_band)
     X_msk = X[:, band_mask]
     S_msk = S[:, :, band_mask]
     f_msk = f[band_mask]
 
     f_cnt = f_msk.shape[0]
-    if pool:
+    if method == "gls" and noise_model is not None:
+        X_white = noise_model.whiten_data(X_msk, f_msk)
+        steering_white, norms = noise_model.whiten_steering(f_msk, delays)
+
+        args = [(X_white[:, nf], steering_white[nf], "bartlett", None, signal_cnt) for nf in range(f_cnt)]
+        if pool:
+            beam_power = np.array(pool.map(compute_beam_power_wrapper, args))
+        else:
+            beam_power = np.array([compute_beam_power(*arg) for arg in args])
+        beam_power = beam_power / np.array(norms)**2
+
+    elif pool:
         if method == "bartlett_covar" or method == "capon" or method == "music":
             args = [(S_msk[:, :, nf], np.exp(2.0j * np.pi * f_msk[nf] * delays) / np.sqrt(X_msk.shape[0]), method, None, signal_cnt) for nf in range(f_cnt)]
         else:
@@ -610,29 +903,33 @@ def pure_state_filter(S):
 
         Pure state filter value are useful for weighting a multi-frequency beam average.
 
+        The full covariance cube is evaluated at once using the trace identities
+        tr(C^2) = sum_{ij} C_ij C_ji and tr(C) = sum_i C_ii for the coherence matrix C.
+
         Parameters
         ----------
-        S : 3darray
-            Covariance matrix of data in analysis window for all frequencies,
-            x(t) --> S(f) = mean(X(f) X^\dagger(f))
+        S : ndarray
+            Covariance matrix of data in analysis window for a single frequency (M x M) or
+            all frequencies (M x M x N_f), x(t) --> S(f) = mean(X(f) X^\dagger(f))
 
         Returns:
         ----------
-        pure_state : 1darray
+        pure_state : float or 1darray
             Pure state filter value at each frequency
         """
 
     # convert to coherence matrix
     M = S.shape[0]
-    coh = np.empty_like(S)
-    for i in range(M):
-        for j in range(M):
-            coh[i][j] = S[i][j] / np.sqrt(abs(S[i][i]) * abs(S[j][j]))
+    diag_vals = np.abs(np.diagonal(S, axis1=0, axis2=1).T)
+    coh = S / np.sqrt(diag_vals[:, None] * diag_vals[None, :])
 
-    return np.sqrt(np.real((M * np.trace(np.matmul(coh, coh)) - np.trace(coh)**2) / ((M - 1) * np.trace(coh)**2)))
+    coh_tr = np.einsum('ii...->...', coh)
+    coh_sqr_tr = np.einsum('ij...,ji...->...', coh, coh)
 
+    return np.sqrt(np.real((M * coh_sqr_tr - coh_tr**2) / ((M - 1) * coh_tr**2)))
 
-def find_peaks(beam_power, slowness_vals1, slowness_vals2, signal_cnt=1, freq_weights=None):
+
+def find_peaks(beam_power, slowness_vals1, slowness_vals2, signal_cnt=1, freq_weights=None, S=None):
     """Identify the peak(s) in the beampower defined over a slowness grid
 
         Finds the peaks of a distribution using a frequency averaged beamforming result
@@ -650,7 +947,11 @@ def find_peaks(beam_power, slowness_vals1, slowness_vals2, signal_cnt=1, freq_we
         signal_cnt : int
             Number of signals to identify in the slowness grid
         freq_weights : string or 1darray
-            Weights or method to use in frequency averaging of the beam power
+            Weights or method to use in frequency averaging of the beam power ("doa_proj",
+            "pure_state", or an array of weights)
+        S : 3darray
+            Covariance cube (M x M x N_f) for the frequencies in the band; required for
+            "pure_state" weighting
 
         Returns:
         ----------
@@ -661,7 +962,12 @@ def find_peaks(beam_power, slowness_vals1, slowness_vals2, signal_cnt=1, freq_we
         """
 
     # Average over frequency and reshape
-    if freq_weights == "doa_proj":
+    if isinstance(freq_weights, str) and freq_weights == "pure_state":
+        if S is None:
+            msg = "Pure state frequency weighting requires the covariance cube, S(f)."
+            raise ValueError(msg)
+        avg_beam = np.average(beam_power, axis=0, weights=pure_state_filter(S))
+    elif isinstance(freq_weights, str) and freq_weights == "doa_proj":
         bm_cnt = beam_power.shape[0]
 
         slowness = build_slowness(slowness_vals1, slowness_vals2) # might need to simplify this part
@@ -751,7 +1057,7 @@ def find_peaks(beam_power, slowness_vals1, slowness_vals2, signal_cnt=1, freq_we
     return peaks[:, :3]
 
 
-def project_beam(beam_power, back_az_vals, trc_vel_vals, freq_weights=None, method="max"):
+def project_beam(beam_power, back_az_vals, trc_vel_vals, freq_weights=None, method="max", S=None):
     """Project polar slowness grid onto only azimuth
 
         Projects the polar slowness grid onto back azimuth and trace velocity in order to
@@ -766,11 +1072,14 @@ def project_beam(beam_power, back_az_vals, trc_vel_vals, freq_weights=None, meth
             Back azimuth values defining polar slowness grid
         trc_vel_vals : 1darray
             Trace velocity values defining polar slowness grid
-        freq_weights : 1darray
-            Weights to use in frequency averaging of the beam power
+        freq_weights : string or 1darray
+            Weights to use in frequency averaging of the beam power or "pure_state"
         method : str
             Determines whether mean or maximum along trace velocity axis is used to
             define the projections
+        S : 3darray
+            Covariance cube (M x M x N_f) for the frequencies in the band; required for
+            "pure_state" weighting
 
         Returns:
         ----------
@@ -781,6 +1090,11 @@ def project_beam(beam_power, back_az_vals, trc_vel_vals, freq_weights=None, meth
         """
 
     # Average over frequency and reshape
+    if isinstance(freq_weights, str) and freq_weights == "pure_state":
+        if S is None:
+            msg = "Pure state frequency weighting requires the covariance cube, S(f)."
+            raise ValueError(msg)
+        freq_weights = pure_state_filter(S)
     avg_beam = np.average(beam_power, axis=0, weights=freq_weights)
     avg_beam = avg_beam.reshape(len(trc_vel_vals), len(back_az_vals))
 
@@ -869,18 +1183,78 @@ def calc_det_thresh(fstat_vals, det_p_val, TB_prod, channel_cnt, fstat_ref_peak=
 #    Combined Methods    #
 #         For CLI        #
 # ###################### #
-def beam_window(x, t, geom, freq_band, method, window, sub_window_length, delays, back_az_vals, trc_vel_vals, prog_n):
-    X, S, f = fft_array_data(x, t, window, sub_window_len=sub_window_length)
-    beam_power = run(X, S, f, geom, delays, freq_band, method=method, normalize_beam=True)
+def analysis_windows(t, window_length, window_step):
+    """Define the analysis windows spanning a set of time samples
+
+        Parameters
+        ----------
+        t : 1darray
+            Vector of N sampled points in time, t[n] = t_n
+        window_length: float
+            Analysis window length in seconds
+        window_step: float
+            Time step between adjacent analysis windows
+
+        Returns:
+        ----------
+        windows : list
+            Start and end times of the analysis windows, [[t_1, t_2], ...]; a sample exactly one
+            window long defines a single window and a shorter sample defines no windows
+        """
+
+    # allow for rounding in the sample times when fitting the last window
+    t_end = t[-1] + 1.0e-3 * (t[1] - t[0])
+
+    return [[window_start, window_start + window_length] for window_start in np.arange(t[0], t[-1], window_step) if window_start + window_length <= t_end]
+
+
+def no_stage(name):
+    # stand-in for StageTimer.stage when a run isn't timed
+    return nullcontext()
+
+
+def beam_window(x, t, geom, freq_band, method, window, sub_window_length, delays, back_az_vals, trc_vel_vals, prog_n, noise_model=None, timer=None):
+    stage = no_stage if timer is None else timer.stage
+
+    with stage('fft_covariance'):
+        X, S, f = fft_array_data(x, t, window, sub_window_len=sub_window_length)
+    with stage('beam_power'):
+        beam_power = run(X, S, f, geom, delays, freq_band, method=method, normalize_beam=True, noise_model=noise_model)
     prog_bar.increment(prog_n)
-    return find_peaks(beam_power, back_az_vals, trc_vel_vals)
+
+    with stage('peak_finding'):
+        if is_multi_band(freq_band):
+            # the beam is computed once on the union of the bands, so
+            # each band's peak is found from its subset of frequencies
+            f_msk = f[build_band_mask(f, freq_band)]
+            return np.array([find_peaks(beam_power[build_band_mask(f_msk, band)], back_az_vals, trc_vel_vals)[0] for band in freq_band])
+        else:
+            return find_peaks(beam_power, back_az_vals, trc_vel_vals)
 
 
 def beam_window_wrapper(args):
     return beam_window(*args)
 
 
-def run_fk(stream, latlon, freq_band, window_length, sub_window_length, window_step, method, back_az_vals, trc_vel_vals, pl):
+def beam_block(x, t, geom, freq_band, method, windows, sub_window_length, delays, back_az_vals, trc_vel_vals, prog_ns, noise_model=None, timed=False):
+    # analyze a block of windows in a single task so that the data and noise model are sent to a
+    # pool worker once per block and the whitened steering vectors are reused across its windows;
+    # timed blocks also return the worker's stage times and counts
+    timer = StageTimer() if timed else None
+    peaks = [beam_window(x, t, geom, freq_band, method, window, sub_window_length, delays, back_az_vals, trc_vel_vals, prog_n, noise_model, timer) for window, prog_n in zip(windows, prog_ns)]
+
+    if timer is None:
+        return peaks
+    else:
+        return peaks, timer.wall, timer.counts
+
+
+def beam_block_wrapper(args):
+    return beam_block(*args)
+
+
+def run_fk(stream, latlon, freq_band, window_length, sub_window_length, window_step, method, back_az_vals, trc_vel_vals, pl, noise_model=None, timer=None, cpu_cnt=None,
+           blocks_per_cpu=4, noise_update_fstat=None):
     """Run the beamforming (fk) analysis on a stream with various parameter specifications
 
         Convert a stream to an array data set on a consistent set of time samples
@@ -896,7 +1270,8 @@ def run_fk(stream, latlon, freq_band, window_length, sub_window_length, window_s
         stream: obspy.core.Stream
             Obspy stream containing array data
         freq_band: 1darray
-            Iterable with minimum and maximum frequencies for analysis
+            Iterable with minimum and maximum frequencies for analysis or a list of
+            such bands to analyze from a single FFT of each window
         window_length: float
             Analysis window length in seconds
         sub_window_length: float
@@ -911,59 +1286,124 @@ def run_fk(stream, latlon, freq_band, window_length, sub_window_length, window_s
             List of trace velocity values in the slowness grid
         pl: multiprocessing.Pool
             Multiprocessing pool for simulatenous analysis of windows
+        noise_model: NoiseCovarianceModel
+            Noise covariance model for the "gls" method
+        timer: infrapy.utils.stage_timer.StageTimer
+            Optional timer to accumulate per-stage wall times and throughput (no
+            instrumentation is performed if None)
         cpu_cnt: integer
-            Number of CPUs to utilize in the multiprocessing pool
+            Number of CPUs to utilize in the multiprocessing pool (windows are sent to the pool
+            in blocks_per_cpu * cpu_cnt blocks; each window is sent separately if None).  Also
+            used to estimate the pool dispatch overhead when timing.
+        blocks_per_cpu : int
+            Number of blocks of windows dispatched to each worker of the pool
+        noise_update_fstat: float
+            F-statistic below which an analysis window is considered noise and used in a rolling
+            update of the noise model (no updates if None)
 
 
         Returns:
         ----------
-        sig_estimate : 1darray
-            Extracted frequency domain signal along the beam
-        residual : 2darray
-            Residual across the array once beamed signal is extracted
+        beam_times : 1darray
+            Times of the analysis window centers as numpy datetime64's
+        beam_peaks : ndarray
+            Back azimuth, trace velocity, and f-stat of the beam peak in each window
+            (dimension N_win x 3) or, for multiple frequency bands, the peaks for each
+            band (dimension N_band x N_win x 3)
         """
 
     print('\n' + "Running fk analysis..." + '\n\t' + "Progress: ", end = '')
+    stage = no_stage if timer is None else timer.stage
 
-    x, t, t0, geom = stream_to_array_data(stream, latlon=latlon)
+    with stage('interpolation'):
+        x, t, t0, geom = stream_to_array_data(stream, latlon=latlon)
     M, N = x.shape
 
     # define slownes and delays from array geomry
-    slowness = build_slowness(back_az_vals, trc_vel_vals)
-    delays = compute_delays(geom, slowness)
+    with stage('steering'):
+        slowness = build_slowness(back_az_vals, trc_vel_vals)
+        delays = compute_delays(geom, slowness)
+
+    windows = analysis_windows(t, window_length, window_step)
+    beam_times = np.array([t0 + np.timedelta64(int(window[0] + window_length / 2.0), 's') for window in windows])
 
     prog_bar_len, win_cnt = 50, int((t[-1] - t[0]) / window_step) - 1
     prog_bar.prep(prog_bar_len)
+    prog_ns = [prog_bar.set_step(win_n, win_cnt, prog_bar_len) for win_n in range(len(windows))]
 
-    beam_times = []
-    if pl:
-        args = []
-        for win_n, window_start in enumerate(np.arange(t[0], t[-1], window_step)):
-            if window_start + window_length > t[-1]:
-                break
-
-            beam_times = beam_times + [[t0 + np.timedelta64(int(window_start + window_length / 2.0), 's')]]
-            args = args + [[x, t, geom, freq_band, method, [window_start, window_start + window_length], sub_window_length, delays, back_az_vals, trc_vel_vals, prog_bar.set_step(win_n, win_cnt, prog_bar_len)]]
-        beam_peaks = np.array(pl.map(beam_window_wrapper, args)).reshape(len(beam_times), 3)
+    # with rolling noise model updates, windows are analyzed in consecutive groups (one window
+    # per worker) and the model is updated from the noise windows of each group before the next
+    update_cnt, update_model = 0, (noise_model is not None and noise_update_fstat is not None)
+    if update_model:
+        group_len = cpu_cnt if (pl and cpu_cnt) else 1
     else:
-        beam_peaks = []
-        for win_n, window_start in enumerate(np.arange(t[0], t[-1], window_step)):
-            if window_start + window_length > t[-1]:
-                break
-            
-            peaks = beam_window(x, t, geom, freq_band, method, [window_start, window_start + window_length], sub_window_length, delays, back_az_vals, trc_vel_vals, prog_bar.set_step(win_n, win_cnt, prog_bar_len))
-            beam_times = beam_times + [[t0 + np.timedelta64(int(window_start + window_length / 2.0), 's')]]
-            beam_peaks = beam_peaks + [[peaks[0][0], peaks[0][1], peaks[0][2]]]
-        beam_peaks = np.array(beam_peaks)
+        group_len = max(len(windows), 1)
+
+    beam_peaks = []
+    for group_start in range(0, len(windows), group_len):
+        group = range(group_start, min(group_start + group_len, len(windows)))
+
+        if pl:
+            block_cnt = len(group) if cpu_cnt is None else min(len(group), blocks_per_cpu * cpu_cnt)
+            args = [[x, t, geom, freq_band, method, [windows[n] for n in block], sub_window_length, delays, back_az_vals, trc_vel_vals, [prog_ns[n] for n in block], noise_model, timer is not None]
+                    for block in np.array_split(np.array(group), block_cnt)]
+
+            if timer is None:
+                results = pl.map(beam_block_wrapper, args)
+            else:
+                # blocks differ only in their window bounds, so the data sent to the pool is
+                # estimated from the pickled size (and time) of a single block's arguments
+                clock1 = time.perf_counter()
+                block_bytes = len(pickle.dumps(args[0]))
+                timer.add('pickling', (time.perf_counter() - clock1) * len(args), len(args))
+                timer.info['pool_ipc_bytes'] = timer.info.get('pool_ipc_bytes', 0) + block_bytes * len(args)
+
+                clock1 = time.perf_counter()
+                results = pl.map(beam_block_wrapper, args)
+                pool_wall = time.perf_counter() - clock1
+                timer.add('pool_map', pool_wall)
+
+                worker_time = 0.0
+                for _, stage_times, stage_counts in results:
+                    timer.merge(stage_times, stage_counts)
+                    worker_time += sum(stage_times.values())
+                if cpu_cnt is not None:
+                    timer.add('pool_dispatch_ipc', max(pool_wall - worker_time / cpu_cnt, 0.0))
+                results = [block_peaks for block_peaks, _, _ in results]
+            peaks = [window_peaks for block_peaks in results for window_peaks in block_peaks]
+        else:
+            peaks = [beam_window(x, t, geom, freq_band, method, windows[n], sub_window_length, delays, back_az_vals, trc_vel_vals, prog_ns[n], noise_model, timer) for n in group]
+
+        if is_multi_band(freq_band):
+            peaks = [window_peaks[:, :3] for window_peaks in peaks]
+        else:
+            peaks = [window_peaks[0][:3] for window_peaks in peaks]
+        beam_peaks = beam_peaks + peaks
+
+        if update_model:
+            for n, window_peaks in zip(group, peaks):
+                fstat = np.max(np.atleast_2d(window_peaks)[:, 2])
+                if fstat / (1.0 - fstat) * (M - 1) < noise_update_fstat:
+                    with stage('noise_update'):
+                        noise_model.update_from_data(x, t, windows[n], sub_window_len=sub_window_length)
+                    update_cnt += 1
 
     prog_bar.close()
-    beam_times = np.array(beam_times)[:, 0]
-    beam_peaks[:, 2] = beam_peaks[:, 2] / (1.0 - beam_peaks[:, 2]) * (M - 1)
+    if timer is not None:
+        timer.window_cnt += len(windows)
+    if update_cnt > 0:
+        print('\t' + "Updated noise covariance model using " + str(update_cnt) + " analysis windows")
+
+    beam_peaks = np.array(beam_peaks)
+    beam_peaks[..., 2] = beam_peaks[..., 2] / (1.0 - beam_peaks[..., 2]) * (M - 1)
+
+    if is_multi_band(freq_band):
+        beam_peaks = np.transpose(beam_peaks, (1, 0, 2))
 
     return beam_times, beam_peaks
 
 
-def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min_seq=5, back_az_lim=15, fixed_thresh=None, thresh_ceil=None, return_thresh=False, merge_dets=False):
+def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min_seq=5, back_az_lim=15, fixed_thresh=None, thresh_ceil=None, return_thresh=False, merge_dets=False, timer=None):
     """Identify detections with beamforming results
 
         Identify detection in the beamforming results using either Kernel Density
@@ -1001,6 +1441,11 @@ def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min
                 detection criterion: fstat > min(thresh_ceil, adaptive_thresh)
         return_thresh: boolean
             Flag to output the adaptive detection threshold computed across times
+        merge_dets: boolean
+            Flag to merge adjacent detections with similar back azimuths
+        timer: infrapy.utils.stage_timer.StageTimer
+            Optional timer to accumulate per-stage wall times (no instrumentation
+            is performed if None)
 
         Returns:
         ----------
@@ -1009,6 +1454,9 @@ def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min
             and end times of the detection, back azimuth, trace velocity, and f-stat.
         """
 
+    if timer is not None:
+        clock1 = time.perf_counter()
+
     back_az_vals = beam_peaks[:, 0]
     trc_vel_vals = beam_peaks[:, 1]
     fstat_vals = beam_peaks[:, 2]
@@ -1047,6 +1495,11 @@ def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min
                 det_mask[n] = fstat_vals[n] >= thresh
 
 
+    if timer is not None:
+        clock2 = time.perf_counter()
+        timer.add('threshold', clock2 - clock1)
+        timer.info['fd_sample_cnt'] = timer.info.get('fd_sample_cnt', 0) + len(fstat_vals)
+
     # Check for detections shorter than the minimum sequence 
     #   length and with too large of back azimuth deviations
     n, dets = 0, []
@@ -1087,6 +1540,10 @@ def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min
         else:
             n += 1
 
+    if timer is not None:
+        clock3 = time.perf_counter()
+        timer.add('sequence_scan', clock3 - clock2)
+
     if merge_dets:
         print("Merging detections...")
         while True:
@@ -1114,6 +1571,9 @@ def run_fd(times, beam_peaks, win_len, TB_prod, channel_cnt, det_p_val=0.99, min
             
             dets = [det for det in dets if det is not None]                    
 
+        if timer is not None:
+            timer.add('merging', time.perf_counter() - clock3)
+
     if return_thresh:
         return dets, thresh_vals
     else:
@@ -9,28 +9,41 @@
 # Author            Philip Blom (pblom@lanl.gov)
 
 
+import contextlib
+import io
+import time
 import warnings
 
+from multiprocessing import Pool
+
 import numpy as np
 
 from scipy.integrate import simps
 from scipy.interpolate import interp1d
 from scipy.optimize import minimize
+from scipy.special import i0e, i1e
 from scipy.stats import chi2
 
 from obspy import UTCDateTime
 
-from pyproj import Geod
-
+from ..propagation import infrasound
 from ..propagation import likelihoods as lklhds
 from ..utils import latlon as ll
+from ..utils import confidence
 
 ####################################
 #### Set Integration Parameters ####
 ####    and spherical globe     ####
 ####################################
 int_opts = {'limit': 100, 'epsrel': 1.0e-3}
-sph_proj = Geod(ellps='sphere')
+sph_proj = ll.SphericalGeod()
+
+# path geometry model used by run_batch workers
+batch_model = None
+
+# number of origin times sampled at each grid
+# location when seeding the MaP search
+map_t_resol = 9
 
 def set_region(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, rad_max=1000.0):
     """Defines the integration region for computation of the BISL probability distribution
@@ -70,34 +83,19 @@ def set_region(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=10
     main_intersects[:] = np.nan
     beam_intersects[:] = np.nan
 
-    for n1 in range(det_cnt):
-
-        latlon1 = np.array([det_list[n1].latitude, det_list[n1].longitude], dtype=np.float)
-
-        proj1 = ll.sphericalfwd(latlon1, 90, det_list[n1].back_azimuth)[0][0]
-        proj1up = ll.sphericalfwd(latlon1, 90, det_list[n1].back_azimuth + bm_width)[0][0]
-        proj1dn = ll.sphericalfwd(latlon1, 90, det_list[n1].back_azimuth - bm_width)[0][0]
-
-        for n2 in range(det_cnt):
-            pair_index = n1 * det_cnt + n2
-
-            latlon2 = np.array([det_list[n2].latitude, det_list[n2].longitude], dtype=np.float)
+    # Build the beam arcs for all pairs of detections on separate arrays and
+    # compute their intersections in a single broadcast call
+    latlons = np.array([[det.latitude, det.longitude] for det in det_list], dtype=float)
+    bazs = np.array([det.back_azimuth for det in det_list], dtype=float)
 
-            if not np.array_equal(latlon1,latlon2):
-                proj2 = ll.sphericalfwd(latlon2, 90, det_list[n2].back_azimuth)[0][0]
-                proj2up = ll.sphericalfwd(latlon2, 90, det_list[n2].back_azimuth + bm_width)[0][0]
-                proj2dn = ll.sphericalfwd(latlon2, 90, det_list[n2].back_azimuth - bm_width)[0][0]
+    n1, n2 = np.divmod(np.arange(pair_cnt), det_cnt)
+    pair_mask = np.any(latlons[n1] != latlons[n2], axis=1)
 
-                main_intersects[pair_index] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2)[0]
+    if np.any(pair_mask):
+        intersects = ll.beam_intersect(latlons[n1[pair_mask]], bazs[n1[pair_mask]], latlons[n2[pair_mask]], bazs[n2[pair_mask]], 90.0, bm_width)
 
-                beam_intersects[pair_index * 8 + 0] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2up)[0]
-                beam_intersects[pair_index * 8 + 1] = ll.gcarc_intersect(latlon1, proj1, latlon2, proj2dn)[0]
-                beam_intersects[pair_index * 8 + 2] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2)[0]
-                beam_intersects[pair_index * 8 + 3] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2)[0]
-                beam_intersects[pair_index * 8 + 4] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2up)[0]
-                beam_intersects[pair_index * 8 + 5] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2dn)[0]
-                beam_intersects[pair_index * 8 + 6] = ll.gcarc_intersect(latlon1, proj1up, latlon2, proj2dn)[0]
-                beam_intersects[pair_index * 8 + 7] = ll.gcarc_intersect(latlon1, proj1dn, latlon2, proj2up)[0]
+        main_intersects[pair_mask] = intersects[:, 0]
+        beam_intersects.reshape(pair_cnt, 8, 2)[pair_mask] = intersects[:, 1:]
 
     all_intersects = np.vstack((main_intersects, beam_intersects))
 
@@ -117,16 +115,14 @@ def set_region(det_list, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=10
 
     # Compute the distance to the non-central intersections to estimate the size of the region
     # Limit the size of the possible region (diameter of 100 - 1,000 km, can't include a detecting station)
-    rngs = [np.nan] * len(all_intersects)
-    for n in range (len(main_intersects),len(all_intersects)):
-        if not np.isnan(all_intersects[n][0]): rngs[n] = sph_proj.inv(center[1], center[0], all_intersects[n][1], all_intersects[n][0], radians=False)[2] / 1000.0
-    radius = np.nanmean(rngs)
+    valid = ~np.isnan(beam_intersects[:, 0])
+    rngs = sph_proj.inv(np.full(np.count_nonzero(valid), center[1]), np.full(np.count_nonzero(valid), center[0]), beam_intersects[valid, 1], beam_intersects[valid, 0], radians=False)[2] / 1000.0
+    radius = np.mean(rngs) if len(rngs) > 0 else np.nan
 
     radius = max(radius, rad_min)
     radius = min(radius, rad_max)
 
-    rngs = [0.0] * len(det_list)
-    for n in range(det_cnt): rngs[n] = sph_proj.inv(center[1], center[0], det_list[n].longitude, det_list[n].latitude, radians=False)[2] / 1000.0 - 0.01
+    rngs = list(sph_proj.inv(np.full(det_cnt, center[1]), np.full(det_cnt, center[0]), latlons[:, 1], latlons[:, 0], radians=False)[2] / 1000.0 - 0.01)
     radius = min(radius, min(rngs))
 
     if radius < rad_min:
@@ -168,14 +164,16 @@ def calc_conf_ellipse(means, st_devs, conf_lvl, pnts=100):
     width = chi2(2).ppf(conf_lvl / 100.0)
 
     lat_vals = np.linspace(means[0] - st_devs[0] * np.sqrt(width), means[0] + st_devs[0] * np.sqrt(width), pnts)
-    ellps = np.array([lat_vals[0], means[1] + st_devs[1] * (st_devs[2] * (lat_vals[0] - means[0]) / st_devs[0] + np.sqrt(max(width - ((lat_vals[0] - means[0]) / st_devs[0])**2, 0.0) * (1.0 - st_devs[2]**2)))])
+    dx = (lat_vals - means[0]) / st_devs[0]
+    half_wdth = np.sqrt(np.maximum(width - dx**2, 0.0) * (1.0 - st_devs[2]**2))
 
-    for n in range(1, pnts):          ellps = np.vstack((ellps, [lat_vals[n], means[1] + st_devs[1] * (st_devs[2] * (lat_vals[n] - means[0]) / st_devs[0] + np.sqrt(max(width - ((lat_vals[n] - means[0]) / st_devs[0])**2, 0.0) * (1.0 - st_devs[2]**2)))]))
-    for n in range(pnts - 1, -1, -1): ellps = np.vstack((ellps, [lat_vals[n], means[1] + st_devs[1] * (st_devs[2] * (lat_vals[n] - means[0]) / st_devs[0] - np.sqrt(max(width - ((lat_vals[n] - means[0]) / st_devs[0])**2, 0.0) * (1.0 - st_devs[2]**2)))]))
-    return np.array(ellps[:, 0]), np.array(ellps[:, 1])
+    upper = means[1] + st_devs[1] * (st_devs[2] * dx + half_wdth)
+    lower = means[1] + st_devs[1] * (st_devs[2] * dx - half_wdth)
 
+    return np.concatenate((lat_vals, lat_vals[::-1])), np.concatenate((upper, lower[::-1]))
 
-def find_confidence(func, lims, conf_lvl):
+
+def find_confidence(func, lims, conf_lvl, resol=500):
     """Computes the bounds for a function given a confidence level
 
         Identifies the points for which \int_{x_1}^{x_2}{f(x) dx} includes a given
@@ -187,6 +185,10 @@ def find_confidence(func, lims, conf_lvl):
             Function to be analyzed
         lims : float
             Limits for the integration of the norm and bounds for possible limits
+        conf_lvl : float
+            Fraction of the integral to include (e.g., 0.95)
+        resol : int
+            Number of points at which func is sampled (see utils.confidence.hpd_bounds)
 
         Returns:
         ----------
@@ -203,42 +205,374 @@ def find_confidence(func, lims, conf_lvl):
         print('WARNING - find_confidence cannot use conf > 1.0')
         return [lims[0], lims[1]]
 
-    def conf_func(x, thresh):
-        val = func(x)
-        if val >= thresh:
-            return val
+    x_vals = np.linspace(lims[0], lims[1], resol)
+    return confidence.hpd_bounds(x_vals, func(x_vals), conf_lvl)
+
+
+class MaPObjective(object):
+    """Log of the joint likelihood of a set of infrasound detections for maximum a posteriori searches
+
+        Evaluates log(joint_pdf) for arrays of latitudes and longitudes and origin times given as float
+        seconds relative to a reference time (no datetime conversions) along with its analytic gradient.
+        The source-to-array ranges and azimuths are computed once per location on the spherical globe
+        (radius of sph_proj) and shared by all origin times, and the celerity mixtures are combined
+        with log-sum-exp so that the objective and gradient remain finite far from the peak where the
+        likelihood underflows.
+
+        Parameters
+        ----------
+        det_list : iterable of InfrasoundDetection instances
+            Detections attributed to the event
+        t_ref : datetime64
+            Reference time for the origin time offsets
+        path_geo_model : Propagation-based, stochastic path geometry model
+            Optional path geometry model if available (range derivatives of the model fits are
+            evaluated with central differences)
+
+        Notes
+        -----
+        Detections without a back azimuth contribute only the range-celerity term (evaluated with the
+        canonical model since their path geometry model azimuth bin is unknown) and those without a
+        valid arrival time contribute only the azimuthal term as in InfrasoundDetection.pdf.
+        Origin times are not truncated to whole seconds as in joint_pdf so values differ from it by
+        up to the change in the celerity terms over one second.
+        """
+
+    rad_earth = sph_proj.a / 1.0e3
+    rng_step = 0.01
+
+    def __init__(self, det_list, t_ref, path_geo_model=None):
+        dets = [det for det in det_list if type(det) == lklhds.InfrasoundDetection]
+
+        self.lats = np.radians(np.array([det.latitude for det in dets], dtype=float))
+        self.lons = np.radians(np.array([det.longitude for det in dets], dtype=float))
+
+        self.back_az = np.array([det.back_azimuth if det.back_azimuth is not None else np.nan for det in dets], dtype=float)
+        self.has_az = ~np.isnan(self.back_az)
+        self.has_tm = np.array([det.peakF_UTCtime < UTCDateTime("9999-01-01T00:00:00") for det in dets])
+        self.tms = np.array([(det.peakF_UTCtime - t_ref).astype('m8[us]').astype(float) * 1.0e-6 if timed else np.nan for det, timed in zip(dets, self.has_tm)])
+
+        self.kappa = np.array([det.kappa for det in dets])
+        self.vm_norm = np.array([det.vm_norm for det in dets])
+        self.cos_half = np.array([det.cos_half for det in dets])
+        self.sin_half = np.array([det.sin_half for det in dets])
+
+        self.path_geo_model = path_geo_model
+        if path_geo_model:
+            self.az_bins = [int(infrasound.find_azimuth_bin(baz - 180.0, path_geo_model.az_bin_cnt)) if has_az else None for baz, has_az in zip(self.back_az, self.has_az)]
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _model_eval(self, func, rng):
+        # evaluate a path geometry model fit and its range derivative
+        rng_min = func.rng_min
+        rng_max = self.path_geo_model.rng_max
+
+        lower = np.clip(rng - self.rng_step, rng_min, rng_max)
+        upper = np.clip(rng + self.rng_step, rng_min, rng_max)
+        deriv = np.divide(func(upper) - func(lower), upper - lower, out=np.zeros_like(rng), where=(upper > lower))
+
+        return func(np.clip(rng, rng_min, rng_max)), deriv
+
+    def eval(self, lat, lon, dt=None, grad=False):
+        """Evaluate the log likelihood (and optionally its gradient)
+
+            Parameters
+            ----------
+            lat : float or 1darray
+                Latitude(s) of the source [degrees]
+            lon : float or 1darray
+                Longitude(s) of the source [degrees]
+            dt : float or ndarray
+                Origin time(s) relative to t_ref [s] with shape (P,) or (P, M) for P locations (the
+                range-celerity terms are skipped if None)
+            grad : boolean
+                Return the gradient with respect to latitude, longitude, and dt
+
+            Returns:
+            ----------
+            log_pdf : ndarray
+                Log of the joint likelihood with the shape of dt
+            grad_lat, grad_lon, grad_dt : ndarray
+                Partial derivatives of log_pdf [1/deg, 1/deg, 1/s] (only if grad)
+            """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        phi, lam = np.radians(lat)[:, None], np.radians(lon)[:, None]
+
+        if dt is None:
+            shape = lat.shape
         else:
-            return 0.0
+            dt = np.asarray(dt, dtype=float)
+            dt = dt.reshape(lat.shape + dt.shape[1:]) if dt.ndim > 0 else np.full(lat.shape, dt)
+            shape = dt.shape
+        expand = (slice(None),) + (None,) * (len(shape) - 1)
+
+        # geometry from each array to each location on the sphere (delta is the angular distance,
+        # az the azimuth from the array to the source, and gam the azimuth from the source to the array)
+        dlam = lam - self.lons
+        hav = np.sin((phi - self.lats) / 2.0)**2 + np.cos(phi) * np.cos(self.lats) * np.sin(dlam / 2.0)**2
+        delta = 2.0 * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0)))
+        rngs = self.rad_earth * delta
+        azs = np.arctan2(np.sin(dlam) * np.cos(phi), np.cos(self.lats) * np.sin(phi) - np.sin(self.lats) * np.cos(phi) * np.cos(dlam))
+
+        log_pdf = np.zeros(shape)
+        d_rng = np.zeros(shape + (len(self),))
+        d_az = np.zeros(shape + (len(self),))
+        d_dt = np.zeros(shape)
+
+        for n in range(len(self)):
+            rng = rngs[:, n]
+
+            if self.has_az[n]:
+                az_diff = azs[:, n] - np.radians(self.back_az[n])
+                if self.path_geo_model:
+                    dev_mn, dev_mn_drv = self._model_eval(self.path_geo_model.az_dev_mns[self.az_bins[n]], rng)
+                    dev_vr, dev_vr_drv = self._model_eval(self.path_geo_model.az_dev_vrs[self.az_bins[n]], rng)
+
+                    az_diff = az_diff - np.radians(dev_mn)
+                    width = 2.0 * np.radians(dev_vr)
+                    denom = 1.0 - self.cos_half[n] * np.cos(width) + self.sin_half[n] * np.sin(width)
+                    kappa = np.log(2.0) / denom
+                    kappa_drv = -np.log(2.0) * (self.cos_half[n] * np.sin(width) + self.sin_half[n] * np.cos(width)) / denom**2 * 2.0 * np.radians(dev_vr_drv)
+
+                    log_pdf += (kappa * np.cos(az_diff) - np.log(2.0 * np.pi * i0e(kappa)) - kappa)[expand]
+                    if grad:
+                        d_az[..., n] += (-kappa * np.sin(az_diff))[expand]
+                        d_rng[..., n] += (kappa * np.sin(az_diff) * np.radians(dev_mn_drv) + kappa_drv * (np.cos(az_diff) - i1e(kappa) / i0e(kappa)))[expand]
+                else:
+                    log_pdf += (self.kappa[n] * np.cos(az_diff) - np.log(self.vm_norm[n]))[expand]
+                    if grad:
+                        d_az[..., n] += (-self.kappa[n] * np.sin(az_diff))[expand]
+
+            if self.has_tm[n] and dt is not None:
+                rcel = (self.tms[n] - dt) / rng[expand]
+                use_model = self.path_geo_model and self.has_az[n]
+                if use_model:
+                    fits = [[self._model_eval(func, rng) for func in funcs[self.az_bins[n]]] for funcs in (self.path_geo_model.rcel_mns, self.path_geo_model.rcel_vrs, self.path_geo_model.rcel_wts)]
+                    (mns, mns_drv), (vrs, vrs_drv), (wts, wts_drv) = [[np.stack(vals, axis=-1)[expand] for vals in zip(*fit)] for fit in fits]
+                else:
+                    mns, vrs, wts = infrasound.canon_rcel_mns, infrasound.canon_rcel_vrs, infrasound.canon_rcel_wts
+
+                z = (rcel[..., None] - mns) / vrs
+                with np.errstate(divide='ignore'):
+                    log_comps = np.log(wts / vrs) - 0.5 * z**2 - 0.5 * np.log(2.0 * np.pi)
+                log_max = np.max(log_comps, axis=-1)
+                comps = np.exp(log_comps - log_max[..., None])
+                comps_sum = np.sum(comps, axis=-1)
+
+                log_pdf += log_max + np.log(comps_sum) - np.log(rng[expand])
+                if grad:
+                    resp = comps / comps_sum[..., None]
+                    d_rcel = np.sum(resp * (-z / vrs), axis=-1)
+
+                    d_dt += -d_rcel / rng[expand]
+                    d_rng[..., n] += -d_rcel * rcel / rng[expand] - 1.0 / rng[expand]
+                    if use_model:
+                        wts_ratio = np.divide(wts_drv, wts, out=np.zeros(np.broadcast(wts_drv, wts).shape), where=(wts > 0.0))
+                        d_rng[..., n] += np.sum(resp * (wts_ratio - vrs_drv / vrs + z * mns_drv / vrs + z**2 * vrs_drv / vrs), axis=-1)
+
+        if not grad:
+            return log_pdf
+
+        # chain rule to latitude and longitude using the azimuth from the source back to each array
+        gam = np.arctan2(-np.sin(dlam) * np.cos(self.lats), np.cos(phi) * np.sin(self.lats) - np.sin(phi) * np.cos(self.lats) * np.cos(dlam))
+        sin_delta = np.maximum(np.sin(delta), np.finfo(float).tiny)
+
+        grad_lat = np.sum(d_rng * (-self.rad_earth * np.cos(gam))[expand] + d_az * (np.sin(gam) / sin_delta)[expand], axis=-1)
+        grad_lon = np.sum(d_rng * (-self.rad_earth * np.sin(gam))[expand] + d_az * (-np.cos(gam) / sin_delta)[expand], axis=-1) * np.cos(phi[:, 0])[expand]
+
+        return log_pdf, np.radians(grad_lat), np.radians(grad_lon), d_dt
+
+
+def map_refine(objective, x0, scales, maxiter=500):
+    """Refine a maximum a posteriori estimate from a starting point
+
+        Maximizes the log likelihood with L-BFGS-B using analytic gradients in coordinates
+        scaled by the widths of the posterior
 
-    resol = 500
-    x_vals = np.linspace(lims[0], lims[1], resol)
-    f_vals = func(x_vals)
+        Parameters
+        ----------
+        objective : MaPObjective
+            Log likelihood objective
+        x0 : 1darray
+            Starting latitude, longitude, and (optionally) origin time offset [deg, deg, s]
+        scales : 1darray
+            Scaling of each coordinate (e.g., posterior standard deviations)
+        maxiter : int
+            Maximum number of L-BFGS-B iterations
 
-    f_max = max(f_vals)
-    thresh_vals = np.linspace(0.0, f_max * 0.5, resol)
+        Returns:
+        ----------
+        x : 1darray
+            Refined estimate
+        log_val : float
+            Log likelihood at the refined estimate
+        """
+    x0, scales = np.asarray(x0, dtype=float), np.asarray(scales, dtype=float)
 
-    norm = simps(f_vals, x_vals)
+    def f(u):
+        x = x0 + u * scales
+        vals = objective.eval(x[0], x[1], x[2] if len(x) > 2 else None, grad=True)
+        return -vals[0][0], -np.array([val[0] for val in vals[1:len(x) + 1]]) * scales
 
-    conf_prev=1.0
-    bnds=[]
-    for n in range(resol):
-        conf = simps(np.array([conf_func(xj, thresh_vals[n]) for xj in x_vals]), x_vals) / norm
+    sol = minimize(f, np.zeros(len(x0)), jac=True, method='L-BFGS-B', options={'maxiter': maxiter, 'ftol': 1.0e-12, 'gtol': 1.0e-8})
+    return x0 + sol.x * scales, -sol.fun
 
-        if conf < conf_lvl < conf_prev:
-            thresh = thresh_vals[n - 1] - (thresh_vals[n-1] - thresh_vals[n]) / (conf_prev - conf) * (conf_lvl - conf)
-            conf = simps(np.array([conf_func(xj, thresh_vals[n]) for xj in x_vals]), x_vals) / norm
+def map_refine_wrapper(args):
+    return map_refine(*args)
 
-            for n in range(resol - 1):
-                if (f_vals[n] - thresh) * (f_vals[n+1] - thresh) < 0.0:
-                    bnds.append(x_vals[n])
-            break
 
-        conf_prev=conf
+def map_search(objective, cands, vals, scales, start_cnt=8, patience=3, tol=1.0e-6, pool=None):
+    """Multi-start maximum a posteriori search
 
-    return bnds, conf, thresh
+        Starts are chosen from the highest valued candidates that are separated by at least
+        one scale length in some coordinate from those already chosen.  Starts are refined in
+        order of decreasing value and the search terminates early once patience consecutive
+        starts fail to improve the best log likelihood by more than tol (all starts are refined
+        if a pool is provided).
 
+        Parameters
+        ----------
+        objective : MaPObjective
+            Log likelihood objective
+        cands : 2darray
+            Candidate latitudes, longitudes, and (optionally) origin time offsets with shape (P, 2 or 3)
+        vals : 1darray
+            Log likelihood of each candidate
+        scales : 1darray
+            Scaling of each coordinate (e.g., posterior standard deviations)
+        start_cnt : int
+            Maximum number of starting points to refine
+        patience : int
+            Number of consecutive starts without improvement before stopping
+        tol : float
+            Minimum improvement in log likelihood counted as better
+        pool : multiprocessing.Pool
+            Multiprocessing pool for refining starts in parallel
+
+        Returns:
+        ----------
+        x : 1darray
+            Maximum a posteriori estimate
+        log_val : float
+            Log likelihood at the estimate
+        """
+    cands, scales = np.asarray(cands, dtype=float), np.asarray(scales, dtype=float)
+
+    starts, avail = [], np.isfinite(vals)
+    while len(starts) < start_cnt and np.any(avail):
+        n = np.argmax(np.where(avail, vals, -np.inf))
+        starts = starts + [n]
+        avail = np.logical_and(avail, np.max(np.abs(cands - cands[n]) / scales, axis=1) >= 1.0)
+
+    if pool:
+        results = pool.map(map_refine_wrapper, [[objective, cands[n], scales] for n in starts])
+    else:
+        results, stall = [], 0
+        for n in starts:
+            results = results + [map_refine(objective, cands[n], scales)]
+            if len(results) > 1 and results[-1][1] <= max(result[1] for result in results[:-1]) + tol:
+                stall += 1
+                if stall == patience:
+                    break
+            else:
+                stall = 0
+
+    return max(results, key=lambda result: result[1])
+
+
+def adaptive_spatial_pdf(det_list, center, radius, angle=[-180, 180], resol=180, path_geo_model=None, resol_init=25, mass_tol=1.0e-3, grad_tol=0.05):
+    """Evaluates the marginal spatial pdf on an adaptively refined polar mesh
+
+        Starts from a coarse resol_init x resol_init polar grid about the center and repeatedly splits
+        (into quarters) the cells whose probability mass exceeds mass_tol of the total or whose pdf
+        values vary across their corners by more than grad_tol of the peak value, until the node spacing
+        reaches that of a uniform resol x resol grid.  The pdf is only evaluated at new nodes and each
+        remaining (leaf) cell contributes trapezoid quadrature weights to its corners.
+
+        Parameters
+        ----------
+        det_list : iterable of InfrasoundDetection instances
+            Detections attributed to the event
+        center : float
+            Center of the region as latitude, longitude pair [degrees]
+        radius : float
+            Radius of the region [km]
+        angle : float
+            Minimum and maximum angles for polar projection of the spatial PDFs
+        resol : int
+            Number of radial and azimuthal points of the uniform grid defining the finest mesh spacing
+        path_geo_model : Propagation-based, stochastic path geometry model
+            Optional path geometry model if available
+        resol_init : int
+            Number of radial and azimuthal points of the initial (coarse) grid
+        mass_tol : float
+            Fraction of the total probability mass above which a cell is refined
+        grad_tol : float
+            Fraction of the peak pdf value above which variation across a cell triggers refinement
+
+        Returns:
+        ----------
+        rngs : 1darray
+            Range of each mesh node from the center [km]
+        azs : 1darray
+            Azimuth of each mesh node from the center [degrees]
+        pdf : 1darray
+            Marginal spatial pdf at each mesh node
+        wts : 1darray
+            Quadrature weight of each mesh node for integration over the polar area element, r dr daz (az in degrees)
+
+        """
 
-def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, angle=[-180,180],rad_max=1000.0, MaP_mthd="grid"):
+    levels = max(int(np.ceil(np.log2((resol - 1.0) / (resol_init - 1.0)))), 0)
+    fine_cnt = (resol_init - 1) * 2**levels + 1
+    rng_step = radius / (fine_cnt - 1.0)
+    az_step = (angle[1] - 1.0 - angle[0]) / (fine_cnt - 1.0)
+
+    # pdf values and quadrature weights on the finest lattice, [range, azimuth] (NaN where not evaluated)
+    vals = np.full((fine_cnt, fine_cnt), np.nan)
+    wts = np.zeros((fine_cnt, fine_cnt))
+
+    def evaluate(nodes):
+        nodes = np.unique(nodes, axis=0)
+        nodes = nodes[np.isnan(vals[nodes[:, 0], nodes[:, 1]])]
+        if len(nodes) > 0:
+            lons, lats = sph_proj.fwd(np.full(len(nodes), center[1]), np.full(len(nodes), center[0]), angle[0] + nodes[:, 1] * az_step, nodes[:, 0] * rng_step * 1e3)[:2]
+            vals[nodes[:, 0], nodes[:, 1]] = lklhds.marginal_spatial_pdf(lats, lons, det_list, path_geo_model=path_geo_model)
+
+    def corners(cells):
+        i, j, size = cells.T
+        return np.stack((np.stack((i, j), axis=1), np.stack((i + size, j), axis=1), np.stack((i, j + size), axis=1), np.stack((i + size, j + size), axis=1)), axis=1)
+
+    # Cells are defined by the lattice indices of their lower corner and their size
+    size = 2**levels
+    cells = np.stack([temp.flatten() for temp in np.meshgrid(np.arange(resol_init - 1) * size, np.arange(resol_init - 1) * size, indexing='ij')] + [np.full((resol_init - 1)**2, size)], axis=1)
+    leaf_mass = 0.0
+
+    while len(cells) > 0:
+        crnrs = corners(cells)
+        evaluate(crnrs.reshape(-1, 2))
+
+        f_vals = vals[crnrs[:, :, 0], crnrs[:, :, 1]]
+        cell_wts = (cells[:, 2] * rng_step) * (cells[:, 2] * az_step) / 4.0 * (crnrs[:, :, 0] * rng_step).T
+        mass = np.sum(f_vals * cell_wts.T, axis=1)
+
+        refine = np.logical_and(cells[:, 2] > 1, np.logical_or(mass > mass_tol * (leaf_mass + np.sum(mass)), np.ptp(f_vals, axis=1) > grad_tol * np.nanmax(vals)))
+
+        np.add.at(wts, (crnrs[~refine, :, 0].flatten(), crnrs[~refine, :, 1].flatten()), cell_wts[:, ~refine].T.flatten())
+        leaf_mass += np.sum(mass[~refine])
+
+        parents = cells[refine]
+        half = parents[:, 2] // 2
+        cells = np.concatenate([np.stack((parents[:, 0] + di * half, parents[:, 1] + dj * half, half), axis=1) for di in range(2) for dj in range(2)])
+
+    nodes = np.where(~np.isnan(vals))
+    return nodes[0] * rng_step, angle[0] + nodes[1] * az_step, vals[nodes], wts[nodes]
+
+
+def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=10.0, rng_max=np.pi / 2.0 * 6370.0, rad_min=100.0, angle=[-180,180],rad_max=1000.0, MaP_mthd="grid", adaptive=False, seed=None, pool=None, geom_cache=None):
     """Run analysis of the posterior pdf for BISL
 
         Compute the marginal disribution...
@@ -265,6 +599,14 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
             Minimum and maximum angles for polar projection of the spatial PDFs
         MaP_method : string
             Method to use for searching for the maximum a posteriori solution ("grid" or "random")
+        adaptive : boolean
+            Evaluate the spatial PDF on an adaptively refined mesh with finest spacing set by resol (see adaptive_spatial_pdf) instead of a uniform grid
+        seed : int
+            Seed for the random sampling of maximum a posteriori candidates (MaP_mthd="random")
+        pool : multiprocessing.Pool
+            Multiprocessing pool for refining the maximum a posteriori starting points in parallel
+        geom_cache : GeometryCache
+            Cache of the azimuths and ranges from grid locations to the arrays (see infrapy.propagation.likelihoods); a new cache is used for the run if None
 
         Returns:
         ----------
@@ -299,38 +641,54 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
             raise ValueError(msg)
 
     resol = int(resol)
+    rand_gen = np.random.default_rng(seed)
+    if geom_cache is None:
+        geom_cache = lklhds.GeometryCache()
+
+    if adaptive:
+        # Project the marginal spacial posterior on an adaptively refined mesh in the region of interest
+        print('\t' + "Computing marginalized spatial PDF on adaptive mesh...")
+        proj_rngs, prof_azs, pdf, quad_wts = adaptive_spatial_pdf(det_list, center, radius, angle=angle, resol=resol, path_geo_model=path_geo_model)
+        proj_lons, proj_lats = sph_proj.fwd(np.array([center[1]] * len(pdf)), np.array([center[0]] * len(pdf)), prof_azs, proj_rngs * 1e3)[:2]
+        spatial_pdf = np.vstack((proj_lons, proj_lats, pdf))
+        print('\t\t' + "Evaluated " + str(len(pdf)) + " mesh nodes (uniform grid: " + str(resol**2) + ")")
+
+    else:
+        print('\t' + "Identifying integration region...")
+        rngs = np.linspace(0.0, radius, resol)
+        angles = np.linspace(angle[0], angle[1]-1, resol)
+        #angles = np.linspace(-180.0, 179.0, resol)
+        R, ANG = np.meshgrid(rngs, angles)
+        proj_rngs = R.flatten()
+        prof_azs = ANG.flatten()
 
-    print('\t' + "Identifying integration region...")
-    rngs = np.linspace(0.0, radius, resol)
-    angles = np.linspace(angle[0], angle[1]-1, resol)
-    #angles = np.linspace(-180.0, 179.0, resol)
-    R, ANG = np.meshgrid(rngs, angles)
-    proj_rngs = R.flatten()
-    prof_azs = ANG.flatten()
+        proj_lons, proj_lats = sph_proj.fwd(np.array([center[1]] * resol**2), np.array([center[0]] * resol**2), prof_azs, proj_rngs * 1e3)[:2]
 
-    proj_lons, proj_lats = sph_proj.fwd(np.array([center[1]] * resol**2), np.array([center[0]] * resol**2), prof_azs, proj_rngs * 1e3)[:2]
+        # Project the marginal spacial posterior in the region of interest for analysis
+        print('\t' + "Computing marginalized spatial PDF...")
+        pdf = lklhds.marginal_spatial_pdf(proj_lats, proj_lons, det_list, path_geo_model=path_geo_model, geom_cache=geom_cache)
+        spatial_pdf = np.vstack((proj_lons, proj_lats, pdf))
 
-    # Project the marginal spacial posterior in the region of interest for analysis
-    print('\t' + "Computing marginalized spatial PDF...")
-    pdf = lklhds.marginal_spatial_pdf(proj_lats, proj_lons, det_list, path_geo_model=path_geo_model)
-    spatial_pdf = np.vstack((proj_lons, proj_lats, pdf))
+        # Simpson's rule weights for the polar area element (r dr daz) on the uniform grid
+        quad_wts = np.outer(confidence.simpson_weights(angles), confidence.simpson_weights(rngs) * rngs).flatten()
 
     # compute 2d normal approximation
     print('\t' + "Computing confidence ellipse parameters...")
-    pdf_temp = pdf.reshape(resol, resol).T
+    x_vals = proj_rngs * np.sin(np.radians(prof_azs))
+    y_vals = proj_rngs * np.cos(np.radians(prof_azs))
+    mass = quad_wts * pdf
 
-    norm = simps(np.array([simps(pdf_temp[nr, :] * rngs[nr], angles) for nr in range(resol)]), rngs)
-    
-    x_mean = simps(np.array([simps(pdf_temp[nr, :] * rngs[nr] * (rngs[nr] * np.sin(np.radians(angles))), angles) for nr in range(resol)]), rngs) / norm
-    y_mean = simps(np.array([simps(pdf_temp[nr, :] * rngs[nr] * (rngs[nr] * np.cos(np.radians(angles))), angles) for nr in range(resol)]), rngs) / norm
+    norm = np.sum(mass)
+    x_mean = np.sum(mass * x_vals) / norm
+    y_mean = np.sum(mass * y_vals) / norm
+
+    x_stdev = np.sqrt(np.sum(mass * (x_vals - x_mean)**2) / norm)
+    y_stdev = np.sqrt(np.sum(mass * (y_vals - y_mean)**2) / norm)
+    covar = np.sum(mass * (x_vals - x_mean) * (y_vals - y_mean)) / (norm * x_stdev * y_stdev)
 
     temp = sph_proj.fwd(center[1], center[0], np.degrees(np.arctan2(x_mean, y_mean)), np.sqrt(x_mean**2 + y_mean**2) * 1e3)
     lat_mean, lon_mean = temp[1], temp[0]
 
-    x_stdev = np.sqrt(simps(np.array([simps(pdf_temp[nr, :] * rngs[nr] * (rngs[nr] * np.sin(np.radians(angles)) - x_mean)**2, angles) for nr in range(resol)]), rngs) / norm)
-    y_stdev = np.sqrt(simps(np.array([simps(pdf_temp[nr, :] * rngs[nr] * (rngs[nr] * np.cos(np.radians(angles)) - y_mean)**2, angles) for nr in range(resol)]), rngs) / norm)
-    covar = simps(np.array([simps(pdf_temp[nr, :] * rngs[nr] * (rngs[nr] * np.sin(np.radians(angles)) - x_mean) * (rngs[nr] * np.cos(np.radians(angles)) - y_mean), angles) for nr in range(resol)]), rngs) / (norm * x_stdev * y_stdev)
-
     if len([det for det in det_list if det.peakF_UTCtime < UTCDateTime("9999-01-01T00:00:00")]) > 0:
         # Temporal analysis
         # Use region edge to determine limits of possible source times with celerities between 0.2 and 0.4 km/s
@@ -352,7 +710,14 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
             t_vals[n] = t_vals[n] + np.timedelta64(int(dts[n] * 1e3), 'ms')
 
         skip = int(np.sqrt(resol * 4.0))
-        time_marg_pdf = np.array([np.mean(lklhds.joint_pdf(proj_lats[::skip], proj_lons[::skip], np.array([tn] * len(proj_lats[::skip])), det_list, path_geo_model=path_geo_model)) for tn in t_vals])
+        if adaptive:
+            # use the same subset of the uniform polar grid as the non-adaptive analysis
+            R, ANG = np.meshgrid(np.linspace(0.0, radius, resol), np.linspace(angle[0], angle[1]-1, resol))
+            time_lons, time_lats = sph_proj.fwd(np.array([center[1]] * len(R.flatten()[::skip])), np.array([center[0]] * len(R.flatten()[::skip])), ANG.flatten()[::skip], R.flatten()[::skip] * 1e3)[:2]
+        else:
+            time_lats, time_lons = proj_lats[::skip], proj_lons[::skip]
+        det_arrays = lklhds.DetectionArrays(det_list)
+        time_marg_pdf = np.array([np.mean(lklhds.joint_pdf(time_lats, time_lons, np.array([tn] * len(time_lats)), det_arrays, path_geo_model=path_geo_model, geom_cache=geom_cache)) for tn in t_vals])
 
         time_norm = simps(time_marg_pdf, dts)
         time_mean = simps(time_marg_pdf / time_norm * dts, dts)
@@ -364,28 +729,27 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
         time_bnds_90 = find_confidence(time_pdf_fit, [dts[0], dts[-1]], 0.90)
         temporal_pdf = [t_vals, time_marg_pdf / norm]
 
-        # Maximum a Posteriori analysis
+        # Maximum a Posteriori analysis (multi-start search of the log likelihood with origin times in seconds after time_lims[0])
+        print('\t' + "Searching for maximum a posteriori solution...")
+        objective = MaPObjective(det_list, time_lims[0], path_geo_model=path_geo_model)
         if MaP_mthd=='random':
             n_coarse = int(1e5)
 
-            map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * n_coarse), np.array([lat_mean] * n_coarse), np.random.uniform(-180.0, 180.0, n_coarse), abs(np.random.normal(scale=np.sqrt(x_stdev**2 + y_stdev**2), size=n_coarse)))[:2]
-            map_dts = np.random.normal(loc=time_mean, scale=time_stdev, size=n_coarse)
+            map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * n_coarse), np.array([lat_mean] * n_coarse), rand_gen.uniform(-180.0, 180.0, n_coarse), abs(rand_gen.normal(scale=np.sqrt(x_stdev**2 + y_stdev**2), size=n_coarse)) * 1e3)[:2]
+            map_dts = rand_gen.normal(loc=time_mean, scale=time_stdev, size=n_coarse)
+            func_vals = objective.eval(map_lats, map_lons, map_dts)
         else:
             grid_resol = 200
 
             R, ANG = np.meshgrid(np.linspace(0.0, 3.0 * np.sqrt(x_stdev**2 + y_stdev**2), int(grid_resol)), np.linspace(-180.0, 179.0, int(grid_resol)))
             map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * int(grid_resol)**2), np.array([lat_mean] * int(grid_resol)**2), ANG.flatten(), R.flatten() * 1e3)[:2]
-            map_dts = np.linspace(max(time_mean - 3.0 * time_stdev, 0.0), min(time_mean + 3.0 * time_stdev, (time_lims[1] - time_lims[0]).astype('m8[ms]').astype(float) / 1e3), grid_resol**2)
+            grid_dts = np.linspace(max(time_mean - 3.0 * time_stdev, 0.0), min(time_mean + 3.0 * time_stdev, (time_lims[1] - time_lims[0]).astype('m8[ms]').astype(float) / 1e3), map_t_resol)
 
-        map_tms = np.array([time_lims[0]] * len(map_dts))
-        for n in range(len(map_dts)):
-            map_tms[n] += np.timedelta64(int(map_dts[n] * 1e3), 'ms')
+            func_vals = objective.eval(map_lats, map_lons, np.array([grid_dts] * len(map_lats))).flatten()
+            map_lats, map_lons, map_dts = np.repeat(map_lats, map_t_resol), np.repeat(map_lons, map_t_resol), np.tile(grid_dts, len(map_lats))
 
-        func_vals = lklhds.joint_pdf(map_lats, map_lons, map_tms, det_list, path_geo_model=path_geo_model)
-
-        best_est = (map_lats[np.argmax(func_vals)], map_lons[np.argmax(func_vals)], map_dts[np.argmax(func_vals)])
-        def f(X): return -lklhds.joint_pdf(X[0], X[1], time_lims[0] + np.timedelta64(int(X[2] * 1e3), 'ms'), det_list, path_geo_model)
-        MaP = minimize(f, best_est, method='SLSQP', options={'maxiter':1000, 'disp':False})
+        scales = [np.degrees(max(y_stdev, 1.0) / MaPObjective.rad_earth), np.degrees(max(x_stdev, 1.0) / (MaPObjective.rad_earth * np.cos(np.radians(lat_mean)))), max(time_stdev, 1.0)]
+        MaP_x, MaP_log = map_search(objective, np.stack((map_lats, map_lons, map_dts), axis=1), func_vals, scales, pool=pool)
 
         result = {'lat_mean': lat_mean, 'lon_mean' : lon_mean,
                   'EW_stdev': x_stdev, 'NS_stdev': y_stdev,
@@ -394,38 +758,37 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
                   't_stdev': time_stdev,
                   't_min' : time_lims[0] + np.timedelta64(int(min(time_bnds_90[0]) * 1e3), 'ms'),
                   't_max' : time_lims[0] + np.timedelta64(int(max(time_bnds_90[0]) * 1e3), 'ms'),
-                  'lat_MaP': MaP.x[0],
-                  'lon_MaP': MaP.x[1],
-                  't_MaP': time_lims[0] + np.timedelta64(int(MaP.x[2] * 1e3), 'ms'),
-                  'MaP_val' : -MaP.fun / norm,
+                  'lat_MaP': MaP_x[0],
+                  'lon_MaP': (MaP_x[1] + 180.0) % 360.0 - 180.0,
+                  't_MaP': time_lims[0] + np.timedelta64(int(MaP_x[2] * 1e3), 'ms'),
+                  'MaP_val' : np.exp(MaP_log) / norm,
 	    		  'spatial_pdf' : spatial_pdf,
 		    	  'temporal_pdf' : temporal_pdf}
 
     else:
         # Maximum a Posteriori analysis
+        print('\t' + "Searching for maximum a posteriori solution...")
+        objective = MaPObjective(det_list, det_list[0].peakF_UTCtime, path_geo_model=path_geo_model)
         if MaP_mthd=='random':
             n_coarse = int(1e5)
-            map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * n_coarse), np.array([lat_mean] * n_coarse), np.random.uniform(-180.0, 180.0, n_coarse), abs(np.random.normal(scale=np.sqrt(x_stdev**2 + y_stdev**2), size=n_coarse)))[:2]
+            map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * n_coarse), np.array([lat_mean] * n_coarse), rand_gen.uniform(-180.0, 180.0, n_coarse), abs(rand_gen.normal(scale=np.sqrt(x_stdev**2 + y_stdev**2), size=n_coarse)) * 1e3)[:2]
         else:
             grid_resol = 200
 
             R, ANG = np.meshgrid(np.linspace(0.0, 3.0 * np.sqrt(x_stdev**2 + y_stdev**2), int(grid_resol)), np.linspace(-180.0, 179.0, int(grid_resol)))
             map_lons, map_lats = sph_proj.fwd(np.array([lon_mean] * int(grid_resol)**2), np.array([lat_mean] * int(grid_resol)**2), ANG.flatten(), R.flatten() * 1e3)[:2]
 
-        func_vals = lklhds.marginal_spatial_pdf(map_lats, map_lons, det_list, path_geo_model=path_geo_model)
-
-        best_est = (map_lats[np.argmax(func_vals)], map_lons[np.argmax(func_vals)])
-        def f(X):
-            return -lklhds.marginal_spatial_pdf(X[0], X[1], det_list, path_geo_model=path_geo_model)
-        MaP = minimize(f, best_est, method='SLSQP', options={'maxiter':1000, 'disp':False})
+        func_vals = objective.eval(map_lats, map_lons)
 
+        scales = [np.degrees(max(y_stdev, 1.0) / MaPObjective.rad_earth), np.degrees(max(x_stdev, 1.0) / (MaPObjective.rad_earth * np.cos(np.radians(lat_mean))))]
+        MaP_x, MaP_log = map_search(objective, np.stack((map_lats, map_lons), axis=1), func_vals, scales, pool=pool)
 
         result = {'lat_mean': lat_mean, 'lon_mean' : lon_mean,
                   'EW_stdev': x_stdev, 'NS_stdev': y_stdev,
                   'covar': covar,
-                  'lat_MaP': MaP.x[0],
-                  'lon_MaP': MaP.x[1],
-                  'MaP_val' : -MaP.fun / norm,
+                  'lat_MaP': MaP_x[0],
+                  'lon_MaP': (MaP_x[1] + 180.0) % 360.0 - 180.0,
+                  'MaP_val' : np.exp(MaP_log) / norm,
 	    		  'spatial_pdf' : spatial_pdf}
 
 
@@ -434,6 +797,110 @@ def run(det_list, path_geo_model=None, custom_region=None, resol=180, bm_width=1
 
     return result
 
+def set_batch_model(path_geo_model):
+    # set the path geometry model used by batch workers (as a
+    # pool initializer so the model is sent to each worker once)
+    global batch_model
+    batch_model = path_geo_model
+
+
+def run_batch_event(label, det_list, params, keep_pdfs=False):
+    """Run BISL analysis for a single event of a batch
+
+        Runs the analysis with the batch path geometry model (see set_batch_model), suppressing
+        screen output and catching any exception so that a failed event doesn't abort the batch
+
+        Parameters
+        ----------
+        label : str
+            Event label
+        det_list : iterable of InfrasoundDetection instances
+            Detections attributed to the event
+        params : dictionary
+            Keyword arguments for run (excluding path_geo_model)
+        keep_pdfs : boolean
+            Keep the spatial and temporal pdfs in the result
+
+        Returns:
+        ----------
+        summary : dictionary
+            Dictionary containing the event label, detection count, run time, status ('success' or 'failed'),
+            and the result of run (or the error message if the analysis failed)
+        """
+    summary = {'label': label, 'det_cnt': len(det_list)}
+
+    t0 = time.time()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(det_list, path_geo_model=batch_model, **params)
+        if not keep_pdfs:
+            result = {key: val for key, val in result.items() if key not in ('spatial_pdf', 'temporal_pdf')}
+        summary.update({'status': 'success', 'result': result})
+    except Exception as err:
+        summary.update({'status': 'failed', 'error': type(err).__name__ + ": " + str(err)})
+    summary['run_time'] = time.time() - t0
+
+    return summary
+
+def run_batch_event_wrapper(args):
+    return run_batch_event(*args)
+
+
+def run_batch(events, labels=None, path_geo_model=None, cpu_cnt=None, keep_pdfs=False, **params):
+    """Run BISL analysis for a batch of events
+
+        Localizes a list of events with a single path geometry model, scheduling the events in
+        order of decreasing detection count (so that the longest analyses start first) across an
+        optional multiprocessing pool.  Each worker receives the path geometry model once when it
+        starts and failed events are reported without stopping the batch.
+
+        Parameters
+        ----------
+        events : list
+            List of detection lists (InfrasoundDetection instances) for each event
+        labels : list
+            Event labels (defaults to 'ev0', 'ev1', ...)
+        path_geo_model : Propagation-based, stochastic path geometry model
+            Optional path geometry model if available
+        cpu_cnt : int
+            Number of processes used to analyze events in parallel (serial if None)
+        keep_pdfs : boolean
+            Keep the spatial and temporal pdfs in the results
+        params : keyword arguments
+            Additional parameters for run (e.g., resol, bm_width, rng_max, rad_min, rad_max, adaptive)
+
+        Returns:
+        ----------
+        summaries : list
+            Dictionaries from run_batch_event for each event in the input order
+        """
+    if labels is None:
+        labels = ["ev" + str(n) for n in range(len(events))]
+
+    order = sorted(range(len(events)), key=lambda n: -len(events[n]))
+    args = [[labels[n], events[n], params, keep_pdfs] for n in order]
+
+    if cpu_cnt is not None and cpu_cnt > 1:
+        pool = Pool(cpu_cnt, initializer=set_batch_model, initargs=(path_geo_model,))
+        outputs = pool.imap(run_batch_event_wrapper, args)
+    else:
+        set_batch_model(path_geo_model)
+        pool, outputs = None, map(run_batch_event_wrapper, args)
+
+    summaries = [None] * len(events)
+    for n, summary in zip(order, outputs):
+        summaries[n] = summary
+        print('\t' + str(summary['label']) + ": " + summary['status'] + " (" + str(summary['det_cnt']) + " detections, {:.1f} s)".format(summary['run_time']))
+
+    if pool:
+        pool.close()
+        pool.join()
+    else:
+        set_batch_model(None)
+
+    return summaries
+
+
 def summarize(result, confidence_level=95):
     """Outputs results of BISL analysis
 
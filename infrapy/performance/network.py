@@ -16,11 +16,10 @@ from scipy.interpolate import interp1d
 from scipy.integrate import simps
 
 from ..characterization import spye
+from ..utils import latlon
 
-from pyproj import Geod
 
-
-sph_proj = Geod(ellps='sphere')
+sph_proj = latlon.SphericalGeod()
 ref_dB = 10.0 * np.log10(20.e-6)
 
 # ########################## #
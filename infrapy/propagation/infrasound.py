@@ -6,6 +6,7 @@
 #
 # Author            Philip Blom (pblom@lanl.gov)
 
+import os
 import sys
 import pickle
 import imp
@@ -46,7 +47,7 @@ def canonical_rcel(rcel):
         vals = canon_rcel_wts / canon_rcel_vrs * norm.pdf((rcel - canon_rcel_mns) / canon_rcel_vrs)
         return np.sum(vals)
     else:
-        vals = np.asarray([canon_rcel_wts] * len(rcel)) / np.asarray([canon_rcel_vrs] * len(rcel)) * norm.pdf((np.asarray([rcel] * 3).T - np.asarray([canon_rcel_mns] * len(rcel))) / np.asarray([canon_rcel_vrs] * len(rcel)))
+        vals = canon_rcel_wts / canon_rcel_vrs * norm.pdf((np.asarray(rcel)[:, None] - canon_rcel_mns) / canon_rcel_vrs)
         return np.sum(vals, axis=1)
 
 
@@ -76,6 +77,53 @@ def find_azimuth_bin(az, bin_cnt=8):
     return result.astype(int)
 
 
+def range_table_eval(tbl, rng_min, rng_step, rng, rows=None):
+    """Linearly interpolates a regularly sampled range table
+
+        Parameters
+        ----------
+        tbl : ndarray
+            Table values with range along the first axis (or second axis if rows is given)
+        rng_min : float
+            Range of the first table sample [km]
+        rng_step : float
+            Range spacing of the table samples [km]
+        rng : float or ndarray
+            Range(s) at which to evaluate the table (clipped to the table bounds) [km]
+        rows : int or ndarray
+            Table row (e.g., azimuth bin) for each range
+
+        Returns:
+        vals : float or ndarray
+            Interpolated values (with any trailing table axes appended)
+        """
+    pos = np.clip((np.asarray(rng, dtype=float) - rng_min) / rng_step, 0.0, tbl.shape[0 if rows is None else 1] - 1.0)
+    n = np.minimum(pos.astype(int), tbl.shape[0 if rows is None else 1] - 2)
+    frac = pos - n
+
+    if rows is None:
+        lower, upper = tbl[n], tbl[n + 1]
+    else:
+        lower, upper = tbl[rows, n], tbl[rows, n + 1]
+
+    if np.ndim(lower) > np.ndim(frac):
+        frac = np.reshape(frac, np.shape(frac) + (1,) * (np.ndim(lower) - np.ndim(frac)))
+
+    return lower * (1.0 - frac) + upper * frac
+
+
+class RangeTable(object):
+    """Callable (single azimuth bin) view of a regularly sampled range table"""
+
+    def __init__(self, tbl, rng_min, rng_step):
+        self.tbl = tbl
+        self.rng_min = rng_min
+        self.rng_step = rng_step
+
+    def __call__(self, rng):
+        return range_table_eval(self.tbl, self.rng_min, self.rng_step, rng)
+
+
 # Path geometry models (range-celerity and azimuth deviation)
 class PathGeometryModel(object):
     az_bin_cnt = 8
@@ -92,6 +140,9 @@ class PathGeometryModel(object):
 
     rcel_vrs_min = 0.05
 
+    # range spacing of the evaluation tables [km]
+    tbl_rng_step = 0.5
+
     def __init__(self):
         self.rngs = np.array([])
 
@@ -103,62 +154,36 @@ class PathGeometryModel(object):
         self.az_dev_vrs = []
 
 
-    def eval_rcel_gmm(self, rng, rcel, az):
-        rng_eval = np.array(rng)
-        rng_eval[rng_eval > self.rng_max] = self.rng_max
+    def eval_rcel_params(self, rng, az):
+        """Evaluates the range-celerity mixture parameters from the model tables
 
-        if len(np.atleast_1d(rng)) == 1:
-            n_az = find_azimuth_bin(az, self.az_bin_cnt)
-            fit_rcel_wts = np.array([func(rng_eval) for func in self.rcel_wts[n_az]])
-            fit_rcel_mns = np.array([func(rng_eval) for func in self.rcel_mns[n_az]])
-            fit_rcel_vrs = np.array([func(rng_eval) for func in self.rcel_vrs[n_az]])
-            result = np.sum(fit_rcel_wts / fit_rcel_vrs * norm.pdf((rcel - fit_rcel_mns) / fit_rcel_vrs))
-        else:
-            mn = np.empty((len(rng_eval), 3))
-            vr = np.empty((len(rng_eval), 3))
-            wt = np.empty((len(rng_eval), 3))
+            Parameters
+            ----------
+            rng : float or ndarray
+                Propagation range(s) [km]
+            az : float or ndarray
+                Propagation azimuth(s) (broadcast against rng) [degrees]
 
-            az_indices = find_azimuth_bin(az, self.az_bin_cnt)
-            for n_az in range(self.az_bin_cnt):
-                mask = [az_indices == n_az]
-                if np.any(mask):
-                    mn[mask] = np.array([func(rng_eval[mask]) for func in self.rcel_mns[n_az]]).T
-                    vr[mask] = np.array([func(rng_eval[mask]) for func in self.rcel_vrs[n_az]]).T
-                    wt[mask] = np.array([func(rng_eval[mask]) for func in self.rcel_wts[n_az]]).T
-
-            result = np.sum(wt / vr * norm.pdf((np.array([rcel] * 3).T - mn) / vr), axis=1)
-        return result
+            Returns:
+            mns : ndarray
+                Means of the reciprocal celerity mixture components (last axis)
+            vrs : ndarray
+                Standard deviations of the reciprocal celerity mixture components (last axis)
+            wts : ndarray
+                Weights of the reciprocal celerity mixture components (last axis)
+            """
+        vals = range_table_eval(self.rcel_tbl, self.tbl_rng_min, self.tbl_rng_dr, rng, find_azimuth_bin(az, self.az_bin_cnt))
+        return vals[..., 0, :], vals[..., 1, :], vals[..., 2, :]
 
+    def eval_rcel_gmm(self, rng, rcel, az):
+        mns, vrs, wts = self.eval_rcel_params(rng, az)
+        return np.sum(wts / vrs * np.exp(-0.5 * ((np.asarray(rcel, dtype=float)[..., None] - mns) / vrs)**2), axis=-1) / np.sqrt(2.0 * np.pi)
 
     def eval_az_dev_mn(self, rng, az):
-        if len(np.atleast_1d(rng)) == 1:
-            return self.az_dev_mns[find_azimuth_bin(az, self.az_bin_cnt)](min(rng, self.rng_max))
-        else:
-            rng_eval = np.array(rng)
-            rng_eval[rng_eval > self.rng_max] = self.rng_max
-            az_indices = find_azimuth_bin(az, self.az_bin_cnt)
-
-            mn = np.empty_like(rng_eval)
-            for n_az in range(self.az_bin_cnt):
-                mask = az_indices==n_az
-                if np.any(mask):
-                    mn[mask] = self.az_dev_mns[n_az](rng_eval[mask])
-            return mn
+        return range_table_eval(self.az_dev_mn_tbl, self.tbl_rng_min, self.tbl_rng_dr, rng, find_azimuth_bin(az, self.az_bin_cnt))
 
     def eval_az_dev_vr(self, rng, az):
-        if len(np.atleast_1d(rng)) == 1:
-            return self.az_dev_vrs[find_azimuth_bin(az, self.az_bin_cnt)](min(rng, self.rng_max))
-        else:
-            rng_eval = np.array(rng)
-            rng_eval[rng_eval > self.rng_max] = self.rng_max
-            az_indices = find_azimuth_bin(az, self.az_bin_cnt)
-
-            vr = np.empty_like(rng_eval)
-            for n_az in range(self.az_bin_cnt):
-                mask = az_indices==n_az
-                if np.any(mask):
-                    vr[mask] = self.az_dev_vrs[n_az](rng_eval[mask])
-            return vr
+        return range_table_eval(self.az_dev_vr_tbl, self.tbl_rng_min, self.tbl_rng_dr, rng, find_azimuth_bin(az, self.az_bin_cnt))
 
     def build(self, results_file, model_file, show_fits=False, file_id=None, verbose_output=False, rng_width=40.0, rng_spacing=10.0, data_format="new", abs_lim = -100.0, trn_ht_min = 2.0):
         print('-' * 75)
@@ -395,52 +420,78 @@ class PathGeometryModel(object):
         pickle.dump(priors, open(model_file, "wb"))
         print('')
 
-    def load(self, model_file, smooth=None):
-        fit_params = pickle.load(open(model_file, "rb"), encoding='latin1')
-        self.az_bin_cnt = len(fit_params[1])
-
-        self.rng_max = max(fit_params[0])
+    def load(self, model_file, smooth=None, cache_dir=None):
+        """Loads a path geometry model and builds its evaluation tables
+
+            The fitted parameters are sampled onto regular range grids (tbl_rng_step spacing) in each
+            azimuth bin and evaluated by linear interpolation.  If a cache directory is provided, the
+            (smoothed) parameter knots are written there so that later loads skip the pickled fits and
+            smoothing; nothing is written by default.
+
+            Parameters
+            ----------
+            model_file : str
+                Path geometry model (PGM) file
+            smooth : boolean
+                Apply Savitzky-Golay smoothing to the fitted parameters
+            cache_dir : str
+                Directory of the binary parameter cache (not used if None)
+            """
+        knot_keys = ('rng', 'az_dev_mn', 'az_dev_vr', 'rcel_mn', 'rcel_vr', 'rcel_wt')
+        knots = None
+
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, os.path.basename(model_file) + (".smooth" if smooth else "") + ".npz")
+            src_stamp = np.array([os.path.getmtime(model_file), os.path.getsize(model_file)])
+
+            if os.path.isfile(cache_file):
+                with np.load(cache_file) as cache_data:
+                    if np.array_equal(cache_data['src_stamp'], src_stamp):
+                        print("Loading propagation model parameters from " + cache_file + (" with smoothing." if smooth else " without smoothing."))
+                        knots = [cache_data[key] for key in knot_keys]
+
+        if knots is None:
+            fit_params = pickle.load(open(model_file, "rb"), encoding='latin1')
+            knots = [np.array(vals, dtype=float) for vals in fit_params]
+
+            if smooth:
+                print("Loading propagation model parameters from " + model_file + " with smoothing.")
+                knots[1:] = [savgol_filter(vals, 9, 3, axis=1) for vals in knots[1:]]
+            else:
+                print("Loading propagation model parameters from " + model_file + " without smoothing.")
 
-        self.az_dev_mns = [0] * self.az_bin_cnt
-        self.az_dev_vrs = [0] * self.az_bin_cnt
+            if cache_dir is not None:
+                try:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    with open(cache_file, 'wb') as f:
+                        np.savez(f, src_stamp=src_stamp, **dict(zip(knot_keys, knots)))
+                except OSError:
+                    warnings.warn("Unable to write propagation model parameter cache " + cache_file)
 
-        self.rcel_wts = [0] * self.az_bin_cnt
-        self.rcel_mns = [0] * self.az_bin_cnt
-        self.rcel_vrs = [0] * self.az_bin_cnt
+        # sample the cubic fits on a regular range grid in each azimuth bin
+        rng_min, rng_max = min(knots[0]), max(knots[0])
+        tbl_rngs = np.linspace(rng_min, rng_max, int(round((rng_max - rng_min) / self.tbl_rng_step)) + 1)
 
-        for n_az in range(self.az_bin_cnt):
-            self.rcel_mns[n_az] = [0] * 3
-            self.rcel_vrs[n_az] = [0] * 3
-            self.rcel_wts[n_az] = [0] * 3
+        self.set_tables(rng_min, rng_max, *[interp1d(knots[0], vals, kind='cubic', axis=1)(tbl_rngs) for vals in knots[1:]])
 
-        if smooth:
-            print("Loading propagation model parameters from " + model_file + " with smoothing.")
-            for n_az in range(self.az_bin_cnt):
-                self.az_dev_mns[n_az] = interp1d(fit_params[0], savgol_filter(fit_params[1][n_az], 9, 3), kind='cubic')
-                self.az_dev_vrs[n_az] = interp1d(fit_params[0], savgol_filter(fit_params[2][n_az], 9, 3), kind='cubic')
+    def set_tables(self, rng_min, rng_max, az_dev_mn, az_dev_vr, rcel_mn, rcel_vr, rcel_wt):
+        # define the evaluation tables (sampled uniformly from rng_min to rng_max) and the per-azimuth bin functions of range
+        self.az_bin_cnt = az_dev_mn.shape[0]
+        self.rng_max = rng_max
 
-                self.rcel_mns[n_az] = [0] * 3
-                self.rcel_vrs[n_az] = [0] * 3
-                self.rcel_wts[n_az] = [0] * 3
+        rng_step = (rng_max - rng_min) / (az_dev_mn.shape[1] - 1)
+        self.tbl_rng_min, self.tbl_rng_dr = rng_min, rng_step
 
-                for j in range(3):
-                    self.rcel_mns[n_az][j] = interp1d(fit_params[0], savgol_filter(fit_params[3][n_az][:, j], 9, 3), kind='cubic')
-                    self.rcel_vrs[n_az][j] = interp1d(fit_params[0], savgol_filter(fit_params[4][n_az][:, j], 9, 3), kind='cubic')
-                    self.rcel_wts[n_az][j] = interp1d(fit_params[0], savgol_filter(fit_params[5][n_az][:, j], 9, 3), kind='cubic')
-        else:
-            print("Loading propagation model parameters from " + model_file + " without smoothing.")
-            for n_az in range(self.az_bin_cnt):
-                self.az_dev_mns[n_az] = interp1d(fit_params[0], fit_params[1][n_az], kind='cubic')
-                self.az_dev_vrs[n_az] = interp1d(fit_params[0], fit_params[2][n_az], kind='cubic')
+        # range-celerity tables are combined (azimuth bin, range, parameter, mixture component) for a single lookup
+        self.az_dev_mn_tbl, self.az_dev_vr_tbl = az_dev_mn, az_dev_vr
+        self.rcel_tbl = np.stack((rcel_mn, rcel_vr, rcel_wt), axis=2)
 
-                self.rcel_mns[n_az] = [0] * 3
-                self.rcel_vrs[n_az] = [0] * 3
-                self.rcel_wts[n_az] = [0] * 3
+        self.az_dev_mns = [RangeTable(az_dev_mn[n_az], rng_min, rng_step) for n_az in range(self.az_bin_cnt)]
+        self.az_dev_vrs = [RangeTable(az_dev_vr[n_az], rng_min, rng_step) for n_az in range(self.az_bin_cnt)]
 
-                for j in range(3):
-                    self.rcel_mns[n_az][j] = interp1d(fit_params[0], fit_params[3][n_az][:, j], kind='cubic')
-                    self.rcel_vrs[n_az][j] = interp1d(fit_params[0], fit_params[4][n_az][:, j], kind='cubic')
-                    self.rcel_wts[n_az][j] = interp1d(fit_params[0], fit_params[5][n_az][:, j], kind='cubic')
+        self.rcel_mns = [[RangeTable(rcel_mn[n_az, :, j], rng_min, rng_step) for j in range(3)] for n_az in range(self.az_bin_cnt)]
+        self.rcel_vrs = [[RangeTable(rcel_vr[n_az, :, j], rng_min, rng_step) for j in range(3)] for n_az in range(self.az_bin_cnt)]
+        self.rcel_wts = [[RangeTable(rcel_wt[n_az, :, j], rng_min, rng_step) for j in range(3)] for n_az in range(self.az_bin_cnt)]
 
     def display(self, file_id=None, hold_fig=None):
         resol = 100
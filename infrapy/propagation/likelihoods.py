@@ -9,9 +9,11 @@
 # Author            Philip Blom (pblom@lanl.gov)
 
 from datetime import datetime
+import hashlib
 import itertools
 
 import json
+import os
 
 import numpy as np
 
@@ -22,10 +24,9 @@ from scipy.integrate import simps
 from scipy.interpolate import interp1d, interp2d
 from scipy.special import i0
 
-from pyproj import Geod
-
 from . import infrasound
 from . import seismic
+from ..utils import latlon
 from ..utils import prog_bar
 
 
@@ -35,7 +36,11 @@ from ..utils import prog_bar
 # ################################ #
 np.seterr(over='ignore')
 int_opts = {'limit': 100, 'epsrel': 1.0e-3}
-sph_proj = Geod(ellps='sphere')
+sph_proj = latlon.SphericalGeod()
+
+# maximum number of (location, time) samples evaluated
+# at once when marginalizing over origin time numerically
+marg_chunk_len = 250000
 
 # ################################# #
 #   InfrasoundDetection class      #
@@ -131,89 +136,16 @@ class InfrasoundDetection(object):
             return False
 
     def az_pdf(self, lat, lon, path_geo_model=None):
-        if len(np.atleast_1d(lat)) == 1:
-            temp = sph_proj.inv(self.__lon, self.__lat, lon, lat, radians=False)
-            az_diff = np.radians(temp[0] - self.__back_az)
-
-            if path_geo_model:
-                rng = temp[2] / 1000.0
-                az_diff -= np.radians(path_geo_model.eval_az_dev_mn(rng, self.__back_az - 180.0))
-                width_diff = 2.0 * np.radians(path_geo_model.eval_az_dev_vr(rng, self.__back_az - 180.0))
-                kappa = np.log(2.0) / (1.0 - self.cos_half * np.cos(width_diff) + self.sin_half * np.sin(width_diff))
-                norm = 2.0 * np.pi * i0(kappa)
-            else:
-                kappa, norm = self.kappa, self.vm_norm
-
-        else:
-            temp = np.asarray(sph_proj.inv([self.__lon] * len(lon), [self.__lat] * len(lon), lon, lat, radians=False))
-            az_diff = np.radians(temp[0] - [self.__back_az] * len(lon))
-
-            if path_geo_model:
-                rng = temp[2] / 1000.0
-                az_diff -= np.radians(path_geo_model.eval_az_dev_mn(rng, np.array([self.__back_az] * len(lon)) - 180.0))
-                width_diff = 2.0 * np.radians(path_geo_model.eval_az_dev_vr(rng, np.array([self.__back_az] * len(lon)) - 180.0))
-                kappa = np.log(2.0) / (1.0 - self.cos_half * np.cos(width_diff) + self.sin_half * np.sin(width_diff))
-                norm = 2.0 * np.pi * i0(kappa)
-            else:
-                kappa, norm = self.kappa, self.vm_norm
-
-        return np.exp(kappa * np.cos(az_diff)) / norm
+        vals = DetectionArrays([self]).az_pdf(lat, lon, path_geo_model)[:, 0]
+        return vals[0] if np.ndim(lat) == 0 else vals
 
     def rng_pdf(self, lat, lon, t, path_geo_model=None):
-        if len(np.atleast_1d(lat)) == 1:
-            rng = sph_proj.inv(self.__lon, self.__lat, lon, lat, radians=False)[2] / 1000.0
-            if path_geo_model:
-                result = path_geo_model.eval_rcel_gmm(rng, (self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng, self.__back_az - 180.0)
-            else:
-                result = infrasound.canonical_rcel((self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng)
-        else:
-            rng = np.asarray(sph_proj.inv([self.__lon] * len(lon), [self.__lat] * len(lon), lon, lat, radians=False))[2] / 1000.0
-            if path_geo_model:
-                result = path_geo_model.eval_rcel_gmm(rng, (self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng, np.asarray([self.__back_az - 180.0] * len(lon)))
-            else:
-                result = infrasound.canonical_rcel((self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng)
-        return result / rng
+        vals = DetectionArrays([self]).rng_pdf(lat, lon, t, path_geo_model)[:, 0]
+        return vals[0] if np.ndim(lat) == 0 else vals
 
     def pdf(self, lat, lon, t, path_geo_model=None):
-        if self.back_azimuth is None:
-            return self.rng_pdf(lat, lon, t, path_geo_model)
-        elif self.__peakF_UTCtime > UTCDateTime("9999-01-01T00:00:00"):
-            return self.az_pdf(lat, lon, path_geo_model)
-        else:
-            if len(np.atleast_1d(lat)) == 1:
-                temp = sph_proj.inv(self.__lon, self.__lat, lon, lat, radians=False)
-                az_diff = np.radians(temp[0] - self.__back_az)
-                rng = temp[2] / 1000.0
-
-                if path_geo_model:
-                    az_diff -= np.radians(path_geo_model.eval_az_dev_mn(rng, self.__back_az - 180.0))
-                    width_diff = 2.0 * np.radians(path_geo_model.eval_az_dev_vr(rng, self.__back_az - 180.0))
-                    kappa = np.log(2.0) / (1.0 - self.cos_half * np.cos(width_diff) + self.sin_half * np.sin(width_diff))
-                    norm = 2.0 * np.pi * i0(kappa)
-
-                    az_pdf = np.exp(kappa * np.cos(az_diff)) / norm
-                    rng_pdf = path_geo_model.eval_rcel_gmm(rng, (self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng, self.__back_az - 180.0)
-                else:
-                    az_pdf = np.exp(self.kappa * np.cos(az_diff)) / self.vm_norm
-                    rng_pdf = infrasound.canonical_rcel((self.get_peakF_UTCtime() - t).astype('m8[s]').astype(float) / rng)
-            else:
-                temp = np.asarray(sph_proj.inv([self.__lon] * len(lon), [self.__lat] * len(lon), lon, lat, radians=False))
-                az_diff = np.radians(temp[0] - [self.__back_az] * len(lon))
-                rng = temp[2] / 1000.0
-
-                if path_geo_model:
-                    az_diff -= np.radians(path_geo_model.eval_az_dev_mn(rng, np.array([self.__back_az] * len(lon)) - 180.0))
-                    width_diff = 2.0 * np.radians(path_geo_model.eval_az_dev_vr(rng, np.array([self.__back_az] * len(lon)) - 180.0))
-                    kappa = np.log(2.0) / (1.0 - self.cos_half * np.cos(width_diff) + self.sin_half * np.sin(width_diff))
-                    norm = 2.0 * np.pi * i0(kappa)
-
-                    az_pdf = np.exp(kappa * np.cos(az_diff)) / norm
-                    rng_pdf = path_geo_model.eval_rcel_gmm(rng, (self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng, np.asarray([self.__back_az - 180.0] * len(lon)))
-                else:
-                    az_pdf = np.exp(self.kappa * np.cos(az_diff)) / self.vm_norm
-                    rng_pdf = infrasound.canonical_rcel((self.__peakF_UTCtime - t).astype('m8[s]').astype(float) / rng)
-
-            return az_pdf * rng_pdf / rng
+        vals = DetectionArrays([self]).pdf(lat, lon, t, path_geo_model)[:, 0]
+        return vals[0] if np.ndim(lat) == 0 else vals
 
     def src_spec_pdf(self, lat, lon, freqs, src_spec, smn_spec, tloss_models):
         """Defines the probability of detection being produced by a given source
@@ -606,161 +538,488 @@ class SeismicDetection(object):
 
 
 # ################################ #
-#        Methods to Combine        #
-#      Infrasound Likelihoods      #
+#   Geometry from sampling grids   #
+#     to the detecting arrays      #
 # ################################ #
-def joint_pdf(lat, lon, t, det_list, path_geo_model=None, prog_step=0):
-    result = np.array([det.pdf(lat, lon, t, path_geo_model=path_geo_model) for det in det_list if type(det) == InfrasoundDetection]).prod(axis=0)
-    result *= np.array([det.pdf(lat, lon, t) for det in det_list if type(det) == SeismicDetection]).prod(axis=0)
-    prog_bar.increment(n=prog_step)
-    return result
+def array_geometry(lat, lon, array_lats, array_lons):
+    """Computes the azimuths and ranges from detecting arrays to a set of locations
+
+        Parameters
+        ----------
+        lat : float or 1darray
+            Latitude(s) of the locations [degrees]
+        lon : float or 1darray
+            Longitude(s) of the locations [degrees]
+        array_lats : 1darray
+            Latitudes of the arrays [degrees]
+        array_lons : 1darray
+            Longitudes of the arrays [degrees]
+
+        Returns:
+        azs : 2darray
+            Azimuths from each array to each location with shape (P, A) [degrees]
+        rngs : 2darray
+            Ranges from each array to each location with shape (P, A) [km]
+        """
+    lat, lon = np.atleast_1d(lat), np.atleast_1d(lon)
+    if len(array_lats) == 0:
+        return np.empty((len(lat), 0)), np.empty((len(lat), 0))
+
+    temp = sph_proj.inv(np.tile(array_lons, len(lat)), np.tile(array_lats, len(lat)), np.repeat(lon, len(array_lats)), np.repeat(lat, len(array_lats)), radians=False)
+    return np.reshape(temp[0], (len(lat), len(array_lats))), np.reshape(temp[2], (len(lat), len(array_lats))) / 1000.0
+
+
+class GeometryCache(object):
+    """Cache of the azimuths and ranges from sampling grids to detecting arrays
+
+        Stores the geodesics from each grid of locations (keyed by the geodesic backend and a hash
+        of the latitudes and longitudes) to each array location so that repeated evaluations on a
+        grid (e.g., the spatial and temporal marginalizations in BISL or runs on a fixed monitoring
+        grid) only compute the geometry for arrays not yet seen on that grid.  If a file name is provided,
+        existing values are loaded from it and save() writes the cache back to disk.
+
+        Parameters
+        ----------
+        file_name : str
+            Path of the (numpy .npz) cache file to load and save
+        max_grids : int
+            Maximum number of grids held in memory (the oldest grid is dropped when exceeded)
+        """
+
+    def __init__(self, file_name=None, max_grids=16):
+        self.file_name = file_name
+        self.max_grids = max_grids
+        self.grids = {}
+        self.hits = 0
+        self.misses = 0
+
+        if file_name and os.path.isfile(file_name):
+            with np.load(file_name) as cache_data:
+                for name in cache_data.files:
+                    grid, array, field = name.split('|')
+                    self.grids.setdefault(grid, {}).setdefault(array, [None, None])[['az', 'rng'].index(field)] = cache_data[name]
+
+    def __len__(self):
+        return len(self.grids)
+
+    @staticmethod
+    def grid_key(lat, lon):
+        backend = latlon.geod_backend if sph_proj.backend is None else sph_proj.backend
+        return backend + ":" + hashlib.sha1(np.ascontiguousarray(lat, dtype=float).tobytes() + np.ascontiguousarray(lon, dtype=float).tobytes()).hexdigest()
+
+    @staticmethod
+    def array_key(array_lat, array_lon):
+        return "{:.6f},{:.6f}".format(array_lat, array_lon)
+
+    def geometry(self, lat, lon, array_lats, array_lons):
+        """Returns the azimuths and ranges from arrays to a grid (computing only those not in the cache)
 
-def joint_pdf_wrapper(args):
-    return joint_pdf(*args)
+            Parameters
+            ----------
+            lat : float or 1darray
+                Latitude(s) of the grid locations [degrees]
+            lon : float or 1darray
+                Longitude(s) of the grid locations [degrees]
+            array_lats : 1darray
+                Latitudes of the arrays [degrees]
+            array_lons : 1darray
+                Longitudes of the arrays [degrees]
 
+            Returns:
+            azs : 2darray
+                Azimuths from each array to each location with shape (P, A) [degrees]
+            rngs : 2darray
+                Ranges from each array to each location with shape (P, A) [km]
+            """
+        lat, lon = np.atleast_1d(lat), np.atleast_1d(lon)
+
+        key = self.grid_key(lat, lon)
+        if key not in self.grids:
+            if len(self.grids) >= self.max_grids:
+                self.grids.pop(next(iter(self.grids)))
+            self.grids[key] = {}
+        grid = self.grids[key]
+
+        array_keys = [self.array_key(array_lat, array_lon) for array_lat, array_lon in zip(array_lats, array_lons)]
+        missing = [n for n, array in enumerate(array_keys) if array not in grid]
+        self.hits += len(array_keys) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing) > 0:
+            azs, rngs = array_geometry(lat, lon, array_lats[missing], array_lons[missing])
+            for j, n in enumerate(missing):
+                grid[array_keys[n]] = [azs[:, j], rngs[:, j]]
+
+        if len(array_keys) == 0:
+            return np.empty((len(lat), 0)), np.empty((len(lat), 0))
+        else:
+            return np.stack([grid[array][0] for array in array_keys], axis=1), np.stack([grid[array][1] for array in array_keys], axis=1)
 
-def marginal_spatial_pdf(lat, lon, det_list, path_geo_model=None, prog_step=0, resol=100):
-    # define seprate lists of infrasound and seismic only detections
-    infr_det_list = [det for det in det_list if type(det) == InfrasoundDetection]
-    infr_det_list2 = [det for det in infr_det_list if det.peakF_UTCtime < UTCDateTime("9999-01-01T00:00:00")]
+    def save(self, file_name=None):
+        if file_name is None:
+            file_name = self.file_name
+        if file_name:
+            cache_data = {}
+            for grid, arrays in self.grids.items():
+                for array, (azs, rngs) in arrays.items():
+                    cache_data[grid + '|' + array + '|az'] = azs
+                    cache_data[grid + '|' + array + '|rng'] = rngs
+            with open(file_name, 'wb') as f:
+                np.savez(f, **cache_data)
 
-    seis_det_list = [det for det in det_list if type(det) == SeismicDetection]
 
-    infr2_cnt = len(infr_det_list2)
-    seis_cnt = len(seis_det_list)
+# ################################ #
+#   Struct-of-arrays detection     #
+#   list for vectorized likelihood #
+# ################################ #
+class DetectionArrays(object):
+    """Struct-of-arrays representation of a detection list
+
+        Holds the array locations, back azimuths, arrival times, and beam width parameters of
+        the infrasound detections in a list as numpy arrays so that the likelihoods of all of
+        the detections are evaluated from a single batched geodesic calculation (from every
+        location to every array) and vectorized arithmetic.
+
+        Parameters
+        ----------
+        det_list : :obj:`list` of :obj:`InfrasoundDetection` or :obj:`SeismicDetection`
+            List of detections (seismic detections are kept in a list and evaluated individually)
+
+        Notes
+        -----
+        Likelihood methods return arrays with shape (P, N) for P locations and N infrasound detections.
+        Detections without a back azimuth have unit azimuthal likelihood and those without a valid
+        arrival time (placeholder times after 9999-01-01) have unit range-celerity likelihood so that
+        pdf matches InfrasoundDetection.pdf for each detection.  The azimuth bin of a path geometry
+        model is unknown without a back azimuth, so such detections are scored against the canonical
+        range-celerity model.
+        """
+
+    def __init__(self, det_list):
+        self.infr_dets = [det for det in det_list if type(det) == InfrasoundDetection]
+        self.seis_dets = [det for det in det_list if type(det) == SeismicDetection]
+
+        self.lats = np.array([det.latitude for det in self.infr_dets], dtype=float)
+        self.lons = np.array([det.longitude for det in self.infr_dets], dtype=float)
+        self.back_az = np.array([np.nan if det.back_azimuth is None else det.back_azimuth for det in self.infr_dets], dtype=float)
+        self.times = np.array([det.peakF_UTCtime for det in self.infr_dets], dtype='M8[us]')
+
+        array_locs, self.array_index = np.unique(np.stack((self.lats, self.lons), axis=1), axis=0, return_inverse=True)
+        self.array_lats, self.array_lons = array_locs[:, 0], array_locs[:, 1]
+        self.array_index = self.array_index.flatten()
+
+        self.has_az = ~np.isnan(self.back_az)
+        self.has_tm = self.times < np.datetime64("9999-01-01T00:00:00")
+
+        self.kappa = np.array([getattr(det, 'kappa', np.nan) for det in self.infr_dets])
+        self.vm_norm = np.array([getattr(det, 'vm_norm', np.nan) for det in self.infr_dets])
+        self.cos_half = np.array([getattr(det, 'cos_half', np.nan) for det in self.infr_dets])
+        self.sin_half = np.array([getattr(det, 'sin_half', np.nan) for det in self.infr_dets])
+
+    def __len__(self):
+        return len(self.infr_dets)
+
+    def geometry(self, lat, lon, geom_cache=None):
+        """Azimuths [deg] and ranges [km] from each array to each location with shape (P, N)
+
+            Geodesics are computed once for each unique array location (and read from or added to
+            geom_cache if provided) and shared by all detections on that array
+            """
+        if geom_cache is None:
+            azs, rngs = array_geometry(lat, lon, self.array_lats, self.array_lons)
+        else:
+            azs, rngs = geom_cache.geometry(lat, lon, self.array_lats, self.array_lons)
+
+        return azs[:, self.array_index], rngs[:, self.array_index]
 
-    if 3**infr2_cnt > resol:
-        def temp(la, lo):
-            infr_rngs = np.array([sph_proj.inv(det.longitude, det.latitude, lo, la)[2] / 1000.0 for det in infr_det_list2])
-            infr_t1 = max(np.array([det.peakF_UTCtime - np.timedelta64(int(infr_rngs[n] / 0.2 * 1e3), 'ms') for n, det in enumerate(infr_det_list2)]))
-            infr_t2 = min(np.array([det.peakF_UTCtime - np.timedelta64(int(infr_rngs[n] / 0.4 * 1e3), 'ms') for n, det in enumerate(infr_det_list2)]))
+    def _model_eval(self, method, rngs, mask, *args):
+        # evaluate a path geometry model method for the masked detections (using their back azimuths)
+        rngs_eval = rngs[:, mask].flatten()
+        args_eval = [arg.flatten() for arg in args]
+        azs_eval = np.tile(self.back_az[mask] - 180.0, len(rngs))
 
-            if seis_cnt > 0:
-                seis_rngs = np.array([sph_proj.inv(det.longitude, det.latitude, lo, la)[2] / 1000.0 for det in seis_det_list])
-                seis_t1 = max(np.array([det.peakF_UTCtime - np.timedelta64(int(seis_rngs[n] / 2.0 * 1e3), 'ms') for n, det in enumerate(seis_det_list)]))
-                seis_t2 = min(np.array([det.peakF_UTCtime - np.timedelta64(int(seis_rngs[n] / 8.0 * 1e3), 'ms') for n, det in enumerate(seis_det_list)]))
+        if len(rngs_eval) == 1:
+            return np.reshape(method(rngs_eval[0], *[arg[0] for arg in args_eval], azs_eval[0]), (1, 1))
+        else:
+            return np.reshape(method(rngs_eval, *args_eval, azs_eval), (len(rngs), -1))
+
+    def az_pdf(self, lat, lon, path_geo_model=None, geom=None):
+        azs, rngs = self.geometry(lat, lon) if geom is None else geom
+        vals = np.ones(azs.shape)
+
+        mask = self.has_az
+        if np.any(mask):
+            az_diff = np.radians(azs[:, mask] - self.back_az[mask])
+
+            if path_geo_model:
+                az_diff -= np.radians(self._model_eval(path_geo_model.eval_az_dev_mn, rngs, mask))
+                width_diff = 2.0 * np.radians(self._model_eval(path_geo_model.eval_az_dev_vr, rngs, mask))
+                kappa = np.log(2.0) / (1.0 - self.cos_half[mask] * np.cos(width_diff) + self.sin_half[mask] * np.sin(width_diff))
+                norm = 2.0 * np.pi * i0(kappa)
             else:
-                seis_t1 = np.datetime64("0000-01-01T00:00:00")
-                seis_t2 = np.datetime64("9999-01-01T00:00:00")
+                kappa, norm = self.kappa[mask], self.vm_norm[mask]
 
-            t1 = max(infr_t1, seis_t1)
-            t2 = min(infr_t2, seis_t2)
+            vals[:, mask] = np.exp(kappa * np.cos(az_diff)) / norm
 
-            t_vals = np.array([t1 + (t2 - t1) / (resol - 1) * m for m in range(resol)])
-            pdf_vals = joint_pdf(np.array([la] * resol),np.array([lo] * resol), t_vals, det_list, path_geo_model=path_geo_model)
+        return vals
 
-            return simps(pdf_vals, (t2 - t1).astype('m8[ms]').astype(float) * 1.0e-3 / (resol - 1) * range(resol))
+    def _rcel_pdf(self, t, rngs, mask, path_geo_model=None):
+        # reduced celerity likelihood of the masked detections for source time(s) t
+        vals = np.ones(rngs.shape)
 
-        if len(np.atleast_1d(lat)) == 1:
-            return temp(lat, lon)
-        else:
-            return np.array([temp(la, lon[n]) for n, la in enumerate(lat)])
+        # detections without a back azimuth fall back to the canonical model
+        model_mask = np.logical_and(mask, self.has_az) if path_geo_model else np.zeros_like(mask)
+        canon_mask = np.logical_and(mask, ~model_mask)
+
+        if np.any(model_mask):
+            rcels = (self.times[model_mask] - np.reshape(t, (-1, 1))).astype('m8[s]').astype(float) / rngs[:, model_mask]
+            vals[:, model_mask] = self._model_eval(path_geo_model.eval_rcel_gmm, rngs, model_mask, rcels)
+
+        if np.any(canon_mask):
+            rcels = (self.times[canon_mask] - np.reshape(t, (-1, 1))).astype('m8[s]').astype(float) / rngs[:, canon_mask]
+            vals[:, canon_mask] = np.reshape(infrasound.canonical_rcel(rcels.flatten()), rcels.shape)
+
+        return vals
+
+    def rng_pdf(self, lat, lon, t, path_geo_model=None, geom=None):
+        azs, rngs = self.geometry(lat, lon) if geom is None else geom
+        mask = np.logical_or(~self.has_az, self.has_tm)
+
+        return self._rcel_pdf(t, rngs, mask, path_geo_model) / np.where(mask, rngs, 1.0)
+
+    def pdf(self, lat, lon, t, path_geo_model=None, geom=None):
+        geom = self.geometry(lat, lon) if geom is None else geom
+        mask = np.logical_or(~self.has_az, self.has_tm)
+
+        return self.az_pdf(lat, lon, path_geo_model, geom) * self._rcel_pdf(t, geom[1], mask, path_geo_model) / np.where(mask, geom[1], 1.0)
+
+
+# ################################ #
+#        Methods to Combine        #
+#      Infrasound Likelihoods      #
+# ################################ #
+def joint_pdf(lat, lon, t, det_list, path_geo_model=None, prog_step=0, geom_cache=None):
+    det_arrays = det_list if isinstance(det_list, DetectionArrays) else DetectionArrays(det_list)
+
+    result = det_arrays.pdf(lat, lon, t, path_geo_model=path_geo_model, geom=det_arrays.geometry(lat, lon, geom_cache)).prod(axis=1)
+    result *= np.array([det.pdf(lat, lon, t) for det in det_arrays.seis_dets]).prod(axis=0)
+    prog_bar.increment(n=prog_step)
+    return result[0] if np.ndim(lat) == 0 else result
+
+def joint_pdf_wrapper(args):
+    return joint_pdf(*args)
+
+
+def mixture_time_integral(dts, sigs, wts, a_seis=0.0, b_seis=0.0, c_seis=0.0, pts_per_sigma=1.5, sigma_cnt=8.0, max_nodes=16384):
+    """Marginalizes a product of Gaussian mixtures over origin time
+
+        Evaluates the origin time integral of the product of the infrasound propagation time
+        mixtures, prod_n sum_k w_nk / s_nk exp(-(t - dt_nk)^2 / (2 s_nk^2)), and the seismic
+        factor, exp(-(a t^2 - 2 b t + c) / 2), divided by sqrt(2 pi).  This equals the sum over
+        all K**N mixture sequences of their analytic Gaussian integrals, but the cost grows
+        linearly with the number of detections N instead of exponentially.
+
+        The integrand is sampled in log form with the trapezoid rule (which converges exponentially
+        for smooth, rapidly decaying integrands) using a step of at most 1 / pts_per_sigma times the
+        narrowest possible feature of the product, 1 / sqrt(sum_n 1 / min_k s_nk^2 + a), between the
+        earliest and latest peaks of the sequence Gaussians padded by sigma_cnt times the widest
+        possible sequence width, 1 / sqrt(sum_n 1 / max_k s_nk^2 + a).
+
+        Parameters
+        ----------
+        dts : ndarray
+            Mixture component means (origin times) [s] with shape (..., N, K)
+        sigs : ndarray
+            Mixture component standard deviations [s] with shape (..., N, K)
+        wts : ndarray
+            Mixture component weights with shape (..., N, K)
+        a_seis : float or ndarray
+            Sum of inverse variances of seismic detections (shape (...) if an array)
+        b_seis : float or ndarray
+            Sum of seismic origin time estimates weighted by inverse variance
+        c_seis : float or ndarray
+            Sum of squared seismic origin time estimates weighted by inverse variance
+        pts_per_sigma : float
+            Number of trapezoid nodes per narrowest feature width
+        sigma_cnt : float
+            Number of standard deviations of padding about the sequence peaks
+        max_nodes : int
+            Maximum number of trapezoid nodes per location
+
+        Returns:
+        integral : float or ndarray
+            Marginalized value with shape (...)
+
+        Notes
+        -----
+        Agrees with explicit enumeration of the 3**N sequences to within ~1e-10 (relative) for N = 1
+        through 7 detections with canonical celerity mixtures, random ranges, consistent and random
+        detection times, and with or without seismic terms (the enumeration itself loses precision
+        in c - b^2 / a at this level).
+        """
+    dts, sigs, wts = np.asarray(dts, dtype=float), np.asarray(sigs, dtype=float), np.asarray(wts, dtype=float)
+    lead_shape = dts.shape[:-2]
+    det_cnt, comp_cnt = dts.shape[-2:]
+
+    dts = dts.reshape(-1, det_cnt, comp_cnt)
+    sigs = sigs.reshape(-1, det_cnt, comp_cnt)
+    wts = wts.reshape(-1, det_cnt, comp_cnt)
+    pt_cnt = len(dts)
+
+    a_seis = np.broadcast_to(np.asarray(a_seis, dtype=float), lead_shape).reshape(pt_cnt)
+    b_seis = np.broadcast_to(np.asarray(b_seis, dtype=float), lead_shape).reshape(pt_cnt)
+    c_seis = np.broadcast_to(np.asarray(c_seis, dtype=float), lead_shape).reshape(pt_cnt)
+    seis_mask = a_seis > 0.0
+    seis_mns = np.divide(b_seis, a_seis, out=np.zeros(pt_cnt), where=seis_mask)
+    seis_sig = np.divide(1.0, np.sqrt(a_seis), out=np.full(pt_cnt, np.inf), where=seis_mask)
+
+    # Each mixture sequence contributes a Gaussian in origin time peaked at the precision weighted
+    # mean of its components with width 1 / sqrt(sum_n 1 / s_nk^2 + a).  The earliest and latest peaks
+    # over all sequences are found by Dinkelbach iteration (choosing the component of each detection
+    # that maximizes x - lambda * y is exact for this ratio of sums and converges in a few steps).
+    prec, prec_mns = 1.0 / sigs**2, dts / sigs**2
+
+    def peak_bound(sgn):
+        bound = sgn * (b_seis + np.sum(prec_mns[:, :, 0], axis=1)) / (a_seis + np.sum(prec[:, :, 0], axis=1))
+        for _ in range(det_cnt * comp_cnt):
+            choice = np.argmax(sgn * prec_mns - bound[:, None, None] * prec, axis=2)[:, :, None]
+            bound_new = sgn * (b_seis + np.sum(np.take_along_axis(prec_mns, choice, axis=2), axis=(1, 2))) / (a_seis + np.sum(np.take_along_axis(prec, choice, axis=2), axis=(1, 2)))
+            if np.all(bound_new <= bound):
+                break
+            bound = np.maximum(bound, bound_new)
+        return sgn * bound
+
+    seq_wdth = 1.0 / np.sqrt(np.sum(1.0 / np.max(sigs, axis=2)**2, axis=1) + a_seis)
+    t1 = peak_bound(-1.0) - sigma_cnt * seq_wdth
+    t2 = peak_bound(1.0) + sigma_cnt * seq_wdth
+
+    feature = 1.0 / np.sqrt(np.sum(1.0 / np.min(sigs, axis=2)**2, axis=1) + a_seis)
+    node_cnt = int(min(max(np.max(np.ceil((t2 - t1) / feature * pts_per_sigma)) + 1, 3), max_nodes))
+
+    # Evaluate the log of the integrand (log-sum-exp over mixture components) to avoid underflow
+    log_wts = np.log(wts / sigs)
+
+    result = np.empty(pt_cnt)
+    chunk = max(marg_chunk_len // node_cnt, 1)
+    for n in range(0, pt_cnt, chunk):
+        pts = slice(n, n + chunk)
+        t_vals = t1[pts, None] + (t2[pts] - t1[pts])[:, None] / (node_cnt - 1) * np.arange(node_cnt)
+
+        log_vals = -0.5 * ((t_vals - seis_mns[pts, None]) / seis_sig[pts, None])**2 - 0.5 * (c_seis[pts, None] - b_seis[pts, None] * seis_mns[pts, None])
+        for j in range(det_cnt):
+            temp = log_wts[pts, None, j] - 0.5 * ((t_vals[:, :, None] - dts[pts, None, j]) / sigs[pts, None, j])**2
+            temp_max = np.max(temp, axis=2)
+            log_vals += temp_max + np.log(np.sum(np.exp(temp - temp_max[:, :, None]), axis=2))
+
+        log_max = np.max(log_vals, axis=1)
+        result[pts] = np.trapz(np.exp(log_vals - log_max[:, None]), t_vals, axis=1) * np.exp(log_max) / np.sqrt(2.0 * np.pi)
+
+    return result.reshape(lead_shape)[()]
+
+
+def marginal_spatial_pdf(lat, lon, det_list, path_geo_model=None, prog_step=0, resol=100, numeric_time=False, geom_cache=None):
+    """Computes the spatial likelihood of a set of detections marginalized over origin time
+
+        Parameters
+        ----------
+        lat : float or 1darray
+            Latitude(s) of the hypothetical source [degrees]
+        lon : float or 1darray
+            Longitude(s) of the hypothetical source [degrees]
+        det_list : :obj:`list` of :obj:`InfrasoundDetection` or :obj:`SeismicDetection`
+            List of detections
+        path_geo_model : PathGeometryModel
+            Propagation path geometry model (canonical model used if None)
+        prog_step : int
+            Used to increment progress bar
+        resol : int
+            Number of origin time samples used if numerically integrating (3**N mixture sequences are enumerated exactly when 3**N <= resol)
+        numeric_time : boolean
+            Numerically integrate the joint pdf over origin time instead of analytically marginalizing the propagation time mixtures
+        geom_cache : GeometryCache
+            Cache of the azimuths and ranges from the locations to the arrays (computed directly if None)
+
+        Returns:
+        pdf : float or 1darray
+            Marginal spatial likelihood at the location(s)
+        """
+    # define struct-of-arrays for the infrasound detections and a list of the seismic ones
+    det_arrays = DetectionArrays(det_list)
+    seis_det_list = det_arrays.seis_dets
+
+    infr2_cnt = int(np.sum(det_arrays.has_tm))
+    seis_cnt = len(seis_det_list)
+
+    lats, lons = np.atleast_1d(lat), np.atleast_1d(lon)
+
+    if numeric_time:
+        # Numerically integrate the joint pdf over origin time between the
+        # celerity bounds of the detections (evaluated for all locations and
+        # time samples at once in chunks of at most marg_chunk_len samples)
+        def time_bounds(det_lats, det_lons, det_tms, cel_min, cel_max):
+            rngs = sph_proj.inv(np.tile(det_lons, len(lats)), np.tile(det_lats, len(lats)), np.repeat(lons, len(det_tms)), np.repeat(lats, len(det_tms)))[2].reshape(len(lats), len(det_tms)) / 1000.0
+            t1 = np.max(det_tms - (rngs / cel_min * 1e3).astype(int).astype('m8[ms]'), axis=1)
+            t2 = np.min(det_tms - (rngs / cel_max * 1e3).astype(int).astype('m8[ms]'), axis=1)
+            return t1, t2
+
+        mask = det_arrays.has_tm
+        t1, t2 = time_bounds(det_arrays.lats[mask], det_arrays.lons[mask], det_arrays.times[mask], 0.2, 0.4)
+        if seis_cnt > 0:
+            seis_t1, seis_t2 = time_bounds(np.array([det.latitude for det in seis_det_list]), np.array([det.longitude for det in seis_det_list]),
+                                           np.array([det.peakF_UTCtime for det in seis_det_list]), 2.0, 8.0)
+            t1 = np.maximum(t1, seis_t1)
+            t2 = np.minimum(t2, seis_t2)
+
+        t_vals = t1[:, None] + ((t2 - t1) / (resol - 1))[:, None] * np.arange(resol)
+        t_ints = (t2 - t1).astype('m8[ms]').astype(float)[:, None] * 1.0e-3 / (resol - 1) * np.arange(resol)
+
+        result = np.empty(len(lats))
+        chunk = max(marg_chunk_len // resol, 1)
+        for n in range(0, len(lats), chunk):
+            pts = slice(n, n + chunk)
+            pdf_vals = joint_pdf(np.repeat(lats[pts], resol), np.repeat(lons[pts], resol), t_vals[pts].flatten(), det_arrays, path_geo_model=path_geo_model)
+            result[pts] = simps(pdf_vals.reshape(-1, resol), t_ints[pts], axis=1)
 
     else:
-        # compute azimuthal distribution for all infrasound detections        
-        az_pdf = np.array([det.az_pdf(lat, lon, path_geo_model) if det.back_azimuth is not None else np.ones_like(lat) for det in infr_det_list]).prod(axis=0)
+        # compute the geometry from all locations to all arrays at once and the azimuthal distribution for all infrasound detections
+        geom = det_arrays.geometry(lats, lons, geom_cache)
+        result = det_arrays.az_pdf(lats, lons, path_geo_model, geom).prod(axis=1)
 
         if infr2_cnt > 0:
-            # pull out the latitudes and longitudes for infrasonic and seismic detections
-            infr_lats = np.array([det.latitude for det in infr_det_list2])
-            infr_lons = np.array([det.longitude for det in infr_det_list2])
-            infr_tms = np.array([(det.peakF_UTCtime - det_list[0].peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3 for det in infr_det_list2])
+            # pull out the ranges and arrival times for infrasonic and seismic detections
+            mask = det_arrays.has_tm
+            infr_rngs = geom[1][:, mask]
+            infr_tms = (det_arrays.times[mask] - det_list[0].peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3
 
             seis_lats = np.array([det.latitude for det in seis_det_list])
             seis_lons = np.array([det.longitude for det in seis_det_list])
             seis_tms = np.array([(det.peakF_UTCtime - det_list[0].peakF_UTCtime).astype('m8[ms]').astype(float) * 1.0e-3 for det in seis_det_list])
+            seis_rngs = sph_proj.inv(np.tile(seis_lons, len(lats)), np.tile(seis_lats, len(lats)), np.repeat(lons, seis_cnt), np.repeat(lats, seis_cnt), radians=False)[2].reshape(len(lats), seis_cnt) / 1000.0
 
-            # Compute the index sequences for infrasound likelihoods
-            sequences = []
-            for seq in itertools.product(list(range(3)), repeat=infr2_cnt):
-                sequences = sequences + [list(seq)]
-            sequences = np.array(sequences, dtype=int)
-
-            if len(np.atleast_1d(lat)) == 1:
-                infr_rngs = sph_proj.inv(infr_lons, infr_lats, np.array([lon] * infr2_cnt), np.array([lat] * infr2_cnt), radians=False)[2] / 1000.0
-                seis_rngs = sph_proj.inv(seis_lons, seis_lats, np.array([lon] * seis_cnt), np.array([lat] * seis_cnt), radians=False)[2] / 1000.0
-                if path_geo_model:
-                    mns = np.empty((infr2_cnt, 3))
-                    vrs = np.empty((infr2_cnt, 3))
-                    wts = np.empty((infr2_cnt, 3))
-
-                    for n, (rng_n, az_n) in enumerate(zip(infr_rngs, np.array([det.__back_az for det in infr_det_list]))):
-                        az_bin = infrasound.find_azimuth_bin(az_n - 180.0)
-
-                        mns[n] = np.array([path_geo_model.rcel_mns[az_bin][m](min(rng_n, path_geo_model.rng_max)) for m in range(3)])
-                        vrs[n] = np.array([path_geo_model.rcel_vrs[az_bin][m](min(rng_n, path_geo_model.rng_max)) for m in range(3)])
-                        wts[n] = np.array([path_geo_model.rcel_wts[az_bin][m](min(rng_n, path_geo_model.rng_max)) for m in range(3)])
-                else:
-                    mns = np.array([infrasound.canon_rcel_mns] * infr2_cnt)
-                    vrs = np.array([infrasound.canon_rcel_vrs] * infr2_cnt)
-                    wts = np.array([infrasound.canon_rcel_wts] * infr2_cnt)
-                temp1 = np.array([1.0 / det.sigma()**2 for det in seis_det_list])
-                temp2 = np.array([seis_tms[n] - det.trvl_tm(seis_rngs[n]) for n, det in enumerate(seis_det_list)])
-
-                a_seis = temp1.sum()
-                b_seis = (temp2 * temp1).sum()
-                c_seis = (temp2**2 * temp1).sum()
-
-                rng_cel_pdf = 0.0
-                for seq in sequences:
-                    a, b, c, N = a_seis, b_seis, c_seis, 1.0
-
-                    for n, ni in enumerate(zip(seq)):
-                        dt = infr_tms[n] - infr_rngs[n] * mns[n][ni]
-                        sig = infr_rngs[n] * vrs[n][ni]
+            if path_geo_model:
+                mns, vrs, wts = path_geo_model.eval_rcel_params(infr_rngs, det_arrays.back_az[mask] - 180.0)
 
-                        a += 1.0 / sig**2
-                        b += dt / sig**2
-                        c += (dt / sig)**2
-                        N *= wts[n][ni] / sig
+                # detections without a back azimuth fall back to the canonical model
+                no_az = ~det_arrays.has_az[mask][:, None]
+                mns = np.where(no_az, infrasound.canon_rcel_mns, mns)
+                vrs = np.where(no_az, infrasound.canon_rcel_vrs, vrs)
+                wts = np.where(no_az, infrasound.canon_rcel_wts, wts)
+            else:
+                mns = np.broadcast_to(infrasound.canon_rcel_mns, (len(lats), infr2_cnt, 3))
+                vrs = np.broadcast_to(infrasound.canon_rcel_vrs, (len(lats), infr2_cnt, 3))
+                wts = np.broadcast_to(infrasound.canon_rcel_wts, (len(lats), infr2_cnt, 3))
 
-                    rng_cel_pdf += N / np.sqrt(a) * np.exp(-1.0 / 2.0 * (c - b**2 / a))
+            temp1 = np.array([[1.0 / det.sigma()**2] * len(lats) for det in seis_det_list])
+            temp2 = np.array([seis_tms[n] - det.trvl_tm(seis_rngs[:, n]) for n, det in enumerate(seis_det_list)])
 
-                rng_cel_pdf /= np.power(2.0 * np.pi, (seis_cnt + infr2_cnt - 1.0) / 2.0)
-                prog_bar.increment(n=prog_step)
-            else:
-                infr_rngs = sph_proj.inv(np.array([infr_lons] * len(lon)), np.array([infr_lats] * len(lat)), np.array([lon] * infr2_cnt).T, np.array([lat] * infr2_cnt).T, radians=False)[2].reshape(len(lat), infr2_cnt) / 1000.0
-                seis_rngs = sph_proj.inv(np.array([seis_lons] * len(lon)), np.array([seis_lats] * len(lat)), np.array([lon] * seis_cnt).T, np.array([lat] * seis_cnt).T, radians=False)[2].reshape(len(lat), seis_cnt) / 1000.0
-
-                if path_geo_model:
-                    mns = np.empty((len(lat), infr2_cnt, 3))
-                    vrs = np.empty((len(lat), infr2_cnt, 3))
-                    wts = np.empty((len(lat), infr2_cnt, 3))
-
-                    infr_azs = np.array([np.array([det.back_azimuth for det in det_list if type(det) == InfrasoundDetection])] * len(lat))
-                    az_bins = infrasound.find_azimuth_bin(infr_azs.flatten() - 180.0, path_geo_model.az_bin_cnt)
-                    rngs_eval = infr_rngs.flatten()
-                    rngs_eval[rngs_eval > path_geo_model.rng_max] = path_geo_model.rng_max
-
-                    for k in range(3):
-                        mns_temp = np.empty_like(az_bins, dtype=float)
-                        vrs_temp = np.empty_like(az_bins, dtype=float)
-                        wts_temp = np.empty_like(az_bins, dtype=float)
-
-                        for n_az in range(path_geo_model.az_bin_cnt):
-                            if np.any(az_bins == n_az):
-                                mns_temp[az_bins == n_az] = path_geo_model.rcel_mns[n_az][k](rngs_eval[az_bins==n_az])
-                                vrs_temp[az_bins == n_az] = path_geo_model.rcel_vrs[n_az][k](rngs_eval[az_bins==n_az])
-                                wts_temp[az_bins == n_az] = path_geo_model.rcel_wts[n_az][k](rngs_eval[az_bins==n_az])
-
-                        mns[:, :, k] = mns_temp.reshape(len(lat), infr2_cnt)
-                        vrs[:, :, k] = vrs_temp.reshape(len(lat), infr2_cnt)
-                        wts[:, :, k] = wts_temp.reshape(len(lat), infr2_cnt)
-
-                else:
-                    mns = np.array([np.array([infrasound.canon_rcel_mns] * infr2_cnt)] * len(lat))
-                    vrs = np.array([np.array([infrasound.canon_rcel_vrs] * infr2_cnt)] * len(lat))
-                    wts = np.array([np.array([infrasound.canon_rcel_wts] * infr2_cnt)] * len(lat))
-
-                temp1 = np.array([[1.0 / det.sigma()**2] * len(lat) for det in seis_det_list])
-                temp2 = np.array([seis_tms[n] - det.trvl_tm(seis_rngs[:, n]) for n, det in enumerate(seis_det_list)])
-
-                a_seis = temp1.sum(axis=0)
-                b_seis = (temp2 * temp1).sum(axis=0)
-                c_seis = (temp2**2 * temp1).sum(axis=0)
+            a_seis = temp1.sum(axis=0)
+            b_seis = (temp2 * temp1).sum(axis=0)
+            c_seis = (temp2**2 * temp1).sum(axis=0)
 
+            if 3**infr2_cnt <= resol:
+                # enumerate the index sequences for infrasound likelihoods (only for a few detections)
                 rng_cel_pdf = 0.0
-                for seq in sequences:
+                for seq in itertools.product(list(range(3)), repeat=infr2_cnt):
                     a, b, c, N = a_seis, b_seis, c_seis, 1.0
 
                     for n in range(infr2_cnt):
@@ -773,12 +1032,14 @@ def marginal_spatial_pdf(lat, lon, det_list, path_geo_model=None, prog_step=0, r
                         N = N * wts[:, n, seq[n]] / sig
 
                     rng_cel_pdf += N / np.sqrt(a) * np.exp(-1.0 / 2.0 * (c - b**2 / a))
-                rng_cel_pdf /= np.power(2.0 * np.pi, (seis_cnt + infr2_cnt - 1.0) / 2.0)
-                prog_bar.increment(n=prog_step)
-        else:
-            rng_cel_pdf = 1.0
+            else:
+                rng_cel_pdf = mixture_time_integral(infr_tms[None, :, None] - infr_rngs[:, :, None] * mns, infr_rngs[:, :, None] * vrs, wts, a_seis, b_seis, c_seis)
+            rng_cel_pdf /= np.power(2.0 * np.pi, (seis_cnt + infr2_cnt - 1.0) / 2.0)
+            prog_bar.increment(n=prog_step)
+
+            result = result * rng_cel_pdf
 
-        return az_pdf * rng_cel_pdf
+    return result[0] if np.ndim(lat) == 0 else result
 
 def marginal_spatial_pdf_wrapper(args):
     return marginal_spatial_pdf(*args)
@@ -12,12 +12,12 @@ import itertools
 
 import numpy as np
 
-from pyproj import Geod
-
 from scipy.interpolate import interp1d
 
+from ..utils import latlon
+
 np.seterr(over='ignore')
-sph_proj = Geod(ellps='sphere')
+sph_proj = latlon.SphericalGeod()
 
 # ######################### #
 #     ak135 Travel Time     #
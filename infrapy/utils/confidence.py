@@ -4,44 +4,88 @@
 
 import numpy as np
 
-from scipy.integrate import quad
+from scipy.integrate import simps
 
 
-def find_confidence(func, lims, conf_aim):
+def simpson_weights(x_vals):
+    """Quadrature weights reproducing scipy.integrate.simps
+
+        Since Simpson's rule is linear in the integrand, the weights are obtained by
+        integrating the unit vectors on the sample points so that np.sum(w * f) matches
+        simps(f, x_vals) for any f sampled on x_vals.
+
+        Parameters
+        ----------
+        x_vals : 1darray
+            Sample points of the integrand
+
+        Returns:
+        ----------
+        wts : 1darray
+            Quadrature weights for each sample point
+        """
+    return simps(np.eye(len(x_vals)), x_vals, axis=1)
+
+
+def hpd_bounds(x_vals, f_vals, conf_lvl):
+    """Highest density bounds of a sampled function
+
+        Sorts the samples by decreasing function value and accumulates their trapezoid rule
+        masses to identify the level, f(x_1) = f(x_2), above which the requested fraction of
+        the overall integral is contained.  The bounds are the (linearly interpolated) points
+        where the function crosses that level along with the end points if the function is
+        above the level there.
+
+        Parameters
+        ----------
+        x_vals : 1darray
+            Sample points (increasing)
+        f_vals : 1darray
+            Function values at the sample points
+        conf_lvl : float
+            Fraction of the integral to include (e.g., 0.95)
+
+        Returns:
+        ----------
+        bnds : float
+            The values of x_1 and x_2 for the confidence bound
+        conf : float
+            Actual confidence value obtained
+        thresh : float
+            Value of the function at x_1 and x_2
+        """
+    x_vals = np.asarray(x_vals, dtype=float)
+    f_vals = np.asarray(f_vals, dtype=float)
+
+    wts = np.zeros(len(x_vals))
+    wts[:-1] += np.diff(x_vals) / 2.0
+    wts[1:] += np.diff(x_vals) / 2.0
+
+    order = np.argsort(f_vals)[::-1]
+    cum_mass = np.cumsum(wts[order] * f_vals[order])
+    cum_mass = cum_mass / cum_mass[-1]
+
+    n = min(np.searchsorted(cum_mass, conf_lvl), len(cum_mass) - 1)
+    thresh = f_vals[order[n]]
+    conf = cum_mass[n]
+
+    above = f_vals >= thresh
+    jumps = np.where(above[:-1] != above[1:])[0]
+    crossings = x_vals[jumps] + (thresh - f_vals[jumps]) * (x_vals[jumps + 1] - x_vals[jumps]) / (f_vals[jumps + 1] - f_vals[jumps])
+
+    bnds = list(crossings)
+    if above[0]:
+        bnds = [x_vals[0]] + bnds
+    if above[-1]:
+        bnds = bnds + [x_vals[-1]]
+
+    return bnds, conf, thresh
+
+
+def find_confidence(func, lims, conf_aim, resol=1000):
     if conf_aim > 1.0:
         print("WARNING - find_confidence cannot use conf > 1.0")
         return lims
 
-    def conf_func(x, thresh):
-        val = func(x)
-        if val >= thresh:
-            return val
-        else:
-            return 0.0
-
-    resol = int(1e3)
     x_vals = np.linspace(lims[0], lims[1], resol)
-    f_vals = func(x_vals)
-
-    f_max = max(f_vals)
-    thresh_vals = np.linspace(0.0, f_max, resol)
-    
-    norm = quad(func, lims[0], lims[1], limit=100, epsrel=1.0e-3)[0]
-    
-    conf_prev=1.0
-    bnds=[]
-    for n in range(resol):
-        conf = quad(conf_func, lims[0], lims[1], (thresh_vals[n],), limit=100, epsrel=1.0e-3)[0] / norm
-        
-        if conf < conf_aim < conf_prev:
-            thresh = thresh_vals[n - 1] - (thresh_vals[n-1] - thresh_vals[n]) / (conf_prev - conf) * (conf_aim - conf)
-            conf = quad(conf_func, lims[0], lims[1], (thresh,), limit=100, epsrel=1.0e-3)[0] / norm
-            
-            for n in range(resol - 1):
-                if (f_vals[n] - thresh) * (f_vals[n+1] - thresh) < 0.0:
-                    bnds.append(x_vals[n])
-            break
-        
-        conf_prev=conf
-
-    return bnds, conf, thresh
+    return hpd_bounds(x_vals, func(x_vals), conf_aim)
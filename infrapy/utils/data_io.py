@@ -569,16 +569,133 @@ def json_to_detection_list(filename):
         Path for file
     """
 
-    detection_list = []
     with open(filename, 'r') as infile:
         newdata = json.load(infile)
-        for entry in newdata:
-            detection = lklhds.InfrasoundDetection()
-            detection.fillFromDict(entry)
-            detection_list.append(detection)
+    return dicts_to_detection_list(newdata)
+
+
+def json_to_new_detections(filename, offset=0):
+    """
+    Read the detection entries of a growing .dets.json file that follow a byte offset
+
+    Only the bytes after the offset are read so that polling a file that grows by
+    appending detections costs time proportional to the new entries.  Reading stops
+    at the end of the list or at an incomplete (partially written) entry.
+
+    Parameters
+    ----------
+    filename: str
+        Path for file
+    offset: int
+        Byte offset following the last entry previously read (0 for the start of the file)
+
+    Returns
+    -------
+    detection_list: list
+        Detections with entries following the offset
+    offset: int
+        Byte offset following the last complete entry read
+    """
+
+    with open(filename, 'rb') as infile:
+        infile.seek(offset)
+        text = infile.read().decode('utf-8')
+
+    decoder = json.JSONDecoder()
+    entries, pos, end = [], 0, 0
+    while True:
+        # skip the list delimiters between entries
+        while pos < len(text) and text[pos] in '[,\r\n\t ':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            break
+
+        try:
+            entry, pos = decoder.raw_decode(text, pos)
+        except json.decoder.JSONDecodeError:
+            break
+        entries.append(entry)
+        end = pos
+
+    return dicts_to_detection_list(entries), offset + len(text[:end].encode('utf-8'))
+
+
+def dicts_to_detection_list(entries):
+    """
+    Build detections from a list of detection dictionaries (as written into .dets.json files)
+
+    Parameters
+    ----------
+    entries: list
+        List of detection dictionaries
+    """
+
+    detection_list = []
+    for entry in entries:
+        detection = lklhds.InfrasoundDetection()
+        detection.fillFromDict(entry)
+        detection_list.append(detection)
     return detection_list
 
 
+def set_event_list(local_detect_label):
+    """
+    Read detections for a batch of events from a directory of [...].dets.json files, a file pattern, or a multi-event json file
+
+    Parameters
+    ----------
+    local_detect_label: str
+        Directory containing event detection files, path and pattern of event detection files (e.g., 'GJI_example-ev*'), or a
+        multi-event json file containing a list of detection lists or a dictionary of detection lists keyed by event label
+
+    Returns
+    -------
+    labels : list
+        Event labels (detection file names without the .dets.json suffix, or the multi-event json keys or indices)
+    events : list
+        List of lists of infrapy.propagation.likelihoods.InfrasoundDetection instances for each event
+
+    """
+
+    if os.path.isdir(local_detect_label) or "*" in local_detect_label:
+        if os.path.isdir(local_detect_label):
+            file_path, pattern = local_detect_label, "*.dets.json"
+        else:
+            if ".dets.json" not in local_detect_label:
+                local_detect_label = local_detect_label + ".dets.json"
+            file_path, pattern = os.path.dirname(local_detect_label), os.path.basename(local_detect_label)
+
+        file_list = sorted([file for file in os.listdir(file_path if len(file_path) > 0 else ".") if fnmatch.fnmatch(file, pattern)])
+        if len(file_list) == 0:
+            msg = '\n' + "Detection file(s) specified not found"
+            warnings.warn(msg)
+
+        print("Loading detections from " + str(len(file_list)) + " event files in " + (file_path if len(file_path) > 0 else "."))
+        labels, events = [], []
+        for file in file_list:
+            try:
+                events = events + [json_to_detection_list(os.path.join(file_path, file))]
+                labels = labels + [file[:-len(".dets.json")] if file.endswith(".dets.json") else file]
+            except Exception as err:
+                warnings.warn('\n' + "Skipping unreadable detection file " + file + " (" + type(err).__name__ + ": " + str(err) + ")")
+    else:
+        print("Loading detections from multi-event file: " + local_detect_label)
+        with open(local_detect_label, 'r') as infile:
+            newdata = json.load(infile)
+
+        if isinstance(newdata, dict):
+            labels = [str(key) for key in newdata.keys()]
+            events = [dicts_to_detection_list(entries) for entries in newdata.values()]
+        elif len(newdata) > 0 and isinstance(newdata[0], list):
+            labels = ["ev" + str(n) for n in range(len(newdata))]
+            events = [dicts_to_detection_list(entries) for entries in newdata]
+        else:
+            labels = [os.path.basename(local_detect_label).replace(".dets.json", "")]
+            events = [dicts_to_detection_list(newdata)]
+
+    return labels, events
+
+
 # ############################# #
 #   Load detections from    #
 #   database processing         #
@@ -7,6 +7,7 @@
 #  d=azdiff(az1,az2)
 #  tf=azinrng(azrng,az)
 #  avg=azmean(az,dim)
+#  latloni=beam_intersect(latlona,aza,latlonb,azb,gcdist,width)
 #  latlon=fixlatlon(latlon)
 #  latloni0,latloni1=gc_intersect(latlona0,latlona1,latlonb0,latlonb1)
 #  latloni=gcarc_intersect(latlona0,latlona1,latlonb0,latlonb1)
@@ -23,6 +24,8 @@
 #  x=randsphere(n,dim)
 #  latlon1,baz=sphericalfwd(latlon0,gcdist,az)
 #  gcdist,az,baz=sphericalinv(latlon0,latlon1)
+#  set_geod_backend(backend)
+#  geod=SphericalGeod(backend)
 #  latlon,radius=xyz2geocentric(xyz)
 #
 # To test:
@@ -32,9 +35,17 @@
 # Created           Feb. 22, 2016
 # Last Modified     Mar.  1, 2016
 
+import math
+import warnings
+
 import numpy as np
 from numpy.core.umath_tests import inner1d
 
+try:
+    from numba import jit
+except ImportError:
+    jit = None
+
 # functions to port immediately:
 # sph_poly_in
 # sph_poly_intersect
@@ -219,6 +230,64 @@ def azmean(az, dim=None):
 #def enu2geographic():
 
 
+def beam_intersect(latlona,aza,latlonb,azb,gcdist,width):
+    """
+    BEAM_INTERSECT    Return intersection points between pairs of projected beams
+
+        Usage:    latloni=beam_intersect(latlona,aza,latlonb,azb,gcdist,width)
+
+        Description:
+         LATLONI=BEAM_INTERSECT(LATLONA,AZA,LATLONB,AZB,GCDIST,WIDTH) projects
+         the center (AZ) and edge (AZ+/-WIDTH) great circle arcs of length
+         GCDIST from points LATLONA and LATLONB and returns the intersections of
+         the arcs for each pair of beams.  The edge arcs for all beams are built
+         once and all intersections are found in a single broadcast call to
+         GCARC_INTERSECT.  LATLONA/B must be arrays (Nx2) or scalar points (1x2)
+         and AZA/B must be length N (or scalar).  LATLONI is Nx9x2 with the
+         intersections ordered as:
+           0: center A & center B
+           1: center A & upper B     2: center A & lower B
+           3: upper A & center B     4: lower A & center B
+           5: upper A & upper B      6: lower A & lower B
+           7: upper A & lower B      8: lower A & upper B
+         Non-intersecting arcs are NaNs.  All inputs must be in degrees!
+         Outputs are in degrees.
+
+        Examples:
+         # Beams from two points on the equator pointing toward one another
+         >>> beam_intersect([0,0],45,[0,10],-45,30,5)[0,0]
+         array([4.98106939, 5.        ])
+
+        See also: GCARC_INTERSECT, SPHERICALFWD
+    """
+
+    # convert to 2D numpy arrays of floats and broadcast
+    latlona=np.atleast_2d(np.array(latlona, dtype=float))
+    latlonb=np.atleast_2d(np.array(latlonb, dtype=float))
+    aza=np.atleast_1d(np.array(aza, dtype=float))
+    azb=np.atleast_1d(np.array(azb, dtype=float))
+
+    n=max(len(latlona),len(latlonb),len(aza),len(azb))
+    latlona=np.broadcast_to(latlona,(n,2))
+    latlonb=np.broadcast_to(latlonb,(n,2))
+    aza=np.broadcast_to(aza,(n,))
+    azb=np.broadcast_to(azb,(n,))
+
+    # project center and edge arcs for all beams (center, upper, lower)
+    offsets=np.array([0.,width,-width])
+    proja=sphericalfwd(np.repeat(latlona,3,axis=0),gcdist,(aza[:,np.newaxis]+offsets).flatten())[0].reshape(n,3,2)
+    projb=sphericalfwd(np.repeat(latlonb,3,axis=0),gcdist,(azb[:,np.newaxis]+offsets).flatten())[0].reshape(n,3,2)
+
+    # arc indices (A, B) for each intersection
+    ia=np.array([0,0,0,1,2,1,2,1,2])
+    ib=np.array([0,1,2,0,0,1,2,2,1])
+
+    latloni=gcarc_intersect(np.repeat(latlona,9,axis=0),proja[:,ia].reshape(-1,2),
+                            np.repeat(latlonb,9,axis=0),projb[:,ib].reshape(-1,2))
+
+    return latloni.reshape(n,9,2)
+
+
 def fixlatlon(latlon):
     """
     FIXLATLON    Returns latitudes & longitudes in reasonable ranges
@@ -380,10 +449,10 @@ def gcarc_intersect(latlona0,latlona1,latlonb0,latlonb1):
     # check that latlona0/1 & latlonb0/1 are (N,1)x2 in shape and real
     
     # convert to 2D numpy arrays of floats
-    latlona0=np.atleast_2d(np.array(latlona0, dtype=np.float))
-    latlona1=np.atleast_2d(np.array(latlona1, dtype=np.float))
-    latlonb0=np.atleast_2d(np.array(latlonb0, dtype=np.float))
-    latlonb1=np.atleast_2d(np.array(latlonb1, dtype=np.float))
+    latlona0=np.atleast_2d(np.array(latlona0, dtype=float))
+    latlona1=np.atleast_2d(np.array(latlona1, dtype=float))
+    latlonb0=np.atleast_2d(np.array(latlonb0, dtype=float))
+    latlonb1=np.atleast_2d(np.array(latlonb1, dtype=float))
     
     # convert to xyz
     latlona0=geocentric2xyz(latlona0)
@@ -419,7 +488,7 @@ def gcarc_intersect(latlona0,latlona1,latlonb0,latlonb1):
     # 7. nans if E is basically zero
     # - this occurs when A & B are equivalent
     bad=np.linalg.norm(E, axis=1)
-    bad=bad<10.*np.sqrt(np.finfo(np.float).eps)
+    bad=bad<10.*np.sqrt(np.finfo(float).eps)
     if any(bad):
         latloni[bad,:]=np.nan
     
@@ -510,8 +579,8 @@ def geocentric2xyz(latlon,radius=1.):
     # check that radius is (N,1) vector and real
     
     # convert to 2D numpy array of floats
-    latlon=np.atleast_2d(np.array(latlon, dtype=np.float))
-    radius=np.atleast_2d(np.array(radius, dtype=np.float))
+    latlon=np.atleast_2d(np.array(latlon, dtype=float))
+    radius=np.atleast_2d(np.array(radius, dtype=float))
     
     # force radius as a column vector
     radius=np.reshape(radius,(-1,1))
@@ -969,8 +1038,8 @@ def lonmod(lon, wrap=360):
     # check that lon & wrap are scalar or equal size and real
     
     # convert to float
-    lon=np.array(lon, dtype=np.float)
-    wrap=np.array(wrap, dtype=np.float)
+    lon=np.array(lon, dtype=float)
+    wrap=np.array(wrap, dtype=float)
 
     # this always flips the sign of -180/180 and so we don't use it
     #wlon=lon-np.round(lon/wrap)*wrap
@@ -1128,9 +1197,9 @@ def sphericalfwd(latlon0,gcdist,az):
     # check that latlon0/gcdist/az are (N,1)x2/(N,1)/(N,1) in shape and real
     
     # convert to 2D numpy arrays of floats
-    latlon0=np.atleast_2d(np.array(latlon0, dtype=np.float))
-    gcdist=np.atleast_2d(np.array(gcdist, dtype=np.float))
-    az=np.atleast_2d(np.array(az, dtype=np.float))
+    latlon0=np.atleast_2d(np.array(latlon0, dtype=float))
+    gcdist=np.atleast_2d(np.array(gcdist, dtype=float))
+    az=np.atleast_2d(np.array(az, dtype=float))
     
     # force gcdist & az to column vector
     gcdist=np.reshape(gcdist,[-1,1])
@@ -1248,6 +1317,193 @@ def sphericalinv(latlon0,latlon1):
     return gcdist, az, baz
 
 
+# radius of the pyproj 'sphere' ellipsoid [m]
+sph_radius = 6370997.0
+
+# default backend for SphericalGeod instances ('pyproj' or 'numba')
+geod_backend = 'pyproj'
+
+
+def set_geod_backend(backend):
+    """
+    SET_GEOD_BACKEND    Sets the default backend for spherical geodesics
+
+        Usage:    set_geod_backend(backend)
+
+        Description:
+         SET_GEOD_BACKEND(BACKEND) selects the geodesic calculations used by
+         SphericalGeod instances created without an explicit backend (e.g.,
+         the sph_proj objects of the likelihood, association and localization
+         modules).  BACKEND is 'pyproj' to use pyproj.Geod(ellps='sphere') or
+         'numba' to use the compiled spherical kernels.
+
+        Notes:
+         - Falls back to 'pyproj' with a warning if numba is not available
+
+        See also: SPHERICALGEOD
+    """
+    global geod_backend
+
+    if backend not in ('pyproj', 'numba'):
+        raise ValueError("Unrecognized geodesic backend '" + str(backend) + "' (options are 'pyproj' and 'numba')")
+
+    if backend == 'numba' and jit is None:
+        warnings.warn("numba is not available, using pyproj for geodesic calculations")
+        backend = 'pyproj'
+
+    geod_backend = backend
+
+
+def _sph_inv(lons1, lats1, lons2, lats2):
+    # azimuths and arc distances between points (all in radians)
+    az12 = np.empty(len(lons1))
+    az21 = np.empty(len(lons1))
+    dist = np.empty(len(lons1))
+
+    for n in range(len(lons1)):
+        sin1, cos1 = math.sin(lats1[n]), math.cos(lats1[n])
+        sin2, cos2 = math.sin(lats2[n]), math.cos(lats2[n])
+        dlon = lons2[n] - lons1[n]
+        sin_dlon, cos_dlon = math.sin(dlon), math.cos(dlon)
+
+        # haversine distance (accurate at short ranges)
+        hav = math.sin((lats2[n] - lats1[n]) / 2.0)**2 + cos1 * cos2 * math.sin(dlon / 2.0)**2
+        dist[n] = 2.0 * math.atan2(math.sqrt(hav), math.sqrt(max(1.0 - hav, 0.0)))
+
+        if dist[n] == 0.0:
+            az12[n], az21[n] = math.pi, 0.0
+        else:
+            az12[n] = math.atan2(sin_dlon * cos2, cos1 * sin2 - sin1 * cos2 * cos_dlon)
+            az21[n] = math.atan2(-sin_dlon * cos1, cos2 * sin1 - sin2 * cos1 * cos_dlon)
+
+    return az12, az21, dist
+
+
+def _sph_fwd(lons1, lats1, azs, dists):
+    # end points and back azimuths from start points, azimuths and arc distances (all in radians)
+    lons2 = np.empty(len(lons1))
+    lats2 = np.empty(len(lons1))
+    az21 = np.empty(len(lons1))
+
+    for n in range(len(lons1)):
+        sin1, cos1 = math.sin(lats1[n]), math.cos(lats1[n])
+        sin_d, cos_d = math.sin(dists[n]), math.cos(dists[n])
+        sin_az, cos_az = math.sin(azs[n]), math.cos(azs[n])
+
+        sin2 = min(max(sin1 * cos_d + cos1 * sin_d * cos_az, -1.0), 1.0)
+        lats2[n] = math.asin(sin2)
+
+        lons2[n] = (lons1[n] + math.atan2(sin_az * sin_d * cos1, cos_d - sin1 * sin2) + math.pi) % (2.0 * math.pi) - math.pi
+        az21[n] = math.atan2(-sin_az * cos1, sin1 * sin_d - cos1 * cos_d * cos_az)
+
+    return lons2, lats2, az21
+
+
+if jit is not None:
+    _sph_inv = jit(nopython=True)(_sph_inv)
+    _sph_fwd = jit(nopython=True)(_sph_fwd)
+
+
+class SphericalGeod(object):
+    """
+    SPHERICALGEOD    Spherical geodesics with a pyproj.Geod interface
+
+        Usage:    geod=SphericalGeod(backend)
+                  az12,az21,dist=geod.inv(lons1,lats1,lons2,lats2,radians=False)
+                  lons2,lats2,az21=geod.fwd(lons1,lats1,az,dist,radians=False)
+
+        Description:
+         GEOD=SPHERICALGEOD(BACKEND) returns an object with the inv and fwd
+         methods of pyproj.Geod(ellps='sphere') that evaluates them with
+         either pyproj or compiled (numba) spherical kernels.  BACKEND is
+         'pyproj', 'numba', or None to use the module default set by
+         SET_GEOD_BACKEND at each call.  Inputs are scalars or arrays (which
+         are broadcast together) with angles in degrees (radians if
+         RADIANS=True) and distances in meters.  Azimuths are returned in the
+         range -180<az<=180 and longitudes in the range -180<=lon<180.
+
+        Notes:
+         - Other pyproj.Geod methods (e.g., fwd_intermediate) are passed to
+           pyproj.Geod(ellps='sphere')
+
+        Examples:
+         # Compare the numba kernels with pyproj:
+         >>> from pyproj import Geod
+         >>> geod, ref = SphericalGeod('numba'), Geod(ellps='sphere')
+         >>> np.allclose(geod.inv(-90.305, 38.649, 11.521, 3.861), ref.inv(-90.305, 38.649, 11.521, 3.861), rtol=1e-10, atol=1e-6)
+         True
+         >>> lats, lons = np.degrees(np.arcsin(np.random.uniform(-1.0, 1.0, 1000))), np.random.uniform(-180.0, 180.0, 1000)
+         >>> vals = geod.inv(lons[:500], lats[:500], lons[500:], lats[500:])
+         >>> ref_vals = ref.inv(lons[:500], lats[:500], lons[500:], lats[500:])
+         >>> np.max(np.abs(azdiff(vals[0], ref_vals[0]))) < 1e-6, np.max(np.abs(vals[2] - ref_vals[2])) < 1e-3
+         (True, True)
+         >>> rngs = np.random.uniform(0.0, 5.0e6, 500)
+         >>> vals = geod.fwd(lons[:500], lats[:500], ref_vals[0], rngs)
+         >>> ref_vals = ref.fwd(lons[:500], lats[:500], ref_vals[0], rngs)
+         >>> np.max(np.abs(azdiff(vals[0], ref_vals[0]))) < 1e-6, np.max(np.abs(vals[1] - ref_vals[1])) < 1e-6
+         (True, True)
+
+        See also: SET_GEOD_BACKEND, SPHERICALINV, SPHERICALFWD
+    """
+
+    a = sph_radius
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._pyproj_geod = None
+
+    def _pyproj(self):
+        if self._pyproj_geod is None:
+            from pyproj import Geod
+            self._pyproj_geod = Geod(ellps='sphere')
+        return self._pyproj_geod
+
+    def _use_numba(self):
+        return jit is not None and (geod_backend if self.backend is None else self.backend) == 'numba'
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._pyproj(), name)
+
+    def inv(self, lons1, lats1, lons2, lats2, radians=False):
+        if not self._use_numba():
+            return self._pyproj().inv(lons1, lats1, lons2, lats2, radians=radians)
+
+        vals = np.broadcast_arrays(*[np.asarray(val, dtype=float) for val in (lons1, lats1, lons2, lats2)])
+        shape = vals[0].shape
+        if not radians:
+            vals = [np.radians(val) for val in vals]
+
+        az12, az21, dist = _sph_inv(*[np.ascontiguousarray(val).ravel() for val in vals])
+        if not radians:
+            az12, az21 = np.degrees(az12), np.degrees(az21)
+        dist = dist * self.a
+
+        if len(shape) == 0:
+            return az12[0], az21[0], dist[0]
+        else:
+            return az12.reshape(shape), az21.reshape(shape), dist.reshape(shape)
+
+    def fwd(self, lons, lats, az, dist, radians=False):
+        if not self._use_numba():
+            return self._pyproj().fwd(lons, lats, az, dist, radians=radians)
+
+        vals = np.broadcast_arrays(*[np.asarray(val, dtype=float) for val in (lons, lats, az, dist)])
+        shape = vals[0].shape
+        if not radians:
+            vals = [np.radians(val) for val in vals[:3]] + [vals[3]]
+
+        lons2, lats2, az21 = _sph_fwd(*[np.ascontiguousarray(val).ravel() for val in vals[:3]], np.ascontiguousarray(vals[3]).ravel() / self.a)
+        if not radians:
+            lons2, lats2, az21 = np.degrees(lons2), np.degrees(lats2), np.degrees(az21)
+
+        if len(shape) == 0:
+            return lons2[0], lats2[0], az21[0]
+        else:
+            return lons2.reshape(shape), lats2.reshape(shape), az21.reshape(shape)
+
+
 #def vincentyfwd():
 
 
@@ -1286,7 +1542,7 @@ def xyz2geocentric(xyz):
     # check that xyz is Nx3 and real
 
     # convert to 2D numpy array of floats
-    xyz=np.atleast_2d(np.array(xyz, dtype=np.float))
+    xyz=np.atleast_2d(np.array(xyz, dtype=float))
     
     # preallocate
     latlon=np.empty((np.shape(xyz)[0],2))
@@ -0,0 +1,84 @@
+# stage_timer.py
+#
+# Lightweight, opt-in timing of the stages of an analysis
+# run (e.g., fft, beam power, peak finding) with call counts,
+# throughput, and a summary printed or written to JSON.
+#
+# Timing is only performed by code paths given a StageTimer
+# so that runs without one carry no instrumentation overhead.
+
+import json
+import time
+
+from contextlib import contextmanager
+
+
+class StageTimer(object):
+    def __init__(self, label=None):
+        self.label = label
+        self.wall = {}
+        self.counts = {}
+        self.info = {}
+        self.window_cnt = 0
+
+        self._t_start = time.perf_counter()
+        self._t_end = None
+
+    def add(self, stage, dt, cnt=1):
+        self.wall[stage] = self.wall.get(stage, 0.0) + dt
+        self.counts[stage] = self.counts.get(stage, 0) + cnt
+
+    def merge(self, stage_times, stage_counts=None):
+        # merge dictionaries of {stage: wall time} and {stage: calls} (e.g., returned from a pool worker)
+        for stage, dt in stage_times.items():
+            self.add(stage, dt, 1 if stage_counts is None else stage_counts[stage])
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def stop(self):
+        self._t_end = time.perf_counter()
+
+    def total(self):
+        if self._t_end is None:
+            return time.perf_counter() - self._t_start
+        else:
+            return self._t_end - self._t_start
+
+    def summary(self):
+        total = self.total()
+
+        result = {'label': self.label,
+                  'total_time': total,
+                  'window_cnt': self.window_cnt,
+                  'windows_per_sec': self.window_cnt / total if total > 0.0 else None,
+                  'stages': {}}
+
+        for stage in self.wall:
+            result['stages'][stage] = {'wall_time': self.wall[stage],
+                                       'calls': self.counts[stage],
+                                       'fraction': self.wall[stage] / total if total > 0.0 else None}
+        result.update(self.info)
+
+        return result
+
+    def report(self):
+        summary = self.summary()
+
+        print('\n' + "Timing summary" + (" (" + self.label + ")" if self.label else "") + ":")
+        print('\t' + "total time: " + "{:.3f}".format(summary['total_time']) + " [s]")
+        if self.window_cnt > 0:
+            print('\t' + "windows: " + str(self.window_cnt) + " ({:.2f} windows/s)".format(summary['windows_per_sec']))
+        for stage, vals in sorted(summary['stages'].items(), key=lambda item: -item[1]['wall_time']):
+            print('\t' + stage + ": " + "{:.3f}".format(vals['wall_time']) + " [s] in " + str(vals['calls']) + " calls")
+        for key, val in self.info.items():
+            print('\t' + key + ": " + str(val))
+
+    def write(self, file_name):
+        with open(file_name, 'w') as of:
+            json.dump(self.summary(), of, indent=4)